@@ -0,0 +1,82 @@
+"""add receipt full text search
+
+Revision ID: 4d7a2e9c1b58
+Revises: 8b0e93d7c6f1
+Create Date: 2025-10-30 10:21:44.183920
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4d7a2e9c1b58'
+down_revision: Union[str, Sequence[str], None] = '8b0e93d7c6f1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_BATCH = 5000
+
+# Same expression as models.SEARCH_VECTOR_SQL
+SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('simple'::regconfig, coalesce(vendor, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(item_names, '')), 'B') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(ocr_text, '')), 'C')"
+)
+
+BACKFILL_SQL = sa.text("""
+    UPDATE receipts r
+    SET item_names = i.names
+    FROM (
+        SELECT receipt_id, string_agg(name, ' ' ORDER BY position) AS names
+        FROM receipt_items
+        WHERE receipt_id > :after AND receipt_id <= :upto AND name IS NOT NULL
+        GROUP BY receipt_id
+    ) i
+    WHERE r.id = i.receipt_id
+""")
+
+NEXT_BATCH_SQL = sa.text("""
+    SELECT max(id) FROM (
+        SELECT id FROM receipts WHERE id > :after ORDER BY id LIMIT :batch
+    ) b
+""")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('receipts', sa.Column('ocr_text', sa.Text(), nullable=True))
+    op.add_column('receipts', sa.Column('item_names', sa.Text(), nullable=True))
+
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        after = ''
+        while True:
+            upto = conn.execute(NEXT_BATCH_SQL, {"after": after, "batch": BACKFILL_BATCH}).scalar()
+            if upto is None:
+                break
+            conn.execute(BACKFILL_SQL, {"after": after, "upto": upto})
+            after = upto
+
+    # Stored generated column: one table rewrite, after item_names is filled
+    op.add_column('receipts', sa.Column(
+        'search_vector', postgresql.TSVECTOR(),
+        sa.Computed(SEARCH_VECTOR_SQL, persisted=True), nullable=True))
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_receipts_search_vector', 'receipts', ['search_vector'],
+                        postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_receipts_search_vector', table_name='receipts',
+                      postgresql_concurrently=True)
+    op.drop_column('receipts', 'search_vector')
+    op.drop_column('receipts', 'item_names')
+    op.drop_column('receipts', 'ocr_text')
@@ -0,0 +1,30 @@
+"""add batch_id to receipts
+
+Revision ID: 5e8c1f27a9b3
+Revises: d93a6b0f5c14
+Create Date: 2025-10-23 11:20:54.039127
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e8c1f27a9b3'
+down_revision: Union[str, Sequence[str], None] = 'd93a6b0f5c14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('receipts', sa.Column('batch_id', sa.String(), nullable=True))
+    op.create_index(op.f('ix_receipts_batch_id'), 'receipts', ['batch_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_receipts_batch_id'), table_name='receipts')
+    op.drop_column('receipts', 'batch_id')
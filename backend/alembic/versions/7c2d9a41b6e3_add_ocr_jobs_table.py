@@ -0,0 +1,49 @@
+"""add ocr_jobs table
+
+Revision ID: 7c2d9a41b6e3
+Revises: e347f92dd51f
+Create Date: 2025-10-20 10:12:31.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c2d9a41b6e3'
+down_revision: Union[str, Sequence[str], None] = 'e347f92dd51f'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('ocr_jobs',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('receipt_id', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('filename', sa.String(), nullable=True),
+    sa.Column('mime', sa.String(), nullable=True),
+    sa.Column('payload', sa.LargeBinary(), nullable=True),
+    sa.Column('error', sa.Text(), nullable=True),
+    sa.Column('run_after', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('lease_expires_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    sa.ForeignKeyConstraint(['receipt_id'], ['receipts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ocr_jobs_receipt_id'), 'ocr_jobs', ['receipt_id'], unique=False)
+    op.create_index('ix_ocr_jobs_status_run_after', 'ocr_jobs', ['status', 'run_after'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_ocr_jobs_status_run_after', table_name='ocr_jobs')
+    op.drop_index(op.f('ix_ocr_jobs_receipt_id'), table_name='ocr_jobs')
+    op.drop_table('ocr_jobs')
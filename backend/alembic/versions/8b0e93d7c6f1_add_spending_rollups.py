@@ -0,0 +1,46 @@
+"""add spending_rollups
+
+Revision ID: 8b0e93d7c6f1
+Revises: f18d4b6e2a75
+Create Date: 2025-10-29 15:12:08.447902
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b0e93d7c6f1'
+down_revision: Union[str, Sequence[str], None] = 'f18d4b6e2a75'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('spending_rollups',
+    sa.Column('period', sa.Date(), nullable=False),
+    sa.Column('category', sa.String(), nullable=False),
+    sa.Column('vendor', sa.String(), nullable=False),
+    sa.Column('currency', sa.String(), nullable=False),
+    sa.Column('receipt_count', sa.Integer(), nullable=False),
+    sa.Column('total_amount', sa.Numeric(), nullable=False),
+    sa.PrimaryKeyConstraint('period', 'category', 'vendor', 'currency')
+    )
+    # Initial fill; same query as `python -m app.rollups rebuild`
+    op.execute("""
+        INSERT INTO spending_rollups (period, category, vendor, currency, receipt_count, total_amount)
+        SELECT date_trunc('month', COALESCE(expense_date, created_at AT TIME ZONE 'UTC'))::date,
+               COALESCE(category, ''), COALESCE(vendor, ''), COALESCE(currency, ''),
+               count(*), sum(amount)
+        FROM receipts
+        WHERE deleted = false AND amount IS NOT NULL
+        GROUP BY 1, 2, 3, 4
+    """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('spending_rollups')
@@ -0,0 +1,36 @@
+"""add vendor_templates
+
+Revision ID: 9f3b6d2e8a41
+Revises: 4d7a2e9c1b58
+Create Date: 2025-11-12 10:41:27.118305
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9f3b6d2e8a41'
+down_revision: Union[str, Sequence[str], None] = '4d7a2e9c1b58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('vendor_templates',
+    sa.Column('fingerprint', sa.String(length=16), nullable=False),
+    sa.Column('vendor', sa.String(), nullable=True),
+    sa.Column('template', sa.JSON(), nullable=False),
+    sa.Column('samples', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('fingerprint')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('vendor_templates')
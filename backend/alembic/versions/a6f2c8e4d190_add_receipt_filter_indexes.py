@@ -0,0 +1,56 @@
+"""add receipt filter indexes
+
+Revision ID: a6f2c8e4d190
+Revises: 5e8c1f27a9b3
+Create Date: 2025-10-24 16:05:12.550931
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a6f2c8e4d190'
+down_revision: Union[str, Sequence[str], None] = '5e8c1f27a9b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+LIVE = sa.text('deleted = false')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # CONCURRENTLY can't run inside a transaction; build without locking writes
+    with op.get_context().autocommit_block():
+        op.create_index('ix_receipts_live_created_at', 'receipts',
+                        [sa.text('created_at DESC'), sa.text('id DESC')],
+                        postgresql_where=LIVE, postgresql_concurrently=True)
+        op.create_index('ix_receipts_live_expense_date', 'receipts', ['expense_date'],
+                        postgresql_where=LIVE, postgresql_concurrently=True)
+        op.create_index('ix_receipts_live_category', 'receipts',
+                        ['category', sa.text('created_at DESC')],
+                        postgresql_where=LIVE, postgresql_concurrently=True)
+        op.create_index('ix_receipts_live_amount', 'receipts', ['amount'],
+                        postgresql_where=LIVE, postgresql_concurrently=True)
+        op.create_index('ix_receipts_vendor_trgm', 'receipts', ['vendor'],
+                        postgresql_using='gin',
+                        postgresql_ops={'vendor': 'gin_trgm_ops'},
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name in (
+            'ix_receipts_vendor_trgm',
+            'ix_receipts_live_amount',
+            'ix_receipts_live_category',
+            'ix_receipts_live_expense_date',
+            'ix_receipts_live_created_at',
+        ):
+            op.drop_index(name, table_name='receipts', postgresql_concurrently=True)
@@ -0,0 +1,81 @@
+"""add receipt_keys (id -> created_at) for partition-pruned lookups
+
+Revision ID: a8c2e5f7d310
+Revises: f3b9d6a1c274
+Create Date: 2025-11-26 09:51:44.027318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8c2e5f7d310'
+down_revision: Union[str, Sequence[str], None] = 'f3b9d6a1c274'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_BATCH = 5000
+
+BACKFILL_SQL = sa.text("""
+    INSERT INTO receipt_keys (id, created_at)
+    SELECT id, created_at FROM receipts WHERE id > :after AND id <= :upto
+    ON CONFLICT (id) DO NOTHING
+""")
+
+NEXT_BATCH_SQL = sa.text("""
+    SELECT max(id) FROM (
+        SELECT id FROM receipts WHERE id > :after ORDER BY id LIMIT :batch
+    ) b
+""")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('receipt_keys',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # Kept in step with receipts by row triggers (moves between partitions
+    # are a delete + insert, so the key survives them)
+    op.execute("""
+        CREATE FUNCTION receipts_track_key() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO receipt_keys (id, created_at) VALUES (NEW.id, NEW.created_at)
+                ON CONFLICT (id) DO UPDATE SET created_at = EXCLUDED.created_at;
+            ELSE
+                DELETE FROM receipt_keys WHERE id = OLD.id;
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER receipts_track_key
+        AFTER INSERT OR DELETE ON receipts
+        FOR EACH ROW EXECUTE FUNCTION receipts_track_key()
+    """)
+
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        after = ''
+        while True:
+            upto = conn.execute(NEXT_BATCH_SQL, {"after": after, "batch": BACKFILL_BATCH}).scalar()
+            if upto is None:
+                break
+            conn.execute(BACKFILL_SQL, {"after": after, "upto": upto})
+            after = upto
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute('DROP TRIGGER receipts_track_key ON receipts')
+    op.execute('DROP FUNCTION receipts_track_key()')
+    op.drop_table('receipt_keys')
@@ -0,0 +1,40 @@
+"""add content_hash and parse_cache
+
+Revision ID: b41f0e6c8d27
+Revises: 7c2d9a41b6e3
+Create Date: 2025-10-21 09:03:47.118203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41f0e6c8d27'
+down_revision: Union[str, Sequence[str], None] = '7c2d9a41b6e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('receipts', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.create_index(op.f('ix_receipts_content_hash'), 'receipts', ['content_hash'], unique=False)
+    op.create_table('parse_cache',
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('receipt_id', sa.String(), nullable=True),
+    sa.Column('parsed', sa.JSON(), nullable=False),
+    sa.Column('hits', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['receipt_id'], ['receipts.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('parse_cache')
+    op.drop_index(op.f('ix_receipts_content_hash'), table_name='receipts')
+    op.drop_column('receipts', 'content_hash')
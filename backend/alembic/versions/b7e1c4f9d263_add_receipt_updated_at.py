@@ -0,0 +1,69 @@
+"""add receipt updated_at and deleted_at
+
+Revision ID: b7e1c4f9d263
+Revises: 9f3b6d2e8a41
+Create Date: 2025-11-14 09:18:52.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7e1c4f9d263'
+down_revision: Union[str, Sequence[str], None] = '9f3b6d2e8a41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_BATCH = 5000
+
+# Best guess for existing rows: last OCR write, else creation. Rows written
+# since the column was added already carry a newer updated_at and are skipped.
+BACKFILL_SQL = sa.text("""
+    UPDATE receipts
+    SET updated_at = coalesce(ocr_finished_at, created_at, updated_at),
+        deleted_at = CASE WHEN deleted THEN coalesce(ocr_finished_at, created_at, updated_at) END
+    WHERE id > :after AND id <= :upto AND updated_at = :added_at
+""")
+
+NEXT_BATCH_SQL = sa.text("""
+    SELECT max(id) FROM (
+        SELECT id FROM receipts WHERE id > :after ORDER BY id LIMIT :batch
+    ) b
+""")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # now() is stable, so the default is stored once (no table rewrite) and
+    # every existing row reads this transaction's timestamp until backfilled
+    op.add_column('receipts', sa.Column('updated_at', sa.DateTime(timezone=True),
+                                        server_default=sa.text('now()'), nullable=True))
+    op.add_column('receipts', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    added_at = op.get_bind().execute(sa.text("SELECT now()")).scalar()
+
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        after = ''
+        while True:
+            upto = conn.execute(NEXT_BATCH_SQL, {"after": after, "batch": BACKFILL_BATCH}).scalar()
+            if upto is None:
+                break
+            conn.execute(BACKFILL_SQL, {"after": after, "upto": upto, "added_at": added_at})
+            after = upto
+
+    with op.get_context().autocommit_block():
+        op.create_index('ix_receipts_updated_at', 'receipts', ['updated_at', 'id'],
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_receipts_updated_at', table_name='receipts',
+                      postgresql_concurrently=True)
+    op.drop_column('receipts', 'deleted_at')
+    op.drop_column('receipts', 'updated_at')
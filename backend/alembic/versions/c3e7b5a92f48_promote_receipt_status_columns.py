@@ -0,0 +1,78 @@
+"""promote receipt status columns
+
+Revision ID: c3e7b5a92f48
+Revises: a6f2c8e4d190
+Create Date: 2025-10-27 09:48:33.610274
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e7b5a92f48'
+down_revision: Union[str, Sequence[str], None] = 'a6f2c8e4d190'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_BATCH = 5000
+
+# Same rules the old hide_failed filter used: an error in data means failed,
+# a vendor means parsed, anything else is still processing.
+BACKFILL_SQL = sa.text("""
+    UPDATE receipts r
+    SET status = COALESCE(
+            NULLIF(r.data->>'status', ''),
+            CASE
+                WHEN COALESCE(r.data->>'error', '') <> '' THEN 'failed'
+                WHEN r.vendor IS NOT NULL THEN 'parsed'
+                ELSE 'processing'
+            END),
+        error_message = NULLIF(r.data->>'error', '')
+    WHERE r.id > :after AND r.id <= :upto AND r.status IS NULL
+""")
+
+# Walk the primary key so each batch starts where the last one stopped
+NEXT_BATCH_SQL = sa.text("""
+    SELECT max(id) FROM (
+        SELECT id FROM receipts WHERE id > :after ORDER BY id LIMIT :batch
+    ) b
+""")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('receipts', sa.Column('status', sa.String(), nullable=True))
+    op.add_column('receipts', sa.Column('error_message', sa.Text(), nullable=True))
+    op.add_column('receipts', sa.Column('ocr_started_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('receipts', sa.Column('ocr_finished_at', sa.DateTime(timezone=True), nullable=True))
+
+    # Backfill from the data JSON in committed batches to keep locks short
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        after = ''
+        while True:
+            upto = conn.execute(NEXT_BATCH_SQL, {"after": after, "batch": BACKFILL_BATCH}).scalar()
+            if upto is None:
+                break
+            conn.execute(BACKFILL_SQL, {"after": after, "upto": upto})
+            after = upto
+
+        op.create_index('ix_receipts_live_status', 'receipts',
+                        ['status', sa.text('created_at DESC')],
+                        postgresql_where=sa.text('deleted = false'),
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_receipts_live_status', table_name='receipts',
+                      postgresql_concurrently=True)
+    op.drop_column('receipts', 'ocr_finished_at')
+    op.drop_column('receipts', 'ocr_started_at')
+    op.drop_column('receipts', 'error_message')
+    op.drop_column('receipts', 'status')
@@ -0,0 +1,171 @@
+"""partition receipts by created_at month, add receipts_archive
+
+Revision ID: c5d8a2f1e907
+Revises: b7e1c4f9d263
+Create Date: 2025-11-21 10:42:07.318455
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5d8a2f1e907'
+down_revision: Union[str, Sequence[str], None] = 'b7e1c4f9d263'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+MONTHS_AHEAD = 3
+LIVE = sa.text('deleted = false')
+
+# (table, ondelete) of the foreign keys that pointed at receipts.id
+DEPENDENTS = (
+    ('ocr_jobs', 'CASCADE'),
+    ('receipt_items', 'CASCADE'),
+    ('parse_cache', 'SET NULL'),
+)
+
+
+def _add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _copy_columns(conn, table: str) -> str:
+    """Columns of `table` that can be inserted (search_vector is generated)."""
+    names = conn.execute(sa.text("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = :table AND is_generated = 'NEVER'
+        ORDER BY ordinal_position
+    """), {"table": table}).scalars().all()
+    return ", ".join(names)
+
+
+def _create_indexes() -> None:
+    op.create_index('ix_receipts_live_created_at', 'receipts',
+                    [sa.text('created_at DESC'), sa.text('id DESC')], postgresql_where=LIVE)
+    op.create_index('ix_receipts_live_expense_date', 'receipts', ['expense_date'],
+                    postgresql_where=LIVE)
+    op.create_index('ix_receipts_live_category', 'receipts',
+                    ['category', sa.text('created_at DESC')], postgresql_where=LIVE)
+    op.create_index('ix_receipts_live_amount', 'receipts', ['amount'], postgresql_where=LIVE)
+    op.create_index('ix_receipts_live_status', 'receipts',
+                    ['status', sa.text('created_at DESC')], postgresql_where=LIVE)
+    op.create_index('ix_receipts_vendor_trgm', 'receipts', ['vendor'], postgresql_using='gin',
+                    postgresql_ops={'vendor': 'gin_trgm_ops'})
+    op.create_index('ix_receipts_search_vector', 'receipts', ['search_vector'],
+                    postgresql_using='gin')
+    op.create_index('ix_receipts_updated_at', 'receipts', ['updated_at', 'id'])
+    op.create_index(op.f('ix_receipts_content_hash'), 'receipts', ['content_hash'], unique=False)
+    op.create_index(op.f('ix_receipts_batch_id'), 'receipts', ['batch_id'], unique=False)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A table can't be turned into a partitioned one in place: rebuild it in
+    # one transaction. This holds an exclusive lock for the whole copy, so run
+    # it with the API and workers stopped.
+    conn = op.get_bind()
+    op.execute('LOCK TABLE receipts IN ACCESS EXCLUSIVE MODE')
+
+    # Postgres can't point a foreign key at a partitioned table
+    constraints = conn.execute(sa.text("""
+        SELECT conrelid::regclass::text AS source, conname FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = CAST('receipts' AS regclass)
+    """)).all()
+    for source, name in constraints:
+        op.drop_constraint(name, source, type_='foreignkey')
+
+    op.rename_table('receipts', 'receipts_unpartitioned')
+    op.execute('UPDATE receipts_unpartitioned SET created_at = now() WHERE created_at IS NULL')
+    op.execute("""
+        CREATE TABLE receipts (
+            LIKE receipts_unpartitioned INCLUDING DEFAULTS INCLUDING GENERATED
+        ) PARTITION BY RANGE (created_at)
+    """)
+
+    # One partition per month from the oldest receipt to MONTHS_AHEAD months
+    # from now, plus a default; app.partitions keeps creating them from here
+    first, current = conn.execute(sa.text("""
+        SELECT date_trunc('month', coalesce(min(created_at), now()))::date,
+               date_trunc('month', now())::date
+        FROM receipts_unpartitioned
+    """)).one()
+    month = first
+    while month <= _add_months(current, MONTHS_AHEAD):
+        upper = _add_months(month, 1)
+        op.execute(f"CREATE TABLE receipts_p{month:%Y%m} PARTITION OF receipts "
+                   f"FOR VALUES FROM ('{month.isoformat()}') TO ('{upper.isoformat()}')")
+        month = upper
+    op.execute('CREATE TABLE receipts_pdefault PARTITION OF receipts DEFAULT')
+
+    columns = _copy_columns(conn, 'receipts_unpartitioned')
+    op.execute(f'INSERT INTO receipts ({columns}) SELECT {columns} FROM receipts_unpartitioned')
+    op.drop_table('receipts_unpartitioned')
+
+    op.create_primary_key('receipts_pkey', 'receipts', ['id', 'created_at'])
+    _create_indexes()
+    op.create_index('ix_receipts_deleted_at', 'receipts', ['deleted_at'],
+                    postgresql_where=sa.text('deleted = true'))
+
+    op.create_table('receipts_archive',
+    sa.Column('id', sa.String(), nullable=False),
+    sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('deleted', sa.Boolean(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True),
+    sa.Column('vendor', sa.String(), nullable=True),
+    sa.Column('amount', sa.Numeric(), nullable=True),
+    sa.Column('currency', sa.String(), nullable=True),
+    sa.Column('expense_date', sa.DateTime(), nullable=True),
+    sa.Column('category', sa.String(), nullable=True),
+    sa.Column('status', sa.String(), nullable=True),
+    sa.Column('batch_id', sa.String(), nullable=True),
+    sa.Column('content_hash', sa.String(length=64), nullable=True),
+    sa.Column('data', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('archived_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    conn = op.get_bind()
+    op.execute('LOCK TABLE receipts IN ACCESS EXCLUSIVE MODE')
+    op.execute("""
+        CREATE TABLE receipts_unpartitioned (
+            LIKE receipts INCLUDING DEFAULTS INCLUDING GENERATED
+        )
+    """)
+    columns = _copy_columns(conn, 'receipts')
+    op.execute(f'INSERT INTO receipts_unpartitioned ({columns}) SELECT {columns} FROM receipts')
+
+    # Archived rows come back without their line items (they live in data["items"])
+    archived = ('id, created_at, updated_at, deleted, deleted_at, vendor, amount, currency, '
+                'expense_date, category, status, batch_id, content_hash')
+    op.execute(f"""
+        INSERT INTO receipts_unpartitioned ({archived}, data)
+        SELECT {archived}, CAST(CAST(data AS text) AS json) FROM receipts_archive
+    """)
+    op.drop_table('receipts_archive')
+    op.execute('DROP TABLE receipts')
+    op.rename_table('receipts_unpartitioned', 'receipts')
+    op.alter_column('receipts', 'created_at', nullable=True)
+
+    op.create_primary_key('receipts_pkey', 'receipts', ['id'])
+    _create_indexes()
+
+    for table, ondelete in DEPENDENTS:
+        # Rows whose receipt was archived have nothing left to point at
+        if ondelete == 'SET NULL':
+            op.execute(f"UPDATE {table} SET receipt_id = NULL "
+                       f"WHERE receipt_id NOT IN (SELECT id FROM receipts)")
+        else:
+            op.execute(f"DELETE FROM {table} WHERE receipt_id NOT IN (SELECT id FROM receipts)")
+        op.create_foreign_key(f'{table}_receipt_id_fkey', table, 'receipts',
+                              ['receipt_id'], ['id'], ondelete=ondelete)
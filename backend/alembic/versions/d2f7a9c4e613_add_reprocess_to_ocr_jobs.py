@@ -0,0 +1,30 @@
+"""add reprocess flag to ocr_jobs
+
+Revision ID: d2f7a9c4e613
+Revises: a8c2e5f7d310
+Create Date: 2025-11-27 14:22:08.561930
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2f7a9c4e613'
+down_revision: Union[str, Sequence[str], None] = 'a8c2e5f7d310'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Constant default: metadata-only on Postgres 11+, no table rewrite
+    op.add_column('ocr_jobs', sa.Column('reprocess', sa.Boolean(), server_default=sa.false(),
+                                        nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('ocr_jobs', 'reprocess')
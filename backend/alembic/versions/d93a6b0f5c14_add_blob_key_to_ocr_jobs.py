@@ -0,0 +1,28 @@
+"""add blob_key to ocr_jobs
+
+Revision ID: d93a6b0f5c14
+Revises: b41f0e6c8d27
+Create Date: 2025-10-22 14:41:05.772310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd93a6b0f5c14'
+down_revision: Union[str, Sequence[str], None] = 'b41f0e6c8d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('ocr_jobs', sa.Column('blob_key', sa.String(length=64), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('ocr_jobs', 'blob_key')
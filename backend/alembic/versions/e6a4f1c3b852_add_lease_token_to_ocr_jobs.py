@@ -0,0 +1,28 @@
+"""add lease_token to ocr_jobs
+
+Revision ID: e6a4f1c3b852
+Revises: c5d8a2f1e907
+Create Date: 2025-11-24 11:06:39.184027
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6a4f1c3b852'
+down_revision: Union[str, Sequence[str], None] = 'c5d8a2f1e907'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('ocr_jobs', sa.Column('lease_token', sa.String(length=22), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('ocr_jobs', 'lease_token')
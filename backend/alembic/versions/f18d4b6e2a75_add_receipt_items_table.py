@@ -0,0 +1,93 @@
+"""add receipt_items table
+
+Revision ID: f18d4b6e2a75
+Revises: c3e7b5a92f48
+Create Date: 2025-10-28 13:37:20.905816
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f18d4b6e2a75'
+down_revision: Union[str, Sequence[str], None] = 'c3e7b5a92f48'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+BACKFILL_BATCH = 2000
+
+NUMERIC_RE = r"'^\s*-?[0-9]+(\.[0-9]+)?\s*$'"
+
+
+def _numeric(expr: str) -> str:
+    return f"CASE WHEN {expr} ~ {NUMERIC_RE} THEN ({expr})::numeric END"
+
+
+# Items live in data->'items' (or data->'parsed'->'transaction'->'items' on
+# the oldest rows, same fallback get_receipt used)
+BACKFILL_SQL = sa.text(f"""
+    INSERT INTO receipt_items (receipt_id, position, name, quantity, unit_price, total_price, category)
+    SELECT r.id,
+           e.ord - 1,
+           e.item->>'name',
+           {_numeric("e.item->>'quantity'")},
+           {_numeric("e.item->>'unit_price'")},
+           {_numeric("e.item->>'total_price'")},
+           e.item->>'category'
+    FROM receipts r
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(r.data->'items', r.data->'parsed'->'transaction'->'items') AS items
+    ) src
+    CROSS JOIN LATERAL json_array_elements(
+        CASE WHEN json_typeof(src.items) = 'array' THEN src.items ELSE '[]'::json END
+    ) WITH ORDINALITY AS e(item, ord)
+    WHERE r.id > :after AND r.id <= :upto
+      AND json_typeof(e.item) = 'object'
+""")
+
+NEXT_BATCH_SQL = sa.text("""
+    SELECT max(id) FROM (
+        SELECT id FROM receipts WHERE id > :after ORDER BY id LIMIT :batch
+    ) b
+""")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('receipt_items',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('receipt_id', sa.String(), nullable=False),
+    sa.Column('position', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=True),
+    sa.Column('quantity', sa.Numeric(), nullable=True),
+    sa.Column('unit_price', sa.Numeric(), nullable=True),
+    sa.Column('total_price', sa.Numeric(), nullable=True),
+    sa.Column('category', sa.String(), nullable=True),
+    sa.ForeignKeyConstraint(['receipt_id'], ['receipts.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_receipt_items_receipt_id'), 'receipt_items', ['receipt_id'], unique=False)
+    op.create_index('ix_receipt_items_name_trgm', 'receipt_items', ['name'],
+                    postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'})
+
+    # Backfill from the JSON blobs, one committed batch of receipts at a time
+    with op.get_context().autocommit_block():
+        conn = op.get_bind()
+        after = ''
+        while True:
+            upto = conn.execute(NEXT_BATCH_SQL, {"after": after, "batch": BACKFILL_BATCH}).scalar()
+            if upto is None:
+                break
+            conn.execute(BACKFILL_SQL, {"after": after, "upto": upto})
+            after = upto
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_receipt_items_name_trgm', table_name='receipt_items')
+    op.drop_index(op.f('ix_receipt_items_receipt_id'), table_name='receipt_items')
+    op.drop_table('receipt_items')
@@ -0,0 +1,53 @@
+"""add receipts.change_xid for commit-safe delta sync
+
+Revision ID: f3b9d6a1c274
+Revises: e6a4f1c3b852
+Create Date: 2025-11-24 15:32:18.240761
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b9d6a1c274'
+down_revision: Union[str, Sequence[str], None] = 'e6a4f1c3b852'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Constant default: no table rewrite; existing rows sort first in a full sync
+    op.add_column('receipts', sa.Column('change_xid', sa.BigInteger(),
+                                        server_default=sa.text('0'), nullable=False))
+
+    # Every insert / update stamps the writing transaction's id (PostgreSQL 13+).
+    # Row triggers on the partitioned parent apply to all current and future partitions.
+    op.execute("""
+        CREATE FUNCTION receipts_stamp_change_xid() RETURNS trigger
+        LANGUAGE plpgsql AS $$
+        BEGIN
+            NEW.change_xid := pg_current_xact_id()::text::bigint;
+            RETURN NEW;
+        END
+        $$
+    """)
+    op.execute("""
+        CREATE TRIGGER receipts_stamp_change_xid
+        BEFORE INSERT OR UPDATE ON receipts
+        FOR EACH ROW EXECUTE FUNCTION receipts_stamp_change_xid()
+    """)
+
+    # CONCURRENTLY isn't available on a partitioned parent; this blocks writes while it builds
+    op.create_index('ix_receipts_change_xid', 'receipts', ['change_xid', 'id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_receipts_change_xid', table_name='receipts')
+    op.execute('DROP TRIGGER receipts_stamp_change_xid ON receipts')
+    op.execute('DROP FUNCTION receipts_stamp_change_xid()')
+    op.drop_column('receipts', 'change_xid')
@@ -0,0 +1,95 @@
+# app/batch.py
+"""
+Batch ingestion helpers: expand multi-file and ZIP uploads into blobs.
+"""
+import asyncio
+import os
+import zipfile
+from dataclasses import dataclass
+from typing import BinaryIO, List, Optional
+
+from fastapi import HTTPException, UploadFile
+
+from app import storage
+from app.config import env_int
+
+
+ZIP_MAGIC = b"PK\x03\x04"
+
+
+@dataclass
+class IngestedItem:
+    filename: Optional[str]
+    blob: Optional[storage.BlobRef] = None
+    error: Optional[str] = None
+
+
+def max_batch_items() -> int:
+    return env_int("BATCH_MAX_ITEMS", 5000)
+
+
+def _is_image_member(path: str) -> bool:
+    name = os.path.basename(path)
+    return bool(name) and not name.startswith(".") and "__MACOSX" not in path
+
+
+def _ingest_zip(fileobj: BinaryIO, remaining: int) -> List[IngestedItem]:
+    items = []
+    limit = storage.max_upload_bytes()
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile as e:
+        return [IngestedItem(filename=None, error=f"Invalid ZIP archive: {e}")]
+
+    with archive:
+        members = [
+            info for info in archive.infolist()
+            if not info.is_dir() and _is_image_member(info.filename)
+        ]
+        # Same 413 as the multi-file path, raised before anything is stored
+        if len(members) > remaining:
+            raise HTTPException(
+                status_code=413, detail=f"Batch exceeds {max_batch_items()} items")
+        for info in members:
+            name = os.path.basename(info.filename)
+            # Check the declared size first so an oversized member is never inflated
+            if info.file_size > limit:
+                items.append(IngestedItem(name, error=f"File exceeds {limit} bytes"))
+                continue
+            try:
+                with archive.open(info) as member:
+                    items.append(IngestedItem(name, blob=storage.save_fileobj(member)))
+            except HTTPException as e:
+                items.append(IngestedItem(name, error=e.detail))
+            except Exception as e:
+                items.append(IngestedItem(name, error=str(e)))
+    return items
+
+
+async def ingest_files(files: List[UploadFile]) -> List[IngestedItem]:
+    """
+    Store every uploaded image (and every image inside uploaded ZIPs) in the
+    blob store. Per-item failures are reported, not raised.
+    """
+    limit = max_batch_items()
+    items: List[IngestedItem] = []
+
+    for file in files:
+        remaining = limit - len(items)
+        if remaining <= 0:
+            raise HTTPException(
+                status_code=413, detail=f"Batch exceeds {limit} items")
+
+        head = await file.read(len(ZIP_MAGIC))
+        await file.seek(0)
+
+        if head == ZIP_MAGIC:
+            items.extend(await asyncio.to_thread(_ingest_zip, file.file, remaining))
+            continue
+
+        try:
+            items.append(IngestedItem(file.filename, blob=await storage.save_upload(file)))
+        except HTTPException as e:
+            items.append(IngestedItem(file.filename, error=e.detail))
+
+    return items
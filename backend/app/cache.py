@@ -0,0 +1,263 @@
+# app/cache.py
+"""
+Response cache for receipt reads with version-based ETags.
+
+Serialized responses are cached per receipt and per list query.
+
+- Receipt ETags come from the row's `updated_at`, read from the database on
+  every request (one primary-key lookup), so they are correct no matter
+  which process wrote the row.
+- List ETags use a generation counter that every write path bumps through
+  `invalidate_receipt` / `invalidate_all_receipts`.
+
+Backends: an in-process LRU with TTL (default), or a Redis-compatible server
+when CACHE_REDIS_URL is set and the optional `redis` package is installed.
+The in-process backend only sees writes from its own process, so list
+caching stays off with it unless CACHE_LISTS_IN_MEMORY=true is set for a
+deployment known to run a single process with in-process OCR workers.
+Redis errors are logged and treated as a miss (reads) or a no-op (writes);
+a request never fails because the cache is down.
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.config import env_bool, env_float, env_int, env_str
+
+
+class MemoryBackend:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._items: OrderedDict = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+        # Counters restart at 0 with the process; the nonce keeps old ETags invalid
+        self.nonce = uuid.uuid4().hex[:8]
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._items.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int):
+        with self._lock:
+            self._items[key] = (value, time.monotonic() + ttl)
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._items.pop(key, None)
+
+    def counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+
+class RedisBackend:
+    def __init__(self, url: str):
+        import redis  # optional dependency
+
+        timeout = env_float("CACHE_REDIS_TIMEOUT_SECONDS", 0.5)
+        self.client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.errors = redis.RedisError
+        self.nonce = "r"  # counters persist in Redis
+        self._warned_at = 0.0
+
+    def _failed(self, op: str, e: Exception):
+        _count("errors")
+        now = time.monotonic()
+        if now - self._warned_at > 60:
+            self._warned_at = now
+            print(f"⚠️ Redis cache {op} failed, serving without cache:", e)
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(f"rc:{key}")
+        except self.errors as e:
+            self._failed("get", e)
+            return None
+
+    def set(self, key: str, value: bytes, ttl: int):
+        try:
+            self.client.set(f"rc:{key}", value, ex=ttl)
+        except self.errors as e:
+            self._failed("set", e)
+
+    def delete(self, key: str):
+        try:
+            self.client.delete(f"rc:{key}")
+        except self.errors as e:
+            self._failed("delete", e)
+
+    def counter(self, key: str) -> Optional[int]:
+        """None when Redis can't be read: the caller must not cache under a guess."""
+        try:
+            return int(self.client.get(f"rv:{key}") or 0)
+        except self.errors as e:
+            self._failed("counter", e)
+            return None
+
+    def incr(self, key: str) -> Optional[int]:
+        try:
+            return int(self.client.incr(f"rv:{key}"))
+        except self.errors as e:
+            # Lists cached under the old generation live on until their TTL
+            self._failed("incr", e)
+            return None
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "not_modified": 0, "invalidations": 0, "errors": 0}
+_stats_lock = threading.Lock()
+_lists_warned = False
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                url = env_str("CACHE_REDIS_URL")
+                backend = None
+                if url:
+                    try:
+                        backend = RedisBackend(url)
+                    except Exception as e:
+                        print("⚠️ Redis cache unavailable, using in-process LRU:", e)
+                _backend = backend or MemoryBackend(env_int("CACHE_MAX_ENTRIES", 2048))
+    return _backend
+
+
+def enabled() -> bool:
+    return env_bool("CACHE_ENABLED", True)
+
+
+def ttl() -> int:
+    return env_int("CACHE_TTL_SECONDS", 300)
+
+
+def lists_enabled() -> bool:
+    """
+    List caching needs a backend that sees every writer's invalidations:
+    Redis, or the in-process LRU when explicitly opted into with
+    CACHE_LISTS_IN_MEMORY (single process, in-process OCR workers only).
+    """
+    global _lists_warned
+    if not enabled():
+        return False
+    if isinstance(get_backend(), RedisBackend) or env_bool("CACHE_LISTS_IN_MEMORY", False):
+        return True
+    if not _lists_warned:
+        _lists_warned = True
+        print("⚠️ List response cache disabled: set CACHE_REDIS_URL "
+              "(or CACHE_LISTS_IN_MEMORY=true for a single-process deployment)")
+    return False
+
+
+def _count(name: str):
+    with _stats_lock:
+        _stats[name] += 1
+
+
+# ─────────────────────────────
+# Keys / ETags
+# ─────────────────────────────
+def receipt_etag(receipt_id: str, updated_at) -> str:
+    """ETag for the receipt row as last written (`updated_at` from the DB)."""
+    version = hashlib.sha1(str(updated_at).encode()).hexdigest()[:12]
+    return f'W/"{receipt_id}-{version}"'
+
+
+def list_etag(params: dict) -> Optional[Tuple[str, str]]:
+    """
+    (cache key, etag) for a list query under the current list generation,
+    or None when the generation can't be read (serve the list uncached).
+    """
+    backend = get_backend()
+    generation = backend.counter("list")
+    if generation is None:
+        return None
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()[:16]
+    return f"list:{generation}:{digest}", f'W/"l-{backend.nonce}-{generation}-{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+# ─────────────────────────────
+# Read / write
+# ─────────────────────────────
+def get(key: str, etag: str) -> Optional[bytes]:
+    """
+    Cached body for `key`, only if it was stored under `etag`. A reader that
+    raced a write may have cached an older body; the version check drops it.
+    """
+    if not enabled():
+        return None
+    value = get_backend().get(key)
+    if value is not None:
+        stored_etag, _, body = value.partition(b"\n")
+        if stored_etag.decode() == etag:
+            _count("hits")
+            return body
+    _count("misses")
+    return None
+
+
+def put(key: str, etag: str, body: bytes):
+    if enabled():
+        get_backend().set(key, etag.encode() + b"\n" + body, ttl())
+
+
+def note_not_modified():
+    _count("not_modified")
+
+
+def invalidate_receipt(*receipt_ids: str):
+    """Call after any committed write that changes these receipts."""
+    backend = get_backend()
+    for receipt_id in receipt_ids:
+        backend.delete(f"receipt:{receipt_id}")  # superseded by the new updated_at anyway
+    invalidate_lists()
+    _count("invalidations")
+
+
+def invalidate_all_receipts():
+    """Bulk writes: receipt ETags follow updated_at; only lists need a bump."""
+    invalidate_lists()
+    _count("invalidations")
+
+
+def invalidate_lists():
+    get_backend().incr("list")
+
+
+def stats() -> dict:
+    backend = get_backend()
+    with _stats_lock:
+        counters = dict(_stats)
+    return {"backend": type(backend).__name__, "enabled": enabled(),
+            "lists_enabled": lists_enabled(), **counters}
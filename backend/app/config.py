@@ -0,0 +1,44 @@
+# app/config.py
+import os
+from typing import Optional
+from dotenv import load_dotenv
+
+
+_loaded = False
+
+
+def _ensure_env():
+    """Read .env once per process (later calls are no-ops)."""
+    global _loaded
+    if not _loaded:
+        load_dotenv()
+        _loaded = True
+
+
+def env_str(name: str, default: Optional[str] = None) -> Optional[str]:
+    _ensure_env()
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def env_int(name: str, default: int) -> int:
+    value = env_str(name)
+    try:
+        return int(value) if value is not None else default
+    except ValueError:
+        return default
+
+
+def env_float(name: str, default: float) -> float:
+    value = env_str(name)
+    try:
+        return float(value) if value is not None else default
+    except ValueError:
+        return default
+
+
+def env_bool(name: str, default: bool) -> bool:
+    value = env_str(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
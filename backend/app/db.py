@@ -1,23 +1,144 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-import os
-from dotenv import load_dotenv
+from typing import Optional
+import threading
+import time
+
+from app.config import env_str, env_int, env_bool
 
 
 def get_database_url() -> str:
     """Lazily load .env and return DATABASE_URL."""
-    load_dotenv()  # ensures .env is read even if main.py hasn't run yet
-    db_url = os.getenv("DATABASE_URL")
+    db_url = env_str("DATABASE_URL")
     if not db_url:
         raise ValueError("DATABASE_URL not set in environment variables.")
     return db_url
 
 
-# Initialize engine only when needed
-def get_engine():
-    """Return a SQLAlchemy engine instance."""
-    return create_engine(get_database_url())
+# ─────────────────────────────
+# ✅ Process-wide engine + session factory
+# ─────────────────────────────
+_engine: Optional[Engine] = None
+_SessionLocal: Optional[sessionmaker] = None
+_engine_lock = threading.Lock()
+
+# Time spent waiting for a pooled connection (see TimedQueuePool)
+_wait_stats = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+_wait_lock = threading.Lock()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            _record_wait((time.perf_counter() - started) * 1000)
+
+
+def pool_settings() -> dict:
+    """Pool tuning knobs, overridable through environment variables."""
+    return {
+        "pool_size": env_int("DB_POOL_SIZE", 10),
+        "max_overflow": env_int("DB_MAX_OVERFLOW", 20),
+        "pool_timeout": env_int("DB_POOL_TIMEOUT", 30),
+        "pool_recycle": env_int("DB_POOL_RECYCLE", 1800),
+        "pool_pre_ping": env_bool("DB_POOL_PRE_PING", True),
+    }
+
+
+def get_engine() -> Engine:
+    """Return the shared SQLAlchemy engine, creating it on first use."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(
+                    get_database_url(), poolclass=TimedQueuePool, **pool_settings())
+    return _engine
+
+
+def get_sessionmaker() -> sessionmaker:
+    """Return the shared session factory bound to the process engine."""
+    global _SessionLocal
+    if _SessionLocal is None:
+        engine = get_engine()
+        with _engine_lock:
+            if _SessionLocal is None:
+                _SessionLocal = sessionmaker(
+                    autocommit=False, autoflush=False, bind=engine)
+    return _SessionLocal
+
+
+def warm_pool(connections: Optional[int] = None) -> int:
+    """
+    Open up to `connections` connections (default DB_POOL_WARM or pool_size)
+    so the first requests don't pay for cold Postgres handshakes.
+    Returns the number of connections opened.
+    """
+    engine = get_engine()
+    target = connections if connections is not None else env_int(
+        "DB_POOL_WARM", pool_settings()["pool_size"])
+    opened = []
+    try:
+        for _ in range(max(target, 0)):
+            conn = engine.connect()
+            conn.execute(text("SELECT 1"))
+            opened.append(conn)
+    finally:
+        for conn in opened:
+            conn.close()
+    return len(opened)
+
+
+def dispose_engine():
+    """Close every pooled connection and forget the engine."""
+    global _engine, _SessionLocal
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+        _engine = None
+        _SessionLocal = None
+
+
+def _record_wait(elapsed_ms: float):
+    with _wait_lock:
+        _wait_stats["count"] += 1
+        _wait_stats["total_ms"] += elapsed_ms
+        _wait_stats["max_ms"] = max(_wait_stats["max_ms"], elapsed_ms)
+
+
+def pool_stats() -> dict:
+    """Snapshot of pool usage and connection checkout wait times."""
+    if _engine is None:
+        return {"initialized": False}
+
+    pool = _engine.pool
+    with _wait_lock:
+        count = _wait_stats["count"]
+        total_ms = _wait_stats["total_ms"]
+        max_ms = _wait_stats["max_ms"]
+
+    stats = {
+        "initialized": True,
+        "status": pool.status(),
+        "wait": {
+            "checkouts": count,
+            "avg_ms": round(total_ms / count, 3) if count else 0.0,
+            "max_ms": round(max_ms, 3),
+        },
+    }
+    # QueuePool exposes counters; other pool classes (e.g. NullPool) don't
+    for key in ("size", "checkedin", "checkedout", "overflow"):
+        fn = getattr(pool, key, None)
+        if callable(fn):
+            stats[key] = fn()
+    return stats
 
 
 # Global declarative base (safe to define early)
@@ -26,10 +147,11 @@ Base = declarative_base()
 
 # Dependency for FastAPI routes
 def get_db():
-    """Yield a database session."""
-    engine = get_engine()
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    db = SessionLocal()
+    """
+    Yield a database session from the shared pool. A connection is only
+    checked out on first use, so cache-served requests never touch the pool.
+    """
+    db = get_sessionmaker()()
     try:
         yield db
     finally:
@@ -0,0 +1,148 @@
+# app/dedup.py
+"""
+Content-hash deduplication for uploads.
+
+Parsed OCR results are cached in `parse_cache` (keyed by SHA-256 of the
+uploaded bytes) with an optional in-process LRU in front, so re-uploading
+the same photo never pays for OCR twice.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import env_int, env_str
+
+
+# DEDUP_POLICY: "clone" = new receipt filled from the cached parse,
+#               "link"  = return the receipt that was parsed first,
+#               "off"   = always run OCR
+DEDUP_POLICIES = ("clone", "link", "off")
+
+
+def content_hash(file_bytes: bytes) -> str:
+    return hashlib.sha256(file_bytes).hexdigest()
+
+
+def get_policy() -> str:
+    policy = (env_str("DEDUP_POLICY", "clone") or "").lower()
+    return policy if policy in DEDUP_POLICIES else "clone"
+
+
+class _LRU:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._items: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._items:
+                return None
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def put(self, key, value):
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+
+_lru = _LRU(env_int("DEDUP_LRU_SIZE", 1024))
+_counters = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def lookup(db: Session, digest: str) -> Optional[Tuple[dict, Optional[str]]]:
+    """Return (parsed, original_receipt_id) for a known digest, else None."""
+    cached = _lru.get(digest)
+    if cached is not None:
+        _count("memory_hits")
+        return cached
+
+    row = db.get(models.ParseCache, digest)
+    if row is None:
+        _count("misses")
+        return None
+
+    _count("db_hits")
+    row.hits += 1
+    entry = (row.parsed, row.receipt_id)
+    _lru.put(digest, entry)
+    return entry
+
+
+def lookup_many(db: Session, digests) -> Dict[str, Tuple[dict, Optional[str]]]:
+    """Batch variant of lookup: one IN (...) query for everything not in the LRU."""
+    found = {}
+    missing = []
+    for digest in set(digests):
+        cached = _lru.get(digest)
+        if cached is not None:
+            _count("memory_hits")
+            found[digest] = cached
+        else:
+            missing.append(digest)
+
+    if missing:
+        rows = db.query(models.ParseCache).filter(
+            models.ParseCache.content_hash.in_(missing)).all()
+        for row in rows:
+            _count("db_hits")
+            row.hits += 1
+            found[row.content_hash] = (row.parsed, row.receipt_id)
+            _lru.put(row.content_hash, found[row.content_hash])
+        for _ in range(len(missing) - len(rows)):
+            _count("misses")
+    return found
+
+
+def store(db: Session, digest: str, parsed: dict, receipt_id: str, replace: bool = False):
+    """
+    Remember a parse result (caller commits). First writer wins, unless
+    `replace` (an explicit reprocess): then the new parse overwrites the
+    entry. Other processes' LRUs keep the old parse until it is evicted.
+    """
+    stmt = pg_insert(models.ParseCache).values(
+        content_hash=digest, receipt_id=receipt_id, parsed=parsed, hits=0)
+    if replace:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["content_hash"],
+            set_={"parsed": stmt.excluded.parsed, "receipt_id": stmt.excluded.receipt_id},
+        )
+    else:
+        # A concurrent identical upload may have stored it first
+        stmt = stmt.on_conflict_do_nothing(index_elements=["content_hash"])
+    inserted = db.execute(stmt).rowcount
+    if inserted:
+        _lru.put(digest, (parsed, receipt_id))
+    _count("stores")
+
+
+def stats() -> dict:
+    with _counters_lock:
+        counters = dict(_counters)
+    hits = counters["memory_hits"] + counters["db_hits"]
+    lookups = hits + counters["misses"]
+    return {
+        "policy": get_policy(),
+        **counters,
+        "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+        "lru_size": len(_lru),
+    }
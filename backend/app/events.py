@@ -0,0 +1,190 @@
+# app/events.py
+"""
+Receipt OCR status events over Postgres LISTEN/NOTIFY.
+
+Write paths call `publish` / `publish_many` inside their transaction, so a
+NOTIFY is only delivered once the status change is committed. Each API
+process keeps one dedicated LISTEN connection (not from the pool) and fans
+notifications out to its SSE subscribers, so events raised by any API
+worker or by `python -m app.worker` reach every client.
+"""
+import asyncio
+import json
+import threading
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional, Set
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.config import env_bool, env_int
+from app.db import get_engine
+
+
+CHANNEL = "receipt_status"
+TERMINAL = ("parsed", "failed")
+
+# NOTIFY payloads are capped at 8000 bytes
+_MAX_ERROR_CHARS = 500
+
+
+def enabled() -> bool:
+    return env_bool("EVENTS_ENABLED", True)
+
+
+def event(receipt_id: str, status: str, batch_id: Optional[str] = None,
+          error: Optional[str] = None) -> dict:
+    return {
+        "receipt_id": receipt_id,
+        "batch_id": batch_id,
+        "status": status,
+        "error": error[:_MAX_ERROR_CHARS] if error else None,
+    }
+
+
+def publish(db: Session, receipt_id: str, status: str, batch_id: Optional[str] = None,
+            error: Optional[str] = None):
+    """Queue a status event; delivered when the caller commits."""
+    publish_many(db, [event(receipt_id, status, batch_id, error)])
+
+
+def publish_many(db: Session, events: Iterable[dict]):
+    """One NOTIFY per event, sent with a single statement (caller commits)."""
+    payloads = [json.dumps(e) for e in events]
+    if not payloads or not enabled():
+        return
+    db.execute(
+        text("SELECT pg_notify(:channel, p) FROM unnest(CAST(:payloads AS text[])) AS p"),
+        {"channel": CHANNEL, "payloads": payloads},
+    )
+
+
+# ─────────────────────────────
+# 📡 Per-process fan-out to subscribers
+# ─────────────────────────────
+class Subscription:
+    def __init__(self, receipt_ids: Set[str], batch_id: Optional[str]):
+        self.receipt_ids = set(receipt_ids)
+        self.batch_id = batch_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=env_int("EVENTS_QUEUE_SIZE", 256))
+
+    def wants(self, payload: dict) -> bool:
+        return payload.get("receipt_id") in self.receipt_ids or (
+            self.batch_id is not None and payload.get("batch_id") == self.batch_id)
+
+    def push(self, payload: dict):
+        if self.queue.full():  # slow client: drop the oldest event
+            self.queue.get_nowait()
+        self.queue.put_nowait(payload)
+
+
+class EventHub:
+    """
+    Owns the LISTEN connection. Notifications are read on the event loop
+    via add_reader, so no extra thread is needed.
+    """
+
+    def __init__(self):
+        self._subscriptions: Set[Subscription] = set()
+        self._conn = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reconnect: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        import psycopg2  # driver already required by the engine
+
+        engine = get_engine()
+        cargs, cparams = engine.dialect.create_connect_args(engine.url)
+        conn = psycopg2.connect(*cargs, **cparams)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {CHANNEL}")
+        return conn
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        try:
+            self._conn = await asyncio.to_thread(self._connect)
+        except Exception as e:
+            print("⚠️ Event listener could not connect, retrying:", e)
+            self._schedule_reconnect()
+            return
+        self._loop.add_reader(self._conn.fileno(), self._on_readable)
+
+    async def stop(self):
+        if self._reconnect:
+            self._reconnect.cancel()
+            self._reconnect = None
+        self._close_conn()
+
+    def _close_conn(self):
+        if self._conn is None:
+            return
+        try:
+            self._loop.remove_reader(self._conn.fileno())
+        except Exception:
+            pass
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def _schedule_reconnect(self):
+        async def reconnect():
+            await asyncio.sleep(env_int("EVENTS_RECONNECT_SECONDS", 5))
+            self._reconnect = None
+            await self.start()
+
+        if self._reconnect is None:
+            self._reconnect = self._loop.create_task(reconnect())
+
+    def _on_readable(self):
+        try:
+            self._conn.poll()
+        except Exception as e:
+            print("⚠️ Event listener connection lost:", e)
+            self._close_conn()
+            self._schedule_reconnect()
+            return
+        while self._conn.notifies:
+            notify = self._conn.notifies.pop(0)
+            try:
+                self.dispatch(json.loads(notify.payload))
+            except ValueError:
+                continue
+
+    def dispatch(self, payload: dict):
+        with self._lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            if subscription.wants(payload):
+                subscription.push(payload)
+
+    @property
+    def listening(self) -> bool:
+        return self._conn is not None
+
+    @contextmanager
+    def subscribe(self, receipt_ids: Set[str], batch_id: Optional[str] = None) -> Iterator[Subscription]:
+        subscription = Subscription(receipt_ids, batch_id)
+        with self._lock:
+            self._subscriptions.add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                self._subscriptions.discard(subscription)
+
+    def stats(self) -> dict:
+        with self._lock:
+            count = len(self._subscriptions)
+        return {"enabled": enabled(), "listening": self.listening, "subscribers": count}
+
+
+_hub = EventHub()
+
+
+def get_hub() -> EventHub:
+    return _hub
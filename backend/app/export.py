@@ -0,0 +1,205 @@
+# app/export.py
+"""
+Streaming bulk export of receipts as CSV, NDJSON or Parquet.
+
+Rows are read through a server-side cursor (`yield_per`) and written out
+one batch at a time, so memory stays flat no matter how many receipts are
+exported. With `items=true` there is one row per line item (receipts
+without items still get one row).
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Sequence
+
+from fastapi import HTTPException
+
+from app import models, serialize
+from app.config import env_int
+from app.db import get_sessionmaker
+
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+ITEM_FIELDS = {
+    "item_position": models.ReceiptItem.position,
+    "item_name": models.ReceiptItem.name,
+    "item_quantity": models.ReceiptItem.quantity,
+    "item_unit_price": models.ReceiptItem.unit_price,
+    "item_total_price": models.ReceiptItem.total_price,
+    "item_category": models.ReceiptItem.category,
+}
+
+
+def batch_size() -> int:
+    return env_int("EXPORT_BATCH_SIZE", 2000)
+
+
+def default_fields() -> tuple:
+    """Everything but the raw `data` JSON, which can be asked for explicitly."""
+    return tuple(name for name in serialize.RECEIPT_FIELDS if name != "data")
+
+
+def check_format(fmt: str):
+    if fmt == "parquet":
+        try:
+            import pyarrow  # noqa: F401  optional dependency
+        except ImportError:
+            raise HTTPException(
+                status_code=501, detail="Parquet export requires the pyarrow package")
+
+
+def _batches(rows: Iterable, size: int) -> Iterator[list]:
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# ─────────────────────────────
+# Writers: batches of row tuples → bytes
+# ─────────────────────────────
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return value
+
+
+def _write_csv(batches: Iterator[list], names: Sequence[str]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(names)
+    for chunk in batches:
+        writer.writerows([_csv_value(v) for v in row] for row in chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def _write_ndjson(batches: Iterator[list], names: Sequence[str]) -> Iterator[bytes]:
+    for chunk in batches:
+        yield b"".join(
+            serialize.dumps(dict(zip(names, row))) + b"\n" for row in chunk)
+
+
+class _ChunkSink:
+    """Write-only file object that hands written bytes back to the generator."""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out = b"".join(self.chunks)
+        self.chunks = []
+        return out
+
+
+def _is_numeric(name: str) -> bool:
+    return name in ("amount", "item_quantity", "item_unit_price", "item_total_price")
+
+
+def _arrow_type(pa, name: str):
+    if _is_numeric(name):
+        return pa.float64()
+    if name == "item_position":
+        return pa.int32()
+    if name == "deleted":
+        return pa.bool_()
+    if name == "expense_date":
+        return pa.timestamp("us")
+    if name in ("ocr_started_at", "ocr_finished_at", "created_at", "updated_at"):
+        return pa.timestamp("us", tz="UTC")
+    return pa.string()  # text columns and `data` as JSON text
+
+
+def _arrow_value(name: str, value):
+    if value is None:
+        return None
+    if name == "data":
+        return json.dumps(value)
+    if _is_numeric(name):
+        return float(value)
+    return value
+
+
+def _write_parquet(batches: Iterator[list], names: Sequence[str]) -> Iterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(name, _arrow_type(pa, name)) for name in names])
+    sink = _ChunkSink()
+    # One row group per batch; bytes are yielded as each group is written
+    with pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema) as writer:
+        for chunk in batches:
+            columns = [
+                [_arrow_value(name, row[i]) for row in chunk]
+                for i, name in enumerate(names)
+            ]
+            writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+            yield sink.drain()
+    yield sink.drain()
+
+
+_WRITERS = {"csv": _write_csv, "ndjson": _write_ndjson, "parquet": _write_parquet}
+
+
+def stream_export(
+    names: Sequence[str],
+    fmt: str,
+    with_items: bool,
+    apply_filters: Callable,
+) -> Iterator[bytes]:
+    """
+    Generator for StreamingResponse. Opens its own session because the
+    request's session is closed before the body is streamed.
+    """
+    columns = serialize.receipt_columns(names)
+    names = list(names)
+    if with_items:
+        columns += list(ITEM_FIELDS.values())
+        names += list(ITEM_FIELDS)
+
+    size = batch_size()
+    db = get_sessionmaker()()
+    try:
+        query = apply_filters(db.query(*columns))
+        order = [models.Receipt.created_at.desc(), models.Receipt.id.desc()]
+        if with_items:
+            query = query.outerjoin(
+                models.ReceiptItem, models.ReceiptItem.receipt_id == models.Receipt.id)
+            order.append(models.ReceiptItem.position)
+        rows = query.order_by(*order).yield_per(size)
+        yield from _WRITERS[fmt](_batches(rows, size), names)
+    finally:
+        db.close()
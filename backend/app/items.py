@@ -0,0 +1,86 @@
+# app/items.py
+"""
+Normalized line items (`receipt_items`), kept in sync with data["items"].
+"""
+from decimal import Decimal, InvalidOperation
+from typing import Iterable, List, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app import models
+
+
+def _num(value) -> Optional[Decimal]:
+    """Tolerant numeric parse for LLM output ("12,000", "", None...)."""
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return Decimal(str(value).replace(",", "").strip())
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def item_rows(receipt_id: str, items: Iterable) -> List[dict]:
+    """Column values for receipt_items from a parsed items list."""
+    rows = []
+    for position, item in enumerate(items or []):
+        if not isinstance(item, dict):
+            continue
+        rows.append({
+            "receipt_id": receipt_id,
+            "position": position,
+            "name": item.get("name"),
+            "quantity": _num(item.get("quantity")),
+            "unit_price": _num(item.get("unit_price")),
+            "total_price": _num(item.get("total_price")),
+            "category": item.get("category"),
+        })
+    return rows
+
+
+def item_names(items: Iterable) -> Optional[str]:
+    """Item names joined for the receipts.item_names search column."""
+    names = [str(item["name"]) for item in items or []
+             if isinstance(item, dict) and item.get("name")]
+    return " ".join(names) or None
+
+
+def insert_items(db: Session, rows: List[dict]):
+    """One multi-row INSERT for any number of receipts' items."""
+    if rows:
+        db.execute(insert(models.ReceiptItem), rows)
+
+
+def replace_items(db: Session, receipt_id: str, items: Iterable):
+    """Swap a receipt's items for `items` (caller commits)."""
+    db.execute(delete(models.ReceiptItem).where(
+        models.ReceiptItem.receipt_id == receipt_id))
+    insert_items(db, item_rows(receipt_id, items))
+
+
+def items_total(db: Session, receipt_id: str) -> float:
+    total = db.execute(
+        select(func.coalesce(func.sum(models.ReceiptItem.total_price), 0))
+        .where(models.ReceiptItem.receipt_id == receipt_id)
+    ).scalar()
+    return float(total)
+
+
+def item_to_dict(item: models.ReceiptItem) -> dict:
+    def _f(value):
+        return float(value) if value is not None else None
+
+    quantity = item.quantity
+    if quantity is not None and quantity == quantity.to_integral_value():
+        quantity = int(quantity)
+    elif quantity is not None:
+        quantity = float(quantity)
+
+    return {
+        "name": item.name,
+        "quantity": quantity,
+        "unit_price": _f(item.unit_price),
+        "total_price": _f(item.total_price),
+        "category": item.category,
+    }
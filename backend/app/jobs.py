@@ -0,0 +1,277 @@
+# app/jobs.py
+"""
+Durable OCR job queue backed by the `ocr_jobs` table.
+
+Jobs are leased with SELECT ... FOR UPDATE SKIP LOCKED so any number of
+workers (in-process or `python -m app.worker`) can share the queue safely.
+Each lease carries a token: the holder renews it while the job runs
+(`renew_lease`), and completion updates only apply while the job is still
+running under that token, so a worker whose lease expired can't overwrite
+the outcome of the worker that took the job over.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+import shortuuid
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session
+
+from app import models, cache, events, partitions
+from app.config import env_int
+
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def lease_seconds() -> int:
+    return env_int("OCR_JOB_LEASE_SECONDS", 300)
+
+
+def ocr_job_row(receipt_id: str, blob_key: str, filename: str, mime: str) -> dict:
+    """Column values for a new queued job (shared by single and bulk inserts)."""
+    return {
+        "id": shortuuid.uuid(),
+        "receipt_id": receipt_id,
+        "status": QUEUED,
+        "attempts": 0,
+        "max_attempts": env_int("OCR_JOB_MAX_ATTEMPTS", 3),
+        "filename": filename,
+        "mime": mime,
+        "blob_key": blob_key,
+    }
+
+
+def enqueue_ocr_job(
+    db: Session,
+    receipt_id: str,
+    blob_key: str,
+    filename: str,
+    mime: str,
+    reprocess: bool = False,
+) -> models.OcrJob:
+    """
+    Add a queued job for a stored blob to the session (caller commits).
+    `reprocess` jobs overwrite the image's cached parse instead of leaving it.
+    """
+    job = models.OcrJob(**ocr_job_row(receipt_id, blob_key, filename, mime), reprocess=reprocess)
+    db.add(job)
+    return job
+
+
+def lease_jobs(db: Session, limit: int) -> List[models.OcrJob]:
+    """
+    Atomically claim up to `limit` runnable jobs and mark them running.
+    Rows locked by other workers are skipped instead of waited on.
+    """
+    if limit <= 0:
+        return []
+
+    now = _now()
+    jobs = db.execute(
+        select(models.OcrJob)
+        .where(models.OcrJob.status == QUEUED, models.OcrJob.run_after <= now)
+        .order_by(models.OcrJob.run_after, models.OcrJob.created_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+    for job in jobs:
+        job.status = RUNNING
+        job.attempts += 1
+        job.started_at = now
+        job.finished_at = None
+        job.lease_expires_at = now + timedelta(seconds=lease_seconds())
+        job.lease_token = shortuuid.uuid()
+    receipt_ids = [job.receipt_id for job in jobs]
+    if receipt_ids:
+        started = db.execute(
+            update(models.Receipt)
+            .where(partitions.by_ids(db, receipt_ids))
+            .values(ocr_started_at=now)
+            .returning(models.Receipt.id, models.Receipt.batch_id)
+        ).all()
+        events.publish_many(db, (events.event(rid, "running", bid) for rid, bid in started))
+    db.commit()
+    if receipt_ids:
+        cache.invalidate_receipt(*receipt_ids)
+    return jobs
+
+
+def _leased(db: Session, job_id: str, token: str) -> Optional[models.OcrJob]:
+    """The job row, locked, if it is still running under this lease."""
+    return db.execute(
+        select(models.OcrJob)
+        .where(models.OcrJob.id == job_id, models.OcrJob.status == RUNNING,
+               models.OcrJob.lease_token == token)
+        .with_for_update()
+    ).scalar_one_or_none()
+
+
+def renew_lease(db: Session, job_id: str, token: str) -> bool:
+    """Push the lease expiry out again. False when the lease was lost."""
+    renewed = db.execute(
+        update(models.OcrJob)
+        .where(models.OcrJob.id == job_id, models.OcrJob.status == RUNNING,
+               models.OcrJob.lease_token == token)
+        .values(lease_expires_at=_now() + timedelta(seconds=lease_seconds()))
+    ).rowcount
+    db.commit()
+    return bool(renewed)
+
+
+def finish_leased(db: Session, job_id: str, token: str) -> Optional[models.OcrJob]:
+    """
+    Lock the job and mark it done in the caller's transaction, so the OCR
+    result and the job's completion commit together. None (nothing
+    changed) when the lease was lost to another worker.
+    """
+    job = _leased(db, job_id, token)
+    if not job:
+        return None
+    job.status = DONE
+    job.error = None
+    job.payload = None  # legacy inline image no longer needed once parsed
+    job.finished_at = _now()
+    job.lease_expires_at = None
+    job.lease_token = None
+    return job
+
+
+def mark_done(db: Session, job_id: str, token: str) -> bool:
+    """False (and nothing written) when the lease was lost."""
+    if not finish_leased(db, job_id, token):
+        db.rollback()
+        return False
+    db.commit()
+    return True
+
+
+def _fail_receipt(db: Session, receipt_id: str, error: str):
+    receipt = db.query(models.Receipt).filter(partitions.by_id(db, receipt_id)).first()
+    if receipt:
+        receipt.data = {"error": error, "status": "failed"}
+        receipt.status = "failed"
+        receipt.error_message = error
+        receipt.ocr_finished_at = _now()
+        events.publish(db, receipt.id, "failed", receipt.batch_id, error)
+
+
+def mark_failed(db: Session, job_id: str, token: str, error: str) -> Optional[str]:
+    """
+    Record a failed attempt. The job is re-queued with exponential backoff
+    while attempts remain; otherwise it and its receipt are marked failed.
+    Returns the job's new status, or None when the lease was lost.
+    """
+    job = _leased(db, job_id, token)
+    if not job:
+        db.rollback()
+        return None
+
+    job.error = error
+    job.lease_expires_at = None
+    job.lease_token = None
+    if job.attempts < job.max_attempts:
+        backoff = env_int("OCR_JOB_RETRY_BASE_SECONDS", 5) * 2 ** (job.attempts - 1)
+        job.status = QUEUED
+        job.run_after = _now() + timedelta(seconds=backoff)
+        batch_id = db.scalar(
+            select(models.Receipt.batch_id).where(partitions.by_id(db, job.receipt_id)))
+        events.publish(db, job.receipt_id, "retrying", batch_id, error)
+    else:
+        job.status = FAILED
+        job.finished_at = _now()
+        _fail_receipt(db, job.receipt_id, error)
+    db.commit()
+    if job.status == FAILED:
+        cache.invalidate_receipt(job.receipt_id)
+    return job.status
+
+
+def release(db: Session, job_id: str, token: str, delay: float, error: str) -> bool:
+    """
+    Put a running job back in the queue without spending an attempt
+    (the provider was unavailable, the receipt itself is fine).
+    False when the lease was lost.
+    """
+    job = _leased(db, job_id, token)
+    if not job:
+        db.rollback()
+        return False
+    job.status = QUEUED
+    job.attempts = max(job.attempts - 1, 0)
+    job.error = error
+    job.lease_expires_at = None
+    job.lease_token = None
+    job.run_after = _now() + timedelta(seconds=delay)
+    batch_id = db.scalar(
+        select(models.Receipt.batch_id).where(partitions.by_id(db, job.receipt_id)))
+    events.publish(db, job.receipt_id, "queued", batch_id, error)
+    db.commit()
+    return True
+
+
+def requeue_stale_jobs(db: Session) -> int:
+    """
+    Recover jobs whose lease expired (worker crashed or was restarted).
+    Returns the number of jobs touched.
+    """
+    now = _now()
+    stale = db.execute(
+        select(models.OcrJob)
+        .where(models.OcrJob.status == RUNNING, models.OcrJob.lease_expires_at < now)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+    for job in stale:
+        job.lease_expires_at = None
+        job.lease_token = None  # the old holder's late writes are ignored
+        if job.attempts < job.max_attempts:
+            job.status = QUEUED
+            job.run_after = now
+        else:
+            job.status = FAILED
+            job.error = job.error or "OCR job lease expired"
+            job.finished_at = now
+            _fail_receipt(db, job.receipt_id, job.error)
+    db.commit()
+    failed = [job.receipt_id for job in stale if job.status == FAILED]
+    if failed:
+        cache.invalidate_receipt(*failed)
+    return len(stale)
+
+
+def queue_depth(db: Session) -> dict:
+    """Job counts grouped by status."""
+    rows = db.execute(
+        select(models.OcrJob.status, func.count())
+        .group_by(models.OcrJob.status)
+    ).all()
+    counts = {QUEUED: 0, RUNNING: 0, DONE: 0, FAILED: 0}
+    counts.update({status: n for status, n in rows})
+    return counts
+
+
+def active_queue_depth(db: Session) -> dict:
+    """
+    Queued / running counts only. Served from ix_ocr_jobs_status_run_after,
+    so the cost follows the live backlog, not the ever-growing done history.
+    """
+    rows = db.execute(
+        select(models.OcrJob.status, func.count())
+        .where(models.OcrJob.status.in_((QUEUED, RUNNING)))
+        .group_by(models.OcrJob.status)
+    ).all()
+    counts = {QUEUED: 0, RUNNING: 0}
+    counts.update({status: n for status, n in rows})
+    return counts
+
+
+def get_job(db: Session, job_id: str) -> Optional[models.OcrJob]:
+    return db.get(models.OcrJob, job_id)
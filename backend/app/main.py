@@ -1,14 +1,55 @@
+from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, Depends
+from fastapi import FastAPI, Depends, Request, Response
+from sqlalchemy import text
 from sqlalchemy.orm import Session
-from app.db import get_db
-from app import receipts
+from app.db import get_db, warm_pool, dispose_engine, pool_stats
+from app.config import env_bool
+from app.jobs import queue_depth
+from app.worker import start_worker_pool, stop_worker_pool, _with_session
+from app.openai_handler import close_openai_client
+from app.preprocess import shutdown_executor
+from app import (
+    receipts, dedup, cache, events, metrics, partitions, resilience, storage, vendor_templates,
+)
+import asyncio
+import time
+
+
+# ─────────────────────────────
+# ✅ Lifespan (DB pool + OCR workers + status events)
+# ─────────────────────────────
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        warm_pool()
+    except Exception as e:
+        print("⚠️ DB pool warm-up failed:", e)
+
+    # Set OCR_INPROCESS_WORKERS=false when running `python -m app.worker` separately
+    run_workers = env_bool("OCR_INPROCESS_WORKERS", True)
+    if run_workers:
+        await start_worker_pool()  # also keeps the receipts partitions ahead
+    else:
+        try:
+            await asyncio.to_thread(_with_session, partitions.ensure_partitions)
+        except Exception as e:
+            print("⚠️ Receipt partition check failed:", e)
+    if events.enabled():
+        await events.get_hub().start()
+    yield
+    await events.get_hub().stop()
+    if run_workers:
+        await stop_worker_pool()
+    await close_openai_client()
+    shutdown_executor()
+    dispose_engine()
 
 
 # ─────────────────────────────
 # ✅ App Initialization
 # ─────────────────────────────
-app = FastAPI(title="Receipt Scanner API")
+app = FastAPI(title="Receipt Scanner API", lifespan=lifespan)
 app.include_router(receipts.router)
 
 # ─────────────────────────────
@@ -21,6 +62,12 @@ origins = [
     "http://frontend",            # Docker service name (if used)
 ]
 
+# Size cap / image sniff on the raw upload stream, before multipart parsing
+app.add_middleware(storage.UploadLimitMiddleware, routes={
+    "/receipts/": (storage.max_upload_bytes, True),
+    "/receipts/batch": (storage.max_batch_upload_bytes, False),
+})
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,        # or ["*"] for dev-only wildcard
@@ -29,6 +76,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ─────────────────────────────
+# ✅ Request latency per route
+# ─────────────────────────────
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template (/receipts/{receipt_id}), not the raw path
+        route = getattr(request.scope.get("route"), "path", "unmatched")
+        metrics.HTTP_REQUEST_SECONDS.labels(
+            request.method, route, str(status)).observe(time.perf_counter() - started)
+
+
+metrics.register_collectors()
+
+
 # ─────────────────────────────
 # ✅ Routers
 # ─────────────────────────────
@@ -44,23 +112,107 @@ def health_check(db: Session = Depends(get_db)):
     Health check endpoint to verify API and DB connectivity.
     """
     try:
-        db.execute("SELECT 1")
+        db.execute(text("SELECT 1"))
         return {"status": "ok", "database": "connected"}
     except Exception as e:
         return {"status": "ok", "database": f"error: {str(e)}"}
 
 
 # ─────────────────────────────
-# ✅ Health check endpoint
+# ✅ DB pool statistics
 # ─────────────────────────────
-@app.get("/health")
-def health_check(db: Session = Depends(get_db)):
+@app.get("/health/pool")
+def pool_health():
     """
-    Health check endpoint to verify API and DB connectivity.
+    Connection pool usage: size, checked out, overflow and checkout wait times.
     """
-    try:
-        # simple DB query to ensure connection is alive
-        db.execute("SELECT 1")
-        return {"status": "ok", "database": "connected"}
-    except Exception as e:
-        return {"status": "ok", "database": f"error: {str(e)}"}
+    return pool_stats()
+
+
+# ─────────────────────────────
+# ✅ OCR queue depth
+# ─────────────────────────────
+@app.get("/health/queue")
+def queue_health(db: Session = Depends(get_db)):
+    """
+    OCR job counts by status (queued / running / done / failed).
+    """
+    return queue_depth(db)
+
+
+# ─────────────────────────────
+# ✅ Upload dedup cache counters
+# ─────────────────────────────
+@app.get("/health/dedup")
+def dedup_health():
+    """
+    Content-hash cache policy, hit/miss counters and hit rate.
+    """
+    return dedup.stats()
+
+
+# ─────────────────────────────
+# ✅ Response cache counters
+# ─────────────────────────────
+@app.get("/health/cache")
+def cache_health():
+    """
+    Response cache backend plus hit / miss / 304 / invalidation counters.
+    """
+    return cache.stats()
+
+
+# ─────────────────────────────
+# ✅ Status event listener
+# ─────────────────────────────
+@app.get("/health/events")
+def events_health():
+    """
+    LISTEN connection state and number of open SSE subscribers.
+    """
+    return events.get_hub().stats()
+
+
+# ─────────────────────────────
+# ✅ OCR provider resilience
+# ─────────────────────────────
+@app.get("/health/provider")
+def provider_health():
+    """
+    Circuit breaker state, retry / hedge / timeout counters and call latency.
+    """
+    return resilience.stats()
+
+
+# ─────────────────────────────
+# ✅ Vendor template parser
+# ─────────────────────────────
+@app.get("/health/templates")
+def templates_health():
+    """
+    Template hit rate, LLM parse calls saved and learned / active templates.
+    """
+    return vendor_templates.stats()
+
+
+# ─────────────────────────────
+# ✅ Receipt partitions / archive
+# ─────────────────────────────
+@app.get("/health/partitions")
+def partitions_health(db: Session = Depends(get_db)):
+    """
+    Monthly receipts partitions (estimated rows, size) and archived receipt count.
+    """
+    return partitions.stats(db)
+
+
+# ─────────────────────────────
+# ✅ Prometheus metrics
+# ─────────────────────────────
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """
+    OCR stage histograms, token counters, request latency, queue depth
+    and DB pool gauges in Prometheus text format.
+    """
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
@@ -0,0 +1,198 @@
+# app/metrics.py
+"""
+Prometheus metrics and per-receipt OCR stage timings.
+
+`stage("name")` times a block into the ocr_stage_seconds histogram, adds it
+to the timings of the OCR job running in the current task (stored on the
+receipt as data["timings_ms"]) and, with OTEL_ENABLED=true and the
+opentelemetry API installed, wraps it in a span. OpenAI token usage is
+counted globally and per receipt (data["usage"]).
+
+The API serves everything at /metrics. A standalone `python -m app.worker`
+exposes its own registry on METRICS_PORT. Several uvicorn workers each
+keep their own counters; scrape them individually.
+"""
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Optional
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from app.config import env_bool, env_float
+
+
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+OCR_STAGE_SECONDS = Histogram(
+    "ocr_stage_seconds", "Time spent per OCR pipeline stage", ["stage"], buckets=STAGE_BUCKETS)
+OCR_JOBS = Counter(
+    "ocr_jobs_total", "OCR job attempts by outcome (done, queued = retry, failed, released, lease_lost)", ["outcome"])
+OPENAI_TOKENS = Counter(
+    "openai_tokens_total", "Tokens reported by the OpenAI usage field", ["model", "kind"])
+OPENAI_REQUESTS = Counter(
+    "openai_requests_total", "OpenAI chat.completions calls", ["model", "outcome"])
+TEMPLATE_PARSES = Counter(
+    "template_parser_total", "Vendor template lookups by outcome (hits skip the LLM parse)",
+    ["outcome"])
+PROVIDER_CALLS = Counter(
+    "ocr_provider_calls_total",
+    "OpenAI call outcomes (ok, retry, timeout, hedged, hedge_won, error, failed, short_circuited)",
+    ["kind", "outcome"])
+CIRCUIT_STATE = Gauge(
+    "ocr_provider_circuit_state", "OpenAI circuit breaker: 0 closed, 1 half-open, 2 open")
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "HTTP request latency per route",
+    ["method", "route", "status"])
+
+# Timings / usage of the OCR job running in the current asyncio task
+_current: ContextVar[Optional[dict]] = ContextVar("ocr_metrics", default=None)
+
+_tracer = None
+_tracer_loaded = False
+
+
+def _get_tracer():
+    global _tracer, _tracer_loaded
+    if not _tracer_loaded:
+        _tracer_loaded = True
+        if env_bool("OTEL_ENABLED", False):
+            try:
+                from opentelemetry import trace  # optional dependency
+
+                _tracer = trace.get_tracer("receipt-scanner")
+            except ImportError:
+                print("⚠️ OTEL_ENABLED is set but opentelemetry-api is not installed")
+    return _tracer
+
+
+def _span(name: str):
+    tracer = _get_tracer()
+    return tracer.start_as_current_span(name) if tracer else nullcontext()
+
+
+# ─────────────────────────────
+# OCR stage timings
+# ─────────────────────────────
+def start_job() -> dict:
+    """Begin collecting timings and token usage for one OCR job (this task)."""
+    state = {"timings_ms": {}, "usage": {"prompt_tokens": 0, "completion_tokens": 0}, "open": {}}
+    _current.set(state)
+    return state
+
+
+def _record(name: str, seconds: float):
+    OCR_STAGE_SECONDS.labels(name).observe(seconds)
+    state = _current.get()
+    if state is not None:
+        timings = state["timings_ms"]
+        timings[name] = round(timings.get(name, 0) + seconds * 1000, 1)
+
+
+@contextmanager
+def stage(name: str):
+    started = time.perf_counter()
+    state = _current.get()
+    if state is not None:
+        state["open"][name] = started
+    with _span(f"ocr.{name}"):
+        try:
+            yield
+        finally:
+            if state is not None:
+                state["open"].pop(name, None)
+            _record(name, time.perf_counter() - started)
+
+
+def timings_so_far(state: dict) -> dict:
+    """Finished stage timings plus the elapsed time of stages still open (e.g. total)."""
+    timings = dict(state["timings_ms"])
+    now = time.perf_counter()
+    for name, started in list(state["open"].items()):
+        timings[name] = round(timings.get(name, 0) + (now - started) * 1000, 1)
+    return timings
+
+
+def record_usage(model: str, usage):
+    """Count tokens from a chat.completions `usage` object."""
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    OPENAI_TOKENS.labels(model, "prompt").inc(prompt)
+    OPENAI_TOKENS.labels(model, "completion").inc(completion)
+    state = _current.get()
+    if state is not None:
+        state["usage"]["prompt_tokens"] += prompt
+        state["usage"]["completion_tokens"] += completion
+
+
+# ─────────────────────────────
+# Scrape-time gauges (queue depth, DB pool)
+# ─────────────────────────────
+_depth_cache = {"at": 0.0, "value": None}
+
+
+def _active_depth() -> Optional[dict]:
+    """Queued / running job counts, reused for METRICS_QUEUE_CACHE_SECONDS between scrapes."""
+    from app.db import get_sessionmaker
+    from app.jobs import active_queue_depth
+
+    now = time.monotonic()
+    if _depth_cache["value"] is None or now - _depth_cache["at"] >= env_float(
+            "METRICS_QUEUE_CACHE_SECONDS", 5.0):
+        db = get_sessionmaker()()
+        try:
+            _depth_cache["value"] = active_queue_depth(db)
+        finally:
+            db.close()
+        _depth_cache["at"] = now
+    return _depth_cache["value"]
+
+
+class _StateCollector:
+    def describe(self):
+        return []  # don't query the DB at registration time
+
+    def collect(self):
+        from app.db import pool_stats
+
+        pool = pool_stats()
+        if pool.get("initialized"):
+            for key in ("size", "checkedin", "checkedout", "overflow"):
+                if key in pool:
+                    yield GaugeMetricFamily(f"db_pool_{key}", f"SQLAlchemy pool {key}", value=pool[key])
+            yield GaugeMetricFamily(
+                "db_pool_wait_avg_ms", "Average connection checkout wait", value=pool["wait"]["avg_ms"])
+            yield GaugeMetricFamily(
+                "db_pool_wait_max_ms", "Longest connection checkout wait", value=pool["wait"]["max_ms"])
+
+        try:
+            depth = _active_depth()
+        except Exception:
+            return
+        family = GaugeMetricFamily(
+            "ocr_queue_jobs", "Queued / running OCR jobs", labels=["status"])
+        for status, count in depth.items():
+            family.add_metric([status], count)
+        yield family
+
+
+_collector_registered = False
+
+
+def register_collectors():
+    global _collector_registered
+    if not _collector_registered:
+        REGISTRY.register(_StateCollector())
+        _collector_registered = True
+
+
+def render() -> bytes:
+    return generate_latest(REGISTRY)
+
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
@@ -1,11 +1,31 @@
-from sqlalchemy import Column, String, DateTime, Boolean, Numeric, JSON
-from sqlalchemy.sql import func
+from sqlalchemy import (
+    Column, String, DateTime, Boolean, Numeric, JSON, Integer, BigInteger, Text,
+    LargeBinary, Index, Date, Computed,
+)
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.sql import func, false, true, text
 from app.db import Base
 import shortuuid
 
 
+# Text search config: 'simple' (no stemming) suits mixed Indonesian/English receipts
+SEARCH_CONFIG = "simple"
+SEARCH_VECTOR_SQL = (
+    f"setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce(vendor, '')), 'A') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce(item_names, '')), 'B') || "
+    f"setweight(to_tsvector('{SEARCH_CONFIG}'::regconfig, coalesce(ocr_text, '')), 'C')"
+)
+
+
 class Receipt(Base):
+    """
+    Range-partitioned by created_at month (app.partitions). The table key is
+    (id, created_at) as Postgres requires; the ORM identifies rows by id.
+    Tables pointing at receipts carry plain receipt_id columns (no FK).
+    """
     __tablename__ = "receipts"
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_at)"}
 
     id = Column(String, primary_key=True, default=lambda: shortuuid.uuid())
     vendor = Column(String, nullable=True)
@@ -15,4 +35,163 @@ class Receipt(Base):
     category = Column(String, nullable=True)
     data = Column(JSON, nullable=True)
     deleted = Column(Boolean, default=False)
+    content_hash = Column(String(64), nullable=True, index=True)
+    batch_id = Column(String, nullable=True, index=True)
+    status = Column(String, nullable=True)  # processing | parsed | failed
+    error_message = Column(Text, nullable=True)
+    ocr_started_at = Column(DateTime(timezone=True), nullable=True)
+    ocr_finished_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), primary_key=True, server_default=func.now())
+    # Delta sync: bumped by every ORM / Core UPDATE (now() = writer's transaction start)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    deleted_at = Column(DateTime(timezone=True), nullable=True)  # soft-delete tombstone
+    # Delta sync order: id of the writing transaction, stamped by a trigger on every write
+    change_xid = Column(BigInteger, nullable=False, server_default=text("0"))
+    # Full-text search: raw OCR text, item names, and a generated tsvector
+    ocr_text = deferred(Column(Text, nullable=True))
+    item_names = deferred(Column(Text, nullable=True))
+    search_vector = deferred(Column(TSVECTOR, Computed(SEARCH_VECTOR_SQL, persisted=True)))
+
+    items = relationship(
+        "ReceiptItem",
+        primaryjoin="Receipt.id == foreign(ReceiptItem.receipt_id)",
+        lazy="selectin",
+        order_by="ReceiptItem.position",
+        cascade="all, delete-orphan",
+    )
+
+    __mapper_args__ = {"primary_key": [id]}
+
+
+# Partial indexes match the `deleted = false` predicate in list_receipts
+_live = Receipt.deleted == false()
+Index("ix_receipts_live_created_at", Receipt.created_at.desc(), Receipt.id.desc(),
+      postgresql_where=_live)
+Index("ix_receipts_live_expense_date", Receipt.expense_date, postgresql_where=_live)
+Index("ix_receipts_live_category", Receipt.category, Receipt.created_at.desc(),
+      postgresql_where=_live)
+Index("ix_receipts_live_amount", Receipt.amount, postgresql_where=_live)
+Index("ix_receipts_live_status", Receipt.status, Receipt.created_at.desc(),
+      postgresql_where=_live)
+Index("ix_receipts_vendor_trgm", Receipt.vendor, postgresql_using="gin",
+      postgresql_ops={"vendor": "gin_trgm_ops"})
+Index("ix_receipts_search_vector", Receipt.search_vector, postgresql_using="gin")
+Index("ix_receipts_updated_at", Receipt.updated_at, Receipt.id)
+Index("ix_receipts_change_xid", Receipt.change_xid, Receipt.id)
+# Small: only soft-deleted rows, for `python -m app.partitions archive`
+Index("ix_receipts_deleted_at", Receipt.deleted_at, postgresql_where=Receipt.deleted == true())
+
+
+class ReceiptKey(Base):
+    """
+    id -> created_at of every live receipt, maintained by triggers on
+    `receipts`. Single-receipt paths read it first so their query carries the
+    partition key and touches one partition (app.partitions.by_id).
+    """
+    __tablename__ = "receipt_keys"
+
+    id = Column(String, primary_key=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+
+class ReceiptArchive(Base):
+    """
+    Compact copy of archived receipts (soft-deleted ones past their grace
+    period and whole partitions past retention). Items stay in data["items"].
+    """
+    __tablename__ = "receipts_archive"
+
+    id = Column(String, primary_key=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=True)
+    deleted = Column(Boolean, nullable=False, default=False)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)
+    vendor = Column(String, nullable=True)
+    amount = Column(Numeric, nullable=True)
+    currency = Column(String, nullable=True)
+    expense_date = Column(DateTime, nullable=True)
+    category = Column(String, nullable=True)
+    status = Column(String, nullable=True)
+    batch_id = Column(String, nullable=True)
+    content_hash = Column(String(64), nullable=True)
+    data = Column(JSONB, nullable=True)
+    archived_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+class OcrJob(Base):
+    __tablename__ = "ocr_jobs"
+    __table_args__ = (
+        Index("ix_ocr_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: shortuuid.uuid())
+    receipt_id = Column(String, nullable=False, index=True)  # receipts.id
+    status = Column(String, nullable=False, default="queued")  # queued | running | done | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    filename = Column(String, nullable=True)
+    mime = Column(String, nullable=True)
+    blob_key = Column(String(64), nullable=True)  # app.storage key of the original image
+    payload = Column(LargeBinary, nullable=True)  # legacy: inline bytes for pre-blob jobs
+    error = Column(Text, nullable=True)
+    run_after = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)
+    lease_token = Column(String(22), nullable=True)  # identifies the current lease holder
+    # Explicit re-run: its result replaces the parse_cache entry for the image
+    reprocess = Column(Boolean, nullable=False, default=False, server_default=false())
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+
+class ParseCache(Base):
+    """Parsed OCR output keyed by the SHA-256 of the uploaded image bytes."""
+    __tablename__ = "parse_cache"
+
+    content_hash = Column(String(64), primary_key=True)
+    receipt_id = Column(String, nullable=True)  # receipts.id, cleared when archived
+    parsed = Column(JSON, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
+class ReceiptItem(Base):
+    """One parsed line item; mirrors the entries of Receipt.data["items"]."""
+    __tablename__ = "receipt_items"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    receipt_id = Column(String, nullable=False, index=True)  # receipts.id
+    position = Column(Integer, nullable=False, default=0)
+    name = Column(String, nullable=True)
+    quantity = Column(Numeric, nullable=True)
+    unit_price = Column(Numeric, nullable=True)
+    total_price = Column(Numeric, nullable=True)
+    category = Column(String, nullable=True)
+
+
+Index("ix_receipt_items_name_trgm", ReceiptItem.name, postgresql_using="gin",
+      postgresql_ops={"name": "gin_trgm_ops"})
+
+
+class VendorTemplate(Base):
+    """Layout learned from LLM-parsed receipts of one vendor (app.vendor_templates)."""
+    __tablename__ = "vendor_templates"
+
+    fingerprint = Column(String(16), primary_key=True)  # hash of the normalized header
+    vendor = Column(String, nullable=True)
+    template = Column(JSON, nullable=False)
+    samples = Column(Integer, nullable=False, default=0)  # receipts it reproduced
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class SpendingRollup(Base):
+    """Pre-aggregated spend per month/category/vendor/currency ('' = unknown)."""
+    __tablename__ = "spending_rollups"
+
+    period = Column(Date, primary_key=True)  # first day of the month
+    category = Column(String, primary_key=True, default="")
+    vendor = Column(String, primary_key=True, default="")
+    currency = Column(String, primary_key=True, default="")
+    receipt_count = Column(Integer, nullable=False, default=0)
+    total_amount = Column(Numeric, nullable=False, default=0)
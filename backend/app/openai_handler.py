@@ -1,18 +1,181 @@
 # app/ai/openai_handler.py
-import os
 import base64
 import json
+from typing import Optional
 from fastapi import HTTPException
-from openai import OpenAI
-from dotenv import load_dotenv
+from openai import AsyncOpenAI
 
+from app import metrics, resilience, vendor_templates
+from app.config import env_str, env_int
+from app.ratelimit import RateLimitScheduler
 
-def get_openai_client() -> OpenAI:
-    load_dotenv()
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="OPENAI_API_KEY not set")
-    return OpenAI(api_key=api_key)
+
+# ─────────────────────────────
+# ✅ Shared client + scheduler (one per process)
+# ─────────────────────────────
+_client: Optional[AsyncOpenAI] = None
+_scheduler: Optional[RateLimitScheduler] = None
+
+# Rough cost of one low-res receipt image, used until real usage comes back
+IMAGE_TOKEN_ESTIMATE = 1100
+
+# "two_step" (OCR text, then parse) or "single" (image straight to JSON)
+EXTRACTION_MODES = ("two_step", "single")
+
+RECEIPT_OUTPUT_FORMAT = {
+    "vendor": "string",
+    "address": "string or null",
+    "phone": "string or null",
+    "date": "string (YYYY-MM-DD or null)",
+    "time": "string (HH:MM:SS or null)",
+    "table_number": "string or null",
+    "items": [
+        {
+            "name": "string",
+            "quantity": "integer",
+            "unit_price": "float or null",
+            "total_price": "float",
+            "category": "string"
+        }
+    ],
+    "subtotal": "float or null",
+    "tax": "float or null",
+    "total": "float",
+    "payment_method": "string or null",
+    "currency": "string (default IDR)",
+    "notes": "string or null"
+}
+
+
+def _nullable(type_name: str) -> dict:
+    return {"type": [type_name, "null"]}
+
+
+# Strict JSON schema mirroring RECEIPT_OUTPUT_FORMAT for structured outputs
+RECEIPT_JSON_SCHEMA = {
+    "type": "object",
+    "additionalProperties": False,
+    "properties": {
+        "vendor": {"type": "string"},
+        "address": _nullable("string"),
+        "phone": _nullable("string"),
+        "date": {**_nullable("string"), "description": "YYYY-MM-DD"},
+        "time": {**_nullable("string"), "description": "HH:MM:SS"},
+        "table_number": _nullable("string"),
+        "items": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "additionalProperties": False,
+                "properties": {
+                    "name": {"type": "string"},
+                    "quantity": {"type": "integer"},
+                    "unit_price": _nullable("number"),
+                    "total_price": {"type": "number"},
+                    "category": {"type": "string"},
+                },
+                "required": ["name", "quantity", "unit_price", "total_price", "category"],
+            },
+        },
+        "subtotal": _nullable("number"),
+        "tax": _nullable("number"),
+        "total": {"type": "number"},
+        "payment_method": _nullable("string"),
+        "currency": {"type": "string", "description": "ISO code, default IDR"},
+        "notes": _nullable("string"),
+        # Stored as Receipt.ocr_text for full-text search, as two_step does
+        "ocr_text": {"type": "string", "description": "All text printed on the receipt, line by line"},
+    },
+    "required": [
+        "vendor", "address", "phone", "date", "time", "table_number", "items",
+        "subtotal", "tax", "total", "payment_method", "currency", "notes", "ocr_text",
+    ],
+}
+
+
+def get_openai_client() -> AsyncOpenAI:
+    global _client
+    if _client is None:
+        api_key = env_str("OPENAI_API_KEY")
+        if not api_key:
+            raise HTTPException(status_code=500, detail="OPENAI_API_KEY not set")
+        _client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=env_str("OPENAI_BASE_URL") or None,  # e.g. bench.fake_openai
+            timeout=env_int("OPENAI_TIMEOUT_SECONDS", 60),
+            max_retries=env_int("OPENAI_MAX_RETRIES", 0),  # app.resilience retries
+        )
+    return _client
+
+
+def get_scheduler() -> RateLimitScheduler:
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = RateLimitScheduler()
+    return _scheduler
+
+
+async def close_openai_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+def _estimate_tokens(messages: list, max_tokens: int) -> int:
+    """Cheap pre-flight estimate (~4 chars per token, fixed cost per image)."""
+    chars = 0
+    images = 0
+    for message in messages:
+        content = message["content"]
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content:
+            if part.get("type") == "image_url":
+                images += 1
+            else:
+                chars += len(part.get("text", ""))
+    return chars // 4 + images * IMAGE_TOKEN_ESTIMATE + max_tokens
+
+
+async def _chat_completion_once(kind: str, **kwargs):
+    """
+    Run chat.completions.create through the rate-limit scheduler on the
+    shared async client, feeding response headers and usage back into it.
+    Hedging starts after admission, so time spent queued doesn't trigger it.
+    """
+    client = get_openai_client()
+    scheduler = get_scheduler()
+    kwargs.setdefault("max_tokens", env_int("OPENAI_MAX_OUTPUT_TOKENS", 4096))
+    estimated = _estimate_tokens(kwargs["messages"], kwargs["max_tokens"])
+
+    model = kwargs.get("model", "")
+    try:
+        raw = await scheduler.run(
+            estimated,
+            lambda: resilience.hedged(
+                kind,
+                lambda: resilience.timed(
+                    kind, client.chat.completions.with_raw_response.create(**kwargs)),
+                lambda: scheduler.try_admit(estimated),
+            ),
+        )
+    except Exception:
+        metrics.OPENAI_REQUESTS.labels(model, "error").inc()
+        raise
+    metrics.OPENAI_REQUESTS.labels(model, "ok").inc()
+    scheduler.observe_headers(raw.headers)
+    response = raw.parse()
+    usage = getattr(response, "usage", None)
+    scheduler.settle(estimated, getattr(usage, "total_tokens", None))
+    metrics.record_usage(model, usage)
+    return response
+
+
+async def _chat_completion(kind: str, **kwargs):
+    """_chat_completion_once with retries, hedging and the circuit breaker."""
+    return await resilience.call(kind, lambda: _chat_completion_once(kind, **kwargs))
 
 
 async def extract_receipt_text(file_bytes: bytes, filename: str, mime: str = "image/jpeg") -> str:
@@ -21,11 +184,10 @@ async def extract_receipt_text(file_bytes: bytes, filename: str, mime: str = "im
     Returns plain text (no formatting or JSON).
     """
     try:
-        client = get_openai_client()
-
         data_uri = f"data:{mime};base64,{base64.b64encode(file_bytes).decode()}"
 
-        response = client.chat.completions.create(
+        response = await _chat_completion(
+            "ocr_text",
             model="gpt-4o-mini",
             temperature=0.1,
             messages=[
@@ -49,6 +211,8 @@ async def extract_receipt_text(file_bytes: bytes, filename: str, mime: str = "im
 
         return response.choices[0].message.content.strip()
 
+    except resilience.ProviderUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"OpenAI OCR failed: {e}")
 
@@ -59,41 +223,18 @@ async def parse_receipt_to_json(ocr_text: str) -> dict:
     Uses GPT-4o-mini for consistent JSON extraction.
     """
     try:
-        client = get_openai_client()
-
         prompt = {
             "instructions": (
                 "Extract structured data from the following receipt text. "
                 "Focus on expense tracking. Preserve numeric precision and item details. "
                 "Respond ONLY with valid JSON, following the schema below."
             ),
-            "output_format": {
-                "vendor": "string",
-                "address": "string or null",
-                "phone": "string or null",
-                "date": "string (YYYY-MM-DD or null)",
-                "time": "string (HH:MM:SS or null)",
-                "table_number": "string or null",
-                "items": [
-                    {
-                        "name": "string",
-                        "quantity": "integer",
-                        "unit_price": "float or null",
-                        "total_price": "float",
-                        "category": "string"
-                    }
-                ],
-                "subtotal": "float or null",
-                "tax": "float or null",
-                "total": "float",
-                "payment_method": "string or null",
-                "currency": "string (default IDR)",
-                "notes": "string or null"
-            },
+            "output_format": RECEIPT_OUTPUT_FORMAT,
             "text_to_parse": ocr_text
         }
 
-        response = client.chat.completions.create(
+        response = await _chat_completion(
+            "parse_json",
             model="gpt-4o-mini",
             temperature=0,
             messages=[
@@ -114,6 +255,100 @@ async def parse_receipt_to_json(ocr_text: str) -> dict:
 
         return parsed
 
+    except resilience.ProviderUnavailable:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"OpenAI JSON parsing failed: {e}")
+
+
+async def extract_receipt_json(file_bytes: bytes, filename: str, mime: str = "image/jpeg") -> dict:
+    """
+    Single round trip: sends the receipt image with the output schema as a
+    structured-output request and returns the same dict shape as
+    parse_receipt_to_json.
+    """
+    try:
+        data_uri = f"data:{mime};base64,{base64.b64encode(file_bytes).decode()}"
+
+        response = await _chat_completion(
+            "extract_single",
+            model="gpt-4o-mini",
+            temperature=0,
+            response_format={
+                "type": "json_schema",
+                "json_schema": {
+                    "name": "receipt",
+                    "strict": True,
+                    "schema": RECEIPT_JSON_SCHEMA,
+                },
+            },
+            messages=[
+                {
+                    "role": "system",
+                    "content": (
+                        "You are a precise receipt parser. Read the receipt image and extract "
+                        "structured data for expense tracking. Preserve numeric precision and "
+                        "item details; use null for anything not printed on the receipt. "
+                        "Also transcribe every printed line, in order, into ocr_text."
+                    ),
+                },
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text",
+                            "text": f"Extract structured data from this receipt: {filename}"},
+                        {"type": "image_url", "image_url": {"url": data_uri}},
+                    ],
+                },
+            ],
+        )
+
+        content = response.choices[0].message.content.strip()
+
+        try:
+            parsed = json.loads(content)
+        except json.JSONDecodeError:
+            raise HTTPException(
+                status_code=500, detail="Failed to parse JSON from OpenAI output.")
+
+        return parsed
+
+    except resilience.ProviderUnavailable:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"OpenAI vision JSON extraction failed: {e}")
+
+
+def get_extraction_mode() -> str:
+    mode = (env_str("OCR_EXTRACTION_MODE", "two_step") or "").lower()
+    return mode if mode in EXTRACTION_MODES else "two_step"
+
+
+async def extract_receipt(file_bytes: bytes, filename: str, mime: str = "image/jpeg",
+                          mode: Optional[str] = None) -> dict:
+    """
+    Run the configured extraction mode (OCR_EXTRACTION_MODE) and return
+    the parsed receipt dict consumed by process_receipt_ocr. Both modes keep
+    the receipt's text under "ocr_text" for full-text search (single mode
+    asks for the transcription in the same structured output). In two_step
+    mode a confirmed vendor template (app.vendor_templates) replaces the LLM
+    parse.
+    """
+    mode = mode or get_extraction_mode()
+    if mode == "single":
+        with metrics.stage("extract_single"):
+            parsed = await extract_receipt_json(file_bytes, filename, mime)
+        parsed["ocr_text"] = parsed.get("ocr_text") or None
+        return parsed
+
+    with metrics.stage("ocr_text"):
+        ocr_text = await extract_receipt_text(file_bytes, filename, mime)
+    parsed = await vendor_templates.parse(ocr_text)
+    if parsed is None:
+        with metrics.stage("parse_json"):
+            parsed = await parse_receipt_to_json(ocr_text)
+        await vendor_templates.observe(ocr_text, parsed)
+    parsed["ocr_text"] = ocr_text
+    return parsed
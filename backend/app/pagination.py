@@ -0,0 +1,67 @@
+# app/pagination.py
+"""
+Keyset cursors and total-count strategies for list endpoints.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy.orm import Query, Session
+
+
+# exact = COUNT(*), estimated = planner row estimate, none = skip counting
+COUNT_MODES = ("exact", "estimated", "none")
+
+
+def encode_cursor(created_at: datetime, receipt_id: str) -> str:
+    raw = json.dumps([created_at.isoformat(), receipt_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, receipt_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), str(receipt_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_sync_token(change_xid: int, receipt_id: str) -> str:
+    raw = json.dumps([change_xid, receipt_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_sync_token(token: str) -> Tuple[int, str]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        change_xid, receipt_id = json.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(change_xid, int):
+            raise ValueError("not a change_xid")
+        return change_xid, str(receipt_id)
+    except Exception:
+        raise HTTPException(
+            status_code=400, detail="Invalid or outdated sync token; start a full sync")
+
+
+def estimate_count(db: Session, query: Query) -> int:
+    """
+    Row estimate from the planner (EXPLAIN, no execution) for the filtered
+    query. Constant-time regardless of table size, accurate to table stats.
+    """
+    conn = db.connection()
+    compiled = query.statement.compile(dialect=conn.dialect)
+    result = conn.exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()
+    plan = result if isinstance(result, list) else json.loads(result)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_rows(db: Session, query: Query, mode: str) -> Optional[int]:
+    if mode == "none":
+        return None
+    if mode == "estimated":
+        return estimate_count(db, query)
+    return query.order_by(None).count()
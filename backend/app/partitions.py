@@ -0,0 +1,299 @@
+# app/partitions.py
+"""
+Monthly partitions of `receipts` and archival into `receipts_archive`.
+
+`receipts` is range-partitioned by created_at month (receipts_pYYYYMM) with
+a receipts_pdefault catch-all. Partitions are created PARTITION_MONTHS_AHEAD
+months in advance at API startup and by the worker pool every
+PARTITION_CHECK_SECONDS; rows that landed in the default partition are
+moved into the new month's partition when it is created.
+
+Archival moves rows into the compact `receipts_archive` table and removes
+their receipt_items / ocr_jobs rows:
+
+- soft-deleted receipts older than ARCHIVE_DELETED_AFTER_DAYS, in batches
+- whole partitions older than ARCHIVE_RETENTION_MONTHS (0 = keep all),
+  detached and dropped after copying
+
+Spending rollups keep archived amounts. Run from cron:
+
+    python -m app.partitions maintain
+    python -m app.partitions ensure --from 2023-01
+    python -m app.partitions archive --deleted-days 30 --retention-months 36
+"""
+import argparse
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional
+
+from sqlalchemy import and_, false, or_, select, text
+from sqlalchemy.orm import Session
+
+from app import models
+from app.config import env_int
+
+
+PARENT = "receipts"
+DEFAULT_PARTITION = "receipts_pdefault"
+ARCHIVE = "receipts_archive"
+_NAME_RE = re.compile(r"^receipts_p(\d{4})(\d{2})$")
+
+ARCHIVE_COLUMNS = (
+    "id", "created_at", "updated_at", "deleted", "deleted_at", "vendor", "amount", "currency",
+    "expense_date", "category", "status", "batch_id", "content_hash", "data",
+)
+
+
+def months_ahead() -> int:
+    return env_int("PARTITION_MONTHS_AHEAD", 3)
+
+
+def deleted_after_days() -> int:
+    return env_int("ARCHIVE_DELETED_AFTER_DAYS", 30)
+
+
+def retention_months() -> int:
+    return env_int("ARCHIVE_RETENTION_MONTHS", 0)
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"receipts_p{month:%Y%m}"
+
+
+def _writable_columns() -> List[str]:
+    """Receipt columns minus generated ones (search_vector)."""
+    return [c.name for c in models.Receipt.__table__.columns if c.computed is None]
+
+
+def _lock_timeout(db: Session):
+    # DDL on the parent waits behind running queries; give up and retry next run instead
+    db.execute(text("SELECT set_config('lock_timeout', :timeout, true)"),
+               {"timeout": f"{env_int('PARTITION_LOCK_TIMEOUT_MS', 5000)}ms"})
+
+
+# ─────────────────────────────
+# Partition-pruned lookups by id
+# ─────────────────────────────
+def keys_of(db: Session, receipt_ids) -> dict:
+    """{id: created_at} for the live receipts among `receipt_ids` (receipt_keys)."""
+    ids = list(receipt_ids)
+    if not ids:
+        return {}
+    k = models.ReceiptKey
+    return dict(db.execute(select(k.id, k.created_at).where(k.id.in_(ids))).all())
+
+
+def by_ids(db: Session, receipt_ids):
+    """
+    Receipt predicate for these ids that also pins created_at, so Postgres
+    prunes to the partitions holding them instead of probing every month.
+    Ids without a key (archived or unknown) match nothing.
+    """
+    r = models.Receipt
+    keys = keys_of(db, receipt_ids)
+    if not keys:
+        return false()
+    return or_(*(and_(r.id == rid, r.created_at == created_at) for rid, created_at in keys.items()))
+
+
+def by_id(db: Session, receipt_id: str):
+    return by_ids(db, [receipt_id])
+
+
+# ─────────────────────────────
+# Partitions
+# ─────────────────────────────
+def existing_partitions(db: Session) -> List[date]:
+    """Months that have their own partition, oldest first."""
+    names = db.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:parent AS regclass)
+    """), {"parent": PARENT}).scalars().all()
+    months = []
+    for name in names:
+        match = _NAME_RE.match(name)
+        if match:
+            months.append(date(int(match.group(1)), int(match.group(2)), 1))
+    return sorted(months)
+
+
+def _create_partition(db: Session, month: date):
+    """Create one month's partition, moving its rows out of the default partition first."""
+    lower, upper = month, add_months(month, 1)
+    bounds = {"lower": lower, "upper": upper}
+    in_range = "created_at >= :lower AND created_at < :upper"
+    columns = ", ".join(_writable_columns())
+
+    _lock_timeout(db)
+    db.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE"))
+    stray = db.execute(
+        text(f"SELECT count(*) FROM {DEFAULT_PARTITION} WHERE {in_range}"), bounds).scalar()
+    if stray:
+        db.execute(text(f"""
+            CREATE TEMP TABLE _partition_move ON COMMIT DROP AS
+            SELECT {columns} FROM {DEFAULT_PARTITION} WHERE {in_range}
+        """), bounds)
+        db.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE {in_range}"), bounds)
+    db.execute(text(
+        f"CREATE TABLE {partition_name(month)} PARTITION OF {PARENT} "
+        f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"))
+    if stray:
+        db.execute(text(f"INSERT INTO {PARENT} ({columns}) SELECT {columns} FROM _partition_move"))
+    db.commit()
+    if stray:
+        print(f"♻️ Moved {stray} receipt(s) from {DEFAULT_PARTITION} to {partition_name(month)}")
+
+
+def ensure_partitions(db: Session, start: Optional[date] = None,
+                      ahead: Optional[int] = None) -> List[str]:
+    """
+    Create missing monthly partitions from `start` (default: this month)
+    through PARTITION_MONTHS_AHEAD months ahead. Returns the names created.
+    """
+    current = month_start(datetime.now(timezone.utc).date())
+    month = month_start(start) if start else current
+    last = add_months(current, months_ahead() if ahead is None else ahead)
+    have = set(existing_partitions(db))
+    created = []
+    while month <= last:
+        if month not in have:
+            try:
+                _create_partition(db, month)
+                created.append(partition_name(month))
+            except Exception as e:
+                db.rollback()
+                print(f"⚠️ Could not create partition {partition_name(month)}: {e}")
+        month = add_months(month, 1)
+    return created
+
+
+# ─────────────────────────────
+# Archival
+# ─────────────────────────────
+def _archive_insert(source: str, where: str) -> str:
+    columns = ", ".join(ARCHIVE_COLUMNS)
+    selected = ", ".join("CAST(data AS jsonb)" if c == "data" else c for c in ARCHIVE_COLUMNS)
+    return (f"INSERT INTO {ARCHIVE} ({columns}) SELECT {selected} FROM {source} WHERE {where} "
+            f"ON CONFLICT (id) DO NOTHING")
+
+
+def _drop_dependents(db: Session, ids_sql: str, params: dict):
+    """What the receipts.id foreign keys used to cascade / null out."""
+    # Row triggers don't fire for a dropped partition; clear its lookup keys too
+    db.execute(text(f"DELETE FROM receipt_keys WHERE id IN ({ids_sql})"), params)
+    db.execute(text(f"DELETE FROM receipt_items WHERE receipt_id IN ({ids_sql})"), params)
+    db.execute(text(f"DELETE FROM ocr_jobs WHERE receipt_id IN ({ids_sql})"), params)
+    db.execute(text(f"UPDATE parse_cache SET receipt_id = NULL WHERE receipt_id IN ({ids_sql})"),
+               params)
+
+
+def archive_deleted(db: Session, older_than_days: Optional[int] = None, batch: int = 1000) -> int:
+    """Move soft-deleted receipts past the grace period to the archive. Returns rows moved."""
+    days = deleted_after_days() if older_than_days is None else older_than_days
+    moved = 0
+    while True:
+        ids = db.execute(text(f"""
+            SELECT id FROM {PARENT}
+            WHERE deleted = true AND deleted_at < now() - make_interval(days => :days)
+            ORDER BY deleted_at
+            LIMIT :batch
+            FOR UPDATE SKIP LOCKED
+        """), {"days": days, "batch": batch}).scalars().all()
+        if not ids:
+            return moved
+        params = {"ids": list(ids)}
+        db.execute(text(_archive_insert(PARENT, "id = ANY(:ids)")), params)
+        _drop_dependents(db, "SELECT unnest(CAST(:ids AS text[]))", params)
+        db.execute(text(f"DELETE FROM {PARENT} WHERE id = ANY(:ids)"), params)
+        db.commit()
+        moved += len(ids)
+
+
+def archive_partitions(db: Session, months: Optional[int] = None) -> List[str]:
+    """
+    Detach partitions wholly older than `months` (ARCHIVE_RETENTION_MONTHS),
+    copy their rows to the archive and drop them. 0 keeps everything.
+    """
+    keep = retention_months() if months is None else months
+    if keep <= 0:
+        return []
+    cutoff = add_months(month_start(datetime.now(timezone.utc).date()), -keep)
+    archived = []
+    for month in existing_partitions(db):
+        if add_months(month, 1) > cutoff:
+            break
+        name = partition_name(month)
+        try:
+            _lock_timeout(db)
+            db.execute(text(f"ALTER TABLE {PARENT} DETACH PARTITION {name}"))
+            db.execute(text(_archive_insert(name, "true")))
+            _drop_dependents(db, f"SELECT id FROM {name}", {})
+            db.execute(text(f"DROP TABLE {name}"))
+            db.commit()
+            archived.append(name)
+        except Exception as e:
+            db.rollback()
+            print(f"⚠️ Could not archive partition {name}: {e}")
+    return archived
+
+
+def stats(db: Session) -> dict:
+    rows = db.execute(text("""
+        SELECT c.relname, c.reltuples::bigint AS rows, pg_total_relation_size(c.oid) AS bytes
+        FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = CAST(:parent AS regclass)
+        ORDER BY c.relname
+    """), {"parent": PARENT}).all()
+    archived = db.execute(text(f"SELECT count(*) FROM {ARCHIVE}")).scalar()
+    return {
+        "partitions": [{"name": r.relname, "rows_estimate": max(r.rows, 0), "bytes": r.bytes}
+                       for r in rows],
+        "archived_receipts": archived,
+    }
+
+
+def _month_arg(value: str) -> date:
+    return datetime.strptime(value, "%Y-%m").date()
+
+
+def main():
+    from app.db import get_sessionmaker
+
+    parser = argparse.ArgumentParser(description="Receipt partitions and archival")
+    parser.add_argument("command", choices=("ensure", "archive", "maintain", "stats"))
+    parser.add_argument("--from", dest="start", type=_month_arg,
+                        help="first month to create (YYYY-MM), default this month")
+    parser.add_argument("--ahead", type=int, help="months ahead to create")
+    parser.add_argument("--deleted-days", type=int, help="archive soft-deleted rows older than this")
+    parser.add_argument("--retention-months", type=int, help="archive partitions older than this")
+    args = parser.parse_args()
+
+    db = get_sessionmaker()()
+    try:
+        if args.command in ("ensure", "maintain"):
+            created = ensure_partitions(db, args.start, args.ahead)
+            print(f"✅ Created {len(created)} partition(s) {' '.join(created)}")
+        if args.command in ("archive", "maintain"):
+            moved = archive_deleted(db, args.deleted_days)
+            print(f"✅ Archived {moved} soft-deleted receipt(s)")
+            dropped = archive_partitions(db, args.retention_months)
+            print(f"✅ Archived {len(dropped)} partition(s) {' '.join(dropped)}")
+        if args.command == "stats":
+            for part in stats(db)["partitions"]:
+                print(f"{part['name']:20s} ~{part['rows_estimate']:>10} rows {part['bytes']:>14} bytes")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+# app/preprocess.py
+"""
+Image preprocessing ahead of the OCR call.
+
+EXIF orientation fix → receipt-region crop → grayscale → downscale →
+re-encode (JPEG/WebP). Runs in a process pool so Pillow work never holds
+the API process's GIL.
+"""
+import asyncio
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple, Union
+
+from PIL import Image, ImageOps
+
+from app.config import env_bool, env_int, env_str
+
+
+# Receipt paper is brighter than the table it sits on; pixels above this
+# (after autocontrast) count as "paper" when looking for the crop box.
+PAPER_THRESHOLD = 170
+MIN_CROP_AREA = 0.2  # ignore crop boxes smaller than 20% of the frame
+CROP_MARGIN = 0.02
+
+
+def _settings() -> dict:
+    return {
+        "max_dim": env_int("PREPROCESS_MAX_DIM", 1600),
+        "format": (env_str("PREPROCESS_FORMAT", "jpeg") or "jpeg").lower(),
+        "quality": env_int("PREPROCESS_QUALITY", 80),
+        "grayscale": env_bool("PREPROCESS_GRAYSCALE", True),
+        "crop": env_bool("PREPROCESS_CROP", True),
+    }
+
+
+def _crop_to_receipt(img: Image.Image) -> Image.Image:
+    gray = ImageOps.autocontrast(img.convert("L").reduce(4))
+    mask = gray.point(lambda p: 255 if p > PAPER_THRESHOLD else 0)
+    bbox = mask.getbbox()
+    if not bbox:
+        return img
+
+    left, top, right, bottom = (v * 4 for v in bbox)
+    area = (right - left) * (bottom - top)
+    if area < MIN_CROP_AREA * img.width * img.height:
+        return img
+
+    mx, my = int(img.width * CROP_MARGIN), int(img.height * CROP_MARGIN)
+    return img.crop((
+        max(left - mx, 0), max(top - my, 0),
+        min(right + mx, img.width), min(bottom + my, img.height),
+    ))
+
+
+def _original(source: Union[bytes, str]) -> bytes:
+    if isinstance(source, bytes):
+        return source
+    with open(source, "rb") as f:
+        return f.read()
+
+
+def preprocess_image(source: Union[bytes, str], mime: Optional[str], settings: dict) -> Tuple[bytes, str, dict]:
+    """
+    `source` is raw bytes or a blob path (read here, inside the pool worker).
+    Return (bytes, mime, stats). Falls back to the original bytes when the
+    image can't be decoded or the result would not be smaller.
+    """
+    size = len(source) if isinstance(source, bytes) else os.path.getsize(source)
+    stats = {"bytes_before": size, "bytes_after": size, "applied": False}
+    try:
+        img = Image.open(io.BytesIO(source) if isinstance(source, bytes) else source)
+        img = ImageOps.exif_transpose(img)
+        stats["size_before"] = list(img.size)
+
+        if settings["crop"]:
+            img = _crop_to_receipt(img)
+        img = img.convert("L") if settings["grayscale"] else img.convert("RGB")
+
+        max_dim = settings["max_dim"]
+        if max(img.size) > max_dim:
+            img.thumbnail((max_dim, max_dim), Image.LANCZOS)
+        stats["size_after"] = list(img.size)
+
+        out = io.BytesIO()
+        if settings["format"] == "webp":
+            img.save(out, format="WEBP", quality=settings["quality"], method=4)
+            out_mime = "image/webp"
+        else:
+            img.save(out, format="JPEG", quality=settings["quality"], optimize=True)
+            out_mime = "image/jpeg"
+        processed = out.getvalue()
+    except Exception as e:
+        stats["error"] = str(e)
+        return _original(source), mime or "image/jpeg", stats
+
+    if len(processed) >= size:
+        return _original(source), mime or "image/jpeg", stats
+
+    stats.update({"bytes_after": len(processed), "applied": True})
+    return processed, out_mime, stats
+
+
+# ─────────────────────────────
+# Process pool
+# ─────────────────────────────
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=env_int("PREPROCESS_WORKERS", 2))
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_preprocess(source: Union[bytes, str], mime: Optional[str]) -> Tuple[bytes, str, dict]:
+    """
+    Preprocess in the process pool. Passing a blob path keeps the original
+    image out of this process entirely. No-op when PREPROCESS_ENABLED=false.
+    """
+    if not env_bool("PREPROCESS_ENABLED", True):
+        original = await asyncio.to_thread(_original, source)
+        return original, mime or "image/jpeg", {
+            "bytes_before": len(original), "bytes_after": len(original), "applied": False}
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _get_executor(), preprocess_image, source, mime, _settings())
@@ -0,0 +1,166 @@
+# app/ratelimit.py
+"""
+Token-bucket scheduler for OpenAI calls.
+
+Enforces requests-per-minute and tokens-per-minute budgets, serves waiting
+callers in FIFO order and folds the provider's x-ratelimit-* headers back
+into the buckets so we slow down before the API starts returning 429s.
+"""
+import asyncio
+import re
+import time
+from typing import Awaitable, Callable, Mapping, Optional, TypeVar
+
+from app.config import env_int
+
+
+T = TypeVar("T")
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse OpenAI reset values like '20ms', '1s', '6m0s' into seconds."""
+    if not value:
+        return None
+    try:
+        return float(value)  # retry-after style plain seconds
+    except ValueError:
+        pass
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        return None
+    scale = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    return sum(float(n) * scale[unit] for n, unit in parts)
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at capacity-per-minute."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(max(per_minute, 1))
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill()
+        amount = min(amount, self.capacity)  # oversized requests wait for a full bucket
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self._refill()
+        self.tokens -= amount
+
+    def give_back(self, amount: float):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def clamp(self, remaining: float):
+        """Never believe we have more budget than the provider says we do."""
+        self._refill()
+        self.tokens = min(self.tokens, remaining)
+
+
+class RateLimitScheduler:
+    """
+    Admits calls only when both the RPM and TPM buckets have room.
+    Waiters queue on an asyncio.Lock, which wakes them in arrival order.
+    """
+
+    def __init__(self, rpm: Optional[int] = None, tpm: Optional[int] = None,
+                 max_concurrency: Optional[int] = None):
+        self.requests = TokenBucket(rpm or env_int("OPENAI_RPM_LIMIT", 500))
+        self.tokens = TokenBucket(tpm or env_int("OPENAI_TPM_LIMIT", 200000))
+        self._admission = asyncio.Lock()
+        self._inflight = asyncio.Semaphore(
+            max_concurrency or env_int("OPENAI_MAX_CONCURRENCY", 16))
+        self._paused_until = 0.0
+        self.stats = {"calls": 0, "throttled_ms": 0.0, "rate_limited": 0}
+
+    def pause(self, seconds: float):
+        """Hold all new calls for `seconds` (e.g. after a 429)."""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    async def _admit(self, estimated_tokens: int):
+        started = time.monotonic()
+        async with self._admission:
+            while True:
+                delay = max(
+                    self._paused_until - time.monotonic(),
+                    self.requests.wait_time(1),
+                    self.tokens.wait_time(estimated_tokens),
+                )
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+        self.stats["throttled_ms"] += (time.monotonic() - started) * 1000
+
+    def try_admit(self, estimated_tokens: int) -> bool:
+        """
+        Take budget for one extra call (a hedge) only if it is free right now:
+        nobody queued, not paused, both buckets have room. Never waits.
+        """
+        if self._admission.locked() or time.monotonic() < self._paused_until:
+            return False
+        if self.requests.wait_time(1) > 0 or self.tokens.wait_time(estimated_tokens) > 0:
+            return False
+        self.requests.take(1)
+        self.tokens.take(estimated_tokens)
+        return True
+
+    def observe_headers(self, headers: Mapping[str, str]):
+        """Sync local buckets with x-ratelimit-* / retry-after response headers."""
+        remaining_requests = headers.get("x-ratelimit-remaining-requests")
+        remaining_tokens = headers.get("x-ratelimit-remaining-tokens")
+        try:
+            if remaining_requests is not None:
+                self.requests.clamp(float(remaining_requests))
+            if remaining_tokens is not None:
+                self.tokens.clamp(float(remaining_tokens))
+        except ValueError:
+            pass
+
+        if remaining_requests == "0":
+            reset = parse_reset_duration(headers.get("x-ratelimit-reset-requests"))
+            if reset:
+                self.pause(reset)
+        if remaining_tokens == "0":
+            reset = parse_reset_duration(headers.get("x-ratelimit-reset-tokens"))
+            if reset:
+                self.pause(reset)
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Correct the TPM bucket once the real usage is known."""
+        if actual_tokens is None:
+            return
+        diff = estimated_tokens - actual_tokens
+        if diff > 0:
+            self.tokens.give_back(diff)
+        elif diff < 0:
+            self.tokens.take(-diff)
+
+    async def run(self, estimated_tokens: int, call: Callable[[], Awaitable[T]]) -> T:
+        """Wait for budget, then await `call()`."""
+        await self._admit(estimated_tokens)
+        async with self._inflight:
+            self.stats["calls"] += 1
+            try:
+                return await call()
+            except Exception as e:
+                if getattr(e, "status_code", None) == 429:
+                    self.stats["rate_limited"] += 1
+                    headers = getattr(getattr(e, "response", None), "headers", None) or {}
+                    self.observe_headers(headers)
+                    self.pause(parse_reset_duration(headers.get("retry-after")) or 1.0)
+                raise
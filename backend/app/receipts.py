@@ -1,96 +1,178 @@
 from sqlalchemy import extract, or_, cast, String
 from sqlalchemy.sql import and_, or_
-from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy import text
-from fastapi import Query, Depends, APIRouter, UploadFile, File, HTTPException, BackgroundTasks
+from sqlalchemy.dialects.postgresql import JSONB, ARRAY
+from sqlalchemy import text, insert, tuple_, false, func, update, any_, literal, JSON
+from fastapi import Query, Depends, APIRouter, UploadFile, File, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import extract, or_
-from typing import Optional
+from typing import List, Optional, Union
 from datetime import datetime
 import shortuuid
 import asyncio
+import json
 
-from app.db import get_db
-from app import models, schemas
-from app.openai_handler import extract_receipt_text, parse_receipt_to_json
+from app.db import get_db, get_sessionmaker
+from app.config import env_int
+from app import (
+    models, schemas, dedup, storage, batch, rollups, cache, serialize, events, export, metrics,
+    partitions, jobs,
+)
+from app.openai_handler import extract_receipt
+from app.jobs import enqueue_ocr_job, ocr_job_row
+from app.preprocess import run_preprocess
+from app.pagination import (
+    count_rows, decode_cursor, decode_sync_token, encode_cursor, encode_sync_token,
+)
+from app.items import insert_items, item_names, item_rows, item_to_dict, items_total, replace_items
+from app.worker import get_worker_pool
 
 router = APIRouter(prefix="/receipts", tags=["Receipts"])
 
 
 # ─────────────────────────────
-# 🧠 Background OCR Processor
+# 🧠 OCR Processor (run by app.worker)
 # ─────────────────────────────
-def process_receipt_ocr(db: Session, file_bytes: bytes, filename: str, mime: str, receipt_id: str):
+def ocr_result_fields(parsed: dict, filename: str) -> dict:
     """
-    Background task: performs OCR + JSON parsing asynchronously,
-    then updates the existing DB record (flat schema, single currency field).
+    Column values for a parsed receipt (flat schema, single currency field).
     """
-    async def run_ocr():
+    vendor = parsed.get("vendor")
+    amount = parsed.get("total")
+    currency = parsed.get("currency", "IDR")
+    date_str = parsed.get("date")
+    category = parsed.get("category")
+    items = parsed.get("items", [])
+
+    expense_date = None
+    if date_str:
         try:
-            ocr_text = await extract_receipt_text(file_bytes, filename, mime)
-            parsed = await parse_receipt_to_json(ocr_text)
+            expense_date = datetime.fromisoformat(date_str)
+        except Exception:
+            expense_date = None
 
-            receipt = db.query(models.Receipt).filter_by(id=receipt_id).first()
-            if not receipt:
-                return
+    # ✅ Flatten everything: no nested parsed.currency anymore
+    return {
+        "vendor": vendor,
+        "amount": amount,
+        "currency": currency,
+        "expense_date": expense_date,
+        "category": category,
+        "status": "parsed",
+        "error_message": None,
+        "ocr_text": parsed.get("ocr_text"),
+        "item_names": item_names(items),
+        "data": {
+            "vendor": vendor,
+            "amount": amount,
+            "currency": currency,
+            "expense_date": date_str,
+            "category": category,
+            "items": items,
+            "status": "parsed",
+            "source_image": filename,
+            "parser": parsed.get("parser", "llm"),
+        },
+    }
 
-            vendor = parsed.get("vendor")
-            amount = parsed.get("total")
-            currency = parsed.get("currency", "IDR")
-            date_str = parsed.get("date")
-            category = parsed.get("category")
-            items = parsed.get("items", [])
 
-            expense_date = None
-            if date_str:
-                try:
-                    expense_date = datetime.fromisoformat(date_str)
-                except Exception:
-                    expense_date = None
-
-            # ✅ Flatten everything: no nested parsed.currency anymore
-            receipt.vendor = vendor
-            receipt.amount = amount
-            receipt.currency = currency
-            receipt.expense_date = expense_date
-            receipt.category = category
-
-            receipt.data = {
-                "vendor": vendor,
-                "amount": amount,
-                "currency": currency,
-                "expense_date": date_str,
-                "category": category,
-                "items": items,
-                "status": "parsed",
-                "source_image": filename,
-            }
+def apply_ocr_result(receipt: models.Receipt, parsed: dict, filename: str):
+    """
+    Copy parsed OCR output onto the receipt.
+    """
+    for key, value in ocr_result_fields(parsed, filename).items():
+        setattr(receipt, key, value)
 
-            db.commit()
 
-        except Exception as e:
-            receipt = db.query(models.Receipt).filter_by(id=receipt_id).first()
-            if receipt:
-                receipt.data = {"error": str(e), "status": "failed"}
-                db.commit()
+def _save_ocr_result(job_id: str, lease_token: str, receipt_id: str, parsed: dict, filename: str,
+                     preprocess_stats: dict, job_metrics: dict) -> bool:
+    """
+    Write the result and mark the job done in one transaction, fenced by
+    the job's lease: a worker whose lease expired and was taken over writes
+    nothing. False when the lease was lost.
+    """
+    db = get_sessionmaker()()
+    try:
+        # Job row first, in the same order mark_failed locks job then receipt
+        job = jobs.finish_leased(db, job_id, lease_token)
+        if not job:
+            db.rollback()
+            return False
+        # Row lock: a concurrent PATCH / delete must not snapshot the same "before"
+        receipt = db.query(models.Receipt).filter(
+            partitions.by_id(db, receipt_id)).with_for_update(of=models.Receipt).first()
+        if not receipt:
+            db.commit()  # the job is done either way
+            return True
+        before = rollups.snapshot(receipt)
+        apply_ocr_result(receipt, parsed, filename)
+        receipt.data["preprocess"] = preprocess_stats
+        receipt.data["usage"] = dict(job_metrics["usage"])
+        receipt.ocr_finished_at = func.now()
+        replace_items(db, receipt.id, parsed.get("items"))
+        rollups.apply_change(db, before, rollups.snapshot(receipt))
+        if receipt.content_hash:
+            dedup.store(db, receipt.content_hash, parsed, receipt.id, replace=job.reprocess)
+        events.publish(db, receipt.id, "parsed", receipt.batch_id)
+        # "total" and "db_commit" are still open: store them as of this commit
+        receipt.data = {**receipt.data, "timings_ms": metrics.timings_so_far(job_metrics)}
+        db.commit()
+        cache.invalidate_receipt(receipt_id)
+        return True
+    finally:
+        db.close()
+
 
-    asyncio.run(run_ocr())
+async def process_receipt_ocr(source: Union[str, bytes], filename: str, mime: str, receipt_id: str,
+                              job_id: str, lease_token: str) -> bool:
+    """
+    `source` is a blob path (or raw bytes for legacy jobs).
+    Preprocesses the image, performs OCR + JSON parsing (OCR_EXTRACTION_MODE),
+    then updates the existing DB record and completes the job in its own
+    session; False when the job's lease was lost and nothing was written.
+    Errors propagate so the job queue can retry or fail the job. Stage
+    timings and token usage are recorded in app.metrics and stored on the
+    receipt; the stored "db_commit" and "total" timings run up to the final
+    commit.
+    """
+    job_metrics = metrics.start_job()
+    with metrics.stage("total"):
+        with metrics.stage("preprocess"):
+            image_bytes, image_mime, preprocess_stats = await run_preprocess(source, mime)
+        parsed = await extract_receipt(image_bytes, filename, image_mime)
+        with metrics.stage("db_commit"):
+            return await asyncio.to_thread(
+                _save_ocr_result, job_id, lease_token, receipt_id, parsed, filename,
+                preprocess_stats, job_metrics)
 
 
 # ─────────────────────────────
-# 1️⃣ CREATE (Upload + Schedule OCR)
+# 1️⃣ CREATE (Upload + Enqueue OCR)
 # ─────────────────────────────
 @router.post("/", response_model=schemas.ReceiptRead)
 async def upload_receipt(
-    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     db: Session = Depends(get_db)
 ):
     """
-    Step 1: Create placeholder receipt record (flat schema).
-    Step 2: Trigger background OCR task.
+    Step 1: Stream the file into the blob store (size-capped, MIME-sniffed).
+    Step 2: Look the image up in the dedup cache (DEDUP_POLICY).
+    Step 3: Create placeholder receipt record (flat schema).
+    Step 4: Enqueue a durable OCR job in the same transaction.
     """
     try:
+        blob = await storage.save_upload(file)
+        digest = blob.key  # SHA-256 of the content, shared with the dedup cache
+        policy = dedup.get_policy()
+
+        cached = dedup.lookup(db, digest) if policy != "off" else None
+        if cached and policy == "link" and cached[1]:
+            original = db.query(models.Receipt).filter(
+                partitions.by_id(db, cached[1]), models.Receipt.deleted.is_(False)).first()
+            if original:
+                db.commit()  # persist the hit counter
+                return original
+
         new_receipt = models.Receipt(
             id=shortuuid.uuid(),
             vendor=None,
@@ -102,54 +184,279 @@ async def upload_receipt(
                 "status": "processing",
                 "source_image": file.filename,
             },
+            status="processing",
+            content_hash=digest,
         )
         db.add(new_receipt)
+
+        if cached:
+            # ✅ Cache hit: finish instantly, no OCR call
+            apply_ocr_result(new_receipt, cached[0], file.filename)
+            new_receipt.data["deduplicated_from"] = cached[1]
+            db.flush()
+            insert_items(db, item_rows(new_receipt.id, cached[0].get("items")))
+            rollups.apply_change(db, None, rollups.snapshot(new_receipt))
+            db.commit()
+            cache.invalidate_lists()
+            db.refresh(new_receipt)
+            return new_receipt
+
+        enqueue_ocr_job(db, new_receipt.id, blob.key, file.filename, blob.mime)
         db.commit()
+        cache.invalidate_lists()
         db.refresh(new_receipt)
 
-        file_bytes = await file.read()
-        background_tasks.add_task(
-            process_receipt_ocr,
-            db, file_bytes, file.filename, file.content_type, new_receipt.id
-        )
+        pool = get_worker_pool()
+        if pool:
+            pool.notify()
 
         return new_receipt
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Receipt upload failed: {e}")
 
 
+# ─────────────────────────────
+# 🔁 RE-PROCESS (from stored blob)
+# ─────────────────────────────
+@router.post("/{receipt_id}/reprocess", response_model=schemas.ReceiptRead)
+def reprocess_receipt(receipt_id: str, db: Session = Depends(get_db)):
+    """
+    Re-run OCR on the stored original image without a re-upload. The new
+    parse also replaces the image's dedup cache entry, so later uploads of
+    the same photo get the corrected result.
+    """
+    receipt = db.query(models.Receipt).filter(
+        partitions.by_id(db, receipt_id), models.Receipt.deleted.is_(False)).first()
+    if not receipt:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+    if not storage.blob_exists(receipt.content_hash):
+        raise HTTPException(
+            status_code=409, detail="Original image not stored for this receipt")
+
+    filename = (receipt.data or {}).get("source_image")
+    mime = storage.sniff_mime(storage.read_head(receipt.content_hash))
+    new_data = dict(receipt.data or {})
+    new_data.pop("error", None)
+    new_data["status"] = "processing"
+    receipt.data = new_data
+    receipt.status = "processing"
+    receipt.error_message = None
+    receipt.ocr_started_at = None
+    receipt.ocr_finished_at = None
+    enqueue_ocr_job(db, receipt.id, receipt.content_hash, filename, mime, reprocess=True)
+    events.publish(db, receipt.id, "queued", receipt.batch_id)
+    db.commit()
+    cache.invalidate_receipt(receipt.id)
+    db.refresh(receipt)
+
+    pool = get_worker_pool()
+    if pool:
+        pool.notify()
+
+    return receipt
+
 
 # ─────────────────────────────
-# 2️⃣ LIST (Hide failed OCR)
+# 📦 BATCH UPLOAD (many files / ZIP)
 # ─────────────────────────────
-@router.get("/", response_model=schemas.PaginatedReceipts)
-def list_receipts(
-    db: Session = Depends(get_db),
-    vendor: Optional[str] = Query(None),
-    category: Optional[str] = Query(None),
-    year: Optional[int] = Query(None),
-    month: Optional[int] = Query(None),
-    min_amount: Optional[float] = Query(None),
-    max_amount: Optional[float] = Query(None),
-    include_deleted: bool = Query(False),
-    hide_failed: bool = Query(True),
-    limit: int = Query(10, ge=1, le=100),
-    offset: int = Query(0, ge=0),
+@router.post("/batch", response_model=schemas.BatchUploadResult)
+async def upload_receipt_batch(
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(get_db)
 ):
-    query = db.query(models.Receipt)
+    """
+    Accept many images and/or ZIP archives. All placeholder receipts and
+    OCR jobs are written with two bulk INSERTs in a single transaction.
+    """
+    ingested = await batch.ingest_files(files)
+    batch_id = shortuuid.uuid()
+    policy = dedup.get_policy()
+
+    digests = [item.blob.key for item in ingested if item.blob]
+    cached = dedup.lookup_many(db, digests) if policy != "off" else {}
+
+    live_originals = set()
+    if policy == "link":
+        original_ids = {hit[1] for hit in cached.values() if hit[1]}
+        if original_ids:
+            live_originals = {
+                rid for (rid,) in db.query(models.Receipt.id).filter(
+                    models.Receipt.id.in_(original_ids),
+                    models.Receipt.deleted.is_(False),
+                )
+            }
+
+    receipt_rows, job_rows, line_item_rows, results = [], [], [], []
+    for index, item in enumerate(ingested):
+        if item.error or not item.blob:
+            results.append(schemas.BatchItem(
+                index=index, filename=item.filename, status="rejected", error=item.error))
+            continue
+
+        hit = cached.get(item.blob.key)
+        if hit and policy == "link" and hit[1] in live_originals:
+            results.append(schemas.BatchItem(
+                index=index, filename=item.filename, status="duplicate", receipt_id=hit[1]))
+            continue
+
+        receipt_id = shortuuid.uuid()
+        row = {
+            "id": receipt_id,
+            "vendor": None,
+            "amount": None,
+            "currency": "IDR",
+            "expense_date": None,
+            "category": None,
+            "status": "processing",
+            "error_message": None,
+            "ocr_text": None,
+            "item_names": None,
+            "data": {"status": "processing", "source_image": item.filename},
+            "deleted": False,
+            "content_hash": item.blob.key,
+            "batch_id": batch_id,
+        }
+        if hit:
+            # ✅ Cache hit: finish instantly, no OCR call
+            row.update(ocr_result_fields(hit[0], item.filename))
+            row["data"]["deduplicated_from"] = hit[1]
+            line_item_rows.extend(item_rows(receipt_id, hit[0].get("items")))
+            status = "parsed"
+        else:
+            job_rows.append(ocr_job_row(
+                receipt_id, item.blob.key, item.filename, item.blob.mime))
+            status = "queued"
+        receipt_rows.append(row)
+        results.append(schemas.BatchItem(
+            index=index, filename=item.filename, status=status, receipt_id=receipt_id))
+
+    try:
+        if receipt_rows:
+            db.execute(insert(models.Receipt), receipt_rows)
+        if job_rows:
+            db.execute(insert(models.OcrJob), job_rows)
+        insert_items(db, line_item_rows)
+        rollups.add_many(db, (rollups.snapshot_row(row) for row in receipt_rows))
+        db.commit()
+        cache.invalidate_lists()
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(
+            status_code=500, detail=f"Batch upload failed: {e}")
+
+    pool = get_worker_pool()
+    if pool and job_rows:
+        pool.notify()
 
+    return {
+        "batch_id": batch_id,
+        "total": len(results),
+        "queued": len(job_rows),
+        "duplicates": sum(r.status in ("duplicate", "parsed") for r in results),
+        "rejected": sum(r.status == "rejected" for r in results),
+        "items": results,
+    }
+
+
+@router.get("/batch/{batch_id}", response_model=schemas.BatchStatus)
+def get_batch_status(batch_id: str, db: Session = Depends(get_db)):
+    """
+    Per-item OCR status for every receipt created by a batch upload.
+    """
+    rows = (
+        db.query(models.Receipt.id, models.Receipt.status,
+                 models.Receipt.error_message, models.Receipt.data["source_image"].as_string())
+        .filter(models.Receipt.batch_id == batch_id)
+        .order_by(models.Receipt.id)
+        .all()
+    )
+    if not rows:
+        raise HTTPException(status_code=404, detail="Batch not found")
+
+    items, counts = [], {}
+    for index, (receipt_id, status, error, filename) in enumerate(rows):
+        status = status or "processing"
+        counts[status] = counts.get(status, 0) + 1
+        items.append(schemas.BatchItem(
+            index=index, filename=filename, status=status,
+            receipt_id=receipt_id, error=error))
+
+    return {"batch_id": batch_id, "total": len(items), "counts": counts, "items": items}
+
+
+# ─────────────────────────────
+# ⚡ Cached JSON responses (ETag / 304)
+# ─────────────────────────────
+def _cached_response(request: Request, key: str, etag: str, build) -> Response:
+    """
+    304 when the client already holds `etag`, else the cached body, else
+    `build()` (which may raise HTTPException) stored under `etag`.
+    """
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if cache.etag_matches(request.headers.get("if-none-match"), etag):
+        cache.note_not_modified()
+        return Response(status_code=304, headers=headers)
+
+    body = cache.get(key, etag)
+    if body is None:
+        body = build()
+        cache.put(key, etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# ─────────────────────────────
+# 🔎 Shared list filters
+# ─────────────────────────────
+def expense_date_range(year: Optional[int], month: Optional[int]):
+    """
+    [start, end) bounds for a year and/or month filter, so the predicate
+    stays sargable on ix_receipts_expense_date. Month without a year has
+    no single range and returns None.
+    """
+    if not year:
+        return None
+    if month:
+        start = datetime(year, month, 1)
+        end = datetime(year + (month == 12), month % 12 + 1, 1)
+    else:
+        start = datetime(year, 1, 1)
+        end = datetime(year + 1, 1, 1)
+    return start, end
+
+
+def search_query(q: str):
+    """websearch syntax: words are ANDed, "quoted phrases", -excluded, or."""
+    return func.websearch_to_tsquery(models.SEARCH_CONFIG, q)
+
+
+def filter_receipts(
+    query,
+    vendor: Optional[str] = None,
+    category: Optional[str] = None,
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    include_deleted: bool = False,
+    hide_failed: bool = True,
+    q: Optional[str] = None,
+):
+    """
+    Apply the GET /receipts/ filters. Predicates are written to match the
+    partial indexes (`deleted = false`), the vendor trigram index and the
+    search_vector GIN index.
+    """
     if not include_deleted:
-        query = query.filter(models.Receipt.deleted.is_(False))
+        query = query.filter(models.Receipt.deleted == false())
 
-    # ✅ Fixed JSONB filter for SQLAlchemy 2.x
+    # ✅ Indexed status column instead of casting data["error"] per row
     if hide_failed:
         query = query.filter(
-            or_(
-                cast(models.Receipt.data["error"], String).is_(None),
-                cast(models.Receipt.data["error"], String) == "",
-            ),
+            models.Receipt.status == "parsed",
             models.Receipt.vendor.isnot(None),
         )
 
@@ -158,46 +465,589 @@ def list_receipts(
         query = query.filter(models.Receipt.vendor.ilike(f"%{vendor}%"))
     if category:
         query = query.filter(models.Receipt.category == category)
-    if year:
+
+    date_range = expense_date_range(year, month)
+    if date_range:
         query = query.filter(
-            extract("year", models.Receipt.expense_date) == year)
-    if month:
+            models.Receipt.expense_date >= date_range[0],
+            models.Receipt.expense_date < date_range[1],
+        )
+    elif month:
         query = query.filter(
             extract("month", models.Receipt.expense_date) == month)
+
+    if q:
+        query = query.filter(models.Receipt.search_vector.op("@@")(search_query(q)))
+
     if min_amount:
         query = query.filter(models.Receipt.amount >= min_amount)
     if max_amount:
         query = query.filter(models.Receipt.amount <= max_amount)
+    return query
 
-    total = query.count()
-    results = (
-        query.order_by(models.Receipt.created_at.desc())
-        .offset(offset)
-        .limit(limit)
-        .all()
+
+# ─────────────────────────────
+# 2️⃣ LIST (Hide failed OCR)
+# ─────────────────────────────
+@router.get("/", response_model=schemas.PaginatedReceipts)
+def list_receipts(
+    request: Request,
+    db: Session = Depends(get_db),
+    vendor: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    year: Optional[int] = Query(None),
+    month: Optional[int] = Query(None, ge=1, le=12),
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
+    include_deleted: bool = Query(False),
+    hide_failed: bool = Query(True),
+    limit: int = Query(10, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    pagination: str = Query("offset", pattern="^(offset|cursor)$"),
+    cursor: Optional[str] = Query(None),
+    total_mode: str = Query("exact", pattern="^(exact|estimated|none)$"),
+    fields: Optional[str] = Query(
+        None, description="comma-separated columns to return, e.g. vendor,amount,expense_date,status"),
+    q: Optional[str] = Query(
+        None, description="full-text search over vendor, item names and OCR text"),
+):
+    """
+    Offset pagination by default. `pagination=cursor` (or passing `cursor`)
+    switches to keyset pagination on (created_at, id); follow `next_cursor`.
+    `total_mode` picks an exact COUNT, a planner estimate, or no total.
+    `fields` selects only those columns in SQL (skip `data` for list views).
+    `q` filters through the search_vector GIN index and ranks by relevance.
+    Pages are cached per query string and carry an ETag (304 on If-None-Match).
+    """
+    if q and (pagination == "cursor" or cursor):
+        raise HTTPException(
+            status_code=400, detail="Search results are ranked; use offset pagination with q")
+
+    names = serialize.parse_fields(fields)
+    filters = dict(
+        vendor=vendor, category=category, year=year, month=month,
+        min_amount=min_amount, max_amount=max_amount,
+        include_deleted=include_deleted, hide_failed=hide_failed, q=q,
+    )
+    def build() -> bytes:
+        return serialize.dumps(_list_page(
+            db, names, filters, limit, offset, pagination, cursor, total_mode))
+
+    tagged = cache.list_etag(dict(request.query_params)) if cache.lists_enabled() else None
+    if tagged is None:
+        return Response(content=build(), media_type="application/json")
+    key, etag = tagged
+    return _cached_response(request, key, etag, build)
+
+
+def _list_page(
+    db: Session, names, filters: dict, limit, offset, pagination, cursor, total_mode,
+) -> dict:
+    """
+    One page as plain dicts: selected columns only, no ORM hydration.
+    created_at is always selected (cursor key) but only returned if asked for.
+    """
+    columns = serialize.receipt_columns(names)
+    if "created_at" not in names:
+        columns.append(models.Receipt.created_at)
+    query = filter_receipts(db.query(*columns), **filters)
+
+    total = count_rows(db, query, total_mode)
+    order = [models.Receipt.created_at.desc(), models.Receipt.id.desc()]
+    if filters.get("q"):
+        rank = func.ts_rank_cd(models.Receipt.search_vector, search_query(filters["q"]))
+        order.insert(0, rank.desc())
+    ordered = query.order_by(*order)
+
+    next_cursor = None
+    if pagination == "cursor" or cursor:
+        if cursor:
+            created_at, receipt_id = decode_cursor(cursor)
+            ordered = ordered.filter(
+                tuple_(models.Receipt.created_at, models.Receipt.id)
+                < tuple_(created_at, receipt_id)
+            )
+        rows = ordered.limit(limit + 1).all()
+        offset = 0
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_cursor(last.created_at, last.id)
+        rows = rows[:limit]
+    else:
+        rows = ordered.offset(offset).limit(limit).all()
+
+    return {"total": total, "total_mode": total_mode, "limit": limit, "offset": offset,
+            "next_cursor": next_cursor, "results": serialize.rows_to_dicts(rows, names)}
+
+
+# ─────────────────────────────
+# 📤 BULK EXPORT (streamed, registered before /{receipt_id})
+# ─────────────────────────────
+@router.get("/export")
+def export_receipts(
+    format: str = Query("csv", pattern="^(csv|ndjson|parquet)$"),
+    items: bool = Query(False, description="one row per line item"),
+    fields: Optional[str] = Query(None, description="comma-separated columns; default all but data"),
+    vendor: Optional[str] = Query(None),
+    category: Optional[str] = Query(None),
+    year: Optional[int] = Query(None),
+    month: Optional[int] = Query(None, ge=1, le=12),
+    min_amount: Optional[float] = Query(None),
+    max_amount: Optional[float] = Query(None),
+    include_deleted: bool = Query(False),
+    hide_failed: bool = Query(True),
+    q: Optional[str] = Query(None, description="full-text search"),
+):
+    """
+    Every receipt matching the GET /receipts/ filters in one streamed
+    response, read through a server-side cursor (no count, no offsets).
+    """
+    names = serialize.parse_fields(fields) if fields else export.default_fields()
+    export.check_format(format)
+
+    def apply_filters(query):
+        return filter_receipts(
+            query, vendor=vendor, category=category, year=year, month=month,
+            min_amount=min_amount, max_amount=max_amount,
+            include_deleted=include_deleted, hide_failed=hide_failed, q=q,
+        )
+
+    filename = f"receipts{'-items' if items else ''}.{format}"
+    return StreamingResponse(
+        export.stream_export(names, format, items, apply_filters),
+        media_type=export.EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+# ─────────────────────────────
+# 📊 STATUS COUNTS (registered before /{receipt_id})
+# ─────────────────────────────
+@router.get("/status-counts", response_model=schemas.StatusCounts)
+def receipt_status_counts(
+    db: Session = Depends(get_db),
+    include_deleted: bool = Query(False),
+):
+    """
+    Receipt counts per OCR status, grouped on the indexed status column.
+    """
+    query = db.query(models.Receipt.status, func.count())
+    if not include_deleted:
+        query = query.filter(models.Receipt.deleted == false())
+    counts = {status or "unknown": n for status, n in query.group_by(models.Receipt.status)}
+    return {"total": sum(counts.values()), "counts": counts}
+
+
+# ─────────────────────────────
+# 📈 SPENDING STATS (served from spending_rollups)
+# ─────────────────────────────
+@router.get("/stats", response_model=schemas.SpendingStats)
+def spending_stats(
+    db: Session = Depends(get_db),
+    year: Optional[int] = Query(None),
+    month: Optional[int] = Query(None, ge=1, le=12),
+    category: Optional[str] = Query(None),
+    vendor: Optional[str] = Query(None),
+    currency: Optional[str] = Query(None),
+    group_by: str = Query("month", pattern="^(none|month|category|vendor)$"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """
+    Totals by month, category or vendor. Reads only the rollup table, so
+    cost depends on the number of groups, not the number of receipts.
+    """
+    r = models.SpendingRollup
+    query = db.query(r).filter(r.receipt_count > 0)
+    date_range = expense_date_range(year, month)
+    if date_range:
+        query = query.filter(r.period >= date_range[0].date(), r.period < date_range[1].date())
+    elif month:
+        query = query.filter(extract("month", r.period) == month)
+    if category is not None:
+        query = query.filter(r.category == category)
+    if vendor is not None:
+        query = query.filter(r.vendor == vendor)
+    if currency:
+        query = query.filter(r.currency == currency)
+
+    count = func.sum(r.receipt_count)
+    amount = func.sum(r.total_amount)
+
+    totals = [
+        {"currency": cur, "receipt_count": int(n), "total_amount": float(t),
+         "average_amount": float(t) / int(n) if n else 0.0}
+        for cur, n, t in query.with_entities(r.currency, count, amount).group_by(r.currency)
+    ]
+
+    groups = []
+    if group_by != "none":
+        key = {"month": r.period, "category": r.category, "vendor": r.vendor}[group_by]
+        order = key.asc() if group_by == "month" else amount.desc()
+        rows = (
+            query.with_entities(key, r.currency, count, amount)
+            .group_by(key, r.currency)
+            .order_by(order)
+            .limit(limit)
+            .all()
+        )
+        groups = [
+            {"key": k.isoformat() if group_by == "month" else (k or None),
+             "currency": cur, "receipt_count": int(n), "total_amount": float(t)}
+            for k, cur, n, t in rows
+        ]
+
+    return {"group_by": group_by, "totals": totals, "groups": groups}
+
+
+# ─────────────────────────────
+# 🧾 ITEM-LEVEL SPEND (SQL over receipt_items)
+# ─────────────────────────────
+@router.get("/items/spend", response_model=schemas.ItemSpend)
+def item_spend(
+    db: Session = Depends(get_db),
+    name: Optional[str] = Query(None, description="substring match on item name"),
+    category: Optional[str] = Query(None),
+    year: Optional[int] = Query(None),
+    month: Optional[int] = Query(None, ge=1, le=12),
+    group_by: str = Query("none", pattern="^(none|name|category)$"),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """
+    "How much did we spend on coffee?" answered in one aggregate query,
+    without loading any receipt JSON.
+    """
+    item = models.ReceiptItem
+    spent = func.coalesce(func.sum(item.total_price), 0)
+    query = (
+        db.query(item)
+        .join(models.Receipt, models.Receipt.id == item.receipt_id)
+        .filter(models.Receipt.deleted == false())
     )
+    if name:
+        query = query.filter(item.name.ilike(f"%{name}%"))
+    if category:
+        query = query.filter(item.category == category)
+    date_range = expense_date_range(year, month)
+    if date_range:
+        query = query.filter(
+            models.Receipt.expense_date >= date_range[0],
+            models.Receipt.expense_date < date_range[1],
+        )
+
+    total, line_count, receipt_count = query.with_entities(
+        spent, func.count(item.id), func.count(func.distinct(item.receipt_id))
+    ).one()
 
-    return {"total": total, "limit": limit, "offset": offset, "results": results}
+    groups = []
+    if group_by != "none":
+        key = item.name if group_by == "name" else item.category
+        rows = (
+            query.with_entities(key, spent, func.count(item.id))
+            .group_by(key)
+            .order_by(spent.desc())
+            .limit(limit)
+            .all()
+        )
+        groups = [{"key": k, "total_spent": float(t), "item_count": n} for k, t, n in rows]
+
+    return {
+        "total_spent": float(total),
+        "item_count": line_count,
+        "receipt_count": receipt_count,
+        "groups": groups,
+    }
+
+
+# ─────────────────────────────
+# 📡 OCR STATUS EVENTS (SSE, registered before /{receipt_id})
+# ─────────────────────────────
+def _status_snapshot(receipt_ids: set, batch_id: Optional[str]) -> List[dict]:
+    db = get_sessionmaker()()
+    try:
+        conditions = []
+        if receipt_ids:
+            conditions.append(models.Receipt.id.in_(receipt_ids))
+        if batch_id:
+            conditions.append(models.Receipt.batch_id == batch_id)
+        rows = db.query(
+            models.Receipt.id, models.Receipt.status,
+            models.Receipt.batch_id, models.Receipt.error_message,
+        ).filter(or_(*conditions)).all()
+        return [events.event(rid, status or "processing", bid, error)
+                for rid, status, bid, error in rows]
+    finally:
+        db.close()
+
+
+def _sse(payload: dict) -> str:
+    return f"event: status\ndata: {json.dumps(payload)}\n\n"
+
+
+@router.get("/events")
+async def receipt_events(
+    request: Request,
+    ids: Optional[str] = Query(None, description="comma-separated receipt ids"),
+    batch_id: Optional[str] = Query(None),
+):
+    """
+    Server-sent events with OCR status transitions (queued, running,
+    retrying, parsed, failed) for the given receipts and/or batch.
+    Current statuses are sent first; the stream ends once every tracked
+    receipt is parsed or failed.
+    """
+    receipt_ids = {i.strip() for i in (ids or "").split(",") if i.strip()}
+    if not receipt_ids and not batch_id:
+        raise HTTPException(status_code=400, detail="Pass ids and/or batch_id")
+    if len(receipt_ids) > 500:
+        raise HTTPException(status_code=400, detail="At most 500 ids per stream")
+
+    heartbeat = env_int("EVENTS_HEARTBEAT_SECONDS", 15)
+    hub = events.get_hub()
+
+    async def stream():
+        # Subscribe before the snapshot so nothing committed in between is lost
+        with hub.subscribe(receipt_ids, batch_id) as subscription:
+            last = {}
+
+            async def refresh():
+                for payload in await asyncio.to_thread(_status_snapshot, receipt_ids, batch_id):
+                    if last.get(payload["receipt_id"]) != payload["status"]:
+                        last[payload["receipt_id"]] = payload["status"]
+                        yield _sse(payload)
+
+            async for message in refresh():
+                yield message
+
+            while any(status not in events.TERMINAL for status in last.values()):
+                try:
+                    payload = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    if not hub.listening:
+                        # LISTEN connection down: fall back to polling
+                        async for message in refresh():
+                            yield message
+                    else:
+                        yield ": ping\n\n"
+                    continue
+                last[payload["receipt_id"]] = payload["status"]
+                yield _sse(payload)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# ─────────────────────────────
+# 🔄 DELTA SYNC (registered before /{receipt_id})
+# ─────────────────────────────
+def _sync_horizon(db: Session) -> int:
+    """
+    Lowest transaction id still running. Every write stamps change_xid with
+    its transaction id (trigger), and all transactions below this one have
+    committed or aborted, so rows under the horizon are final. An open
+    transaction holds the horizon back until it ends; nothing past it is
+    ever sent early. Needs PostgreSQL 13+, no special role.
+    """
+    return db.execute(text(
+        "SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")).scalar()
+
+
+@router.get("/changes", response_model=schemas.ReceiptChanges)
+def receipt_changes(
+    db: Session = Depends(get_db),
+    since: Optional[str] = Query(
+        None, description="next_token from the previous call; omit for a full sync"),
+    limit: int = Query(500, ge=1, le=5000),
+    fields: Optional[str] = Query(None, description="comma-separated columns, as in GET /receipts/"),
+):
+    """
+    Receipts created, updated or soft-deleted since `since`, in writing
+    transaction order on the (change_xid, id) index. Live rows come back in `changes`,
+    soft-deleted ones as `deleted` tombstones. Call again with `next_token`
+    while `has_more`; later calls return only what changed in between.
+    """
+    r = models.Receipt
+    names = serialize.parse_fields(fields)
+    width = len(names)
+    columns = serialize.receipt_columns(names) + [r.change_xid, r.deleted, r.deleted_at]
+    horizon = _sync_horizon(db)
+
+    query = db.query(*columns).filter(r.change_xid < horizon)
+    if since:
+        change_xid, receipt_id = decode_sync_token(since)
+        query = query.filter(tuple_(r.change_xid, r.id) > tuple_(change_xid, receipt_id))
+    else:
+        query = query.filter(r.deleted == false())  # nothing to delete on a fresh client
+    rows = query.order_by(r.change_xid, r.id).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    changes, deleted = [], []
+    for row in rows:
+        if row[width + 1]:
+            deleted.append({"id": row[0], "deleted_at": row[width + 2]})
+        else:
+            changes.append(serialize.row_dict(row, names))
+
+    # Everything below the horizon has been sent once the last page is reached
+    last = rows[-1] if has_more else None
+    next_token = encode_sync_token(last[width], last[0]) if last else encode_sync_token(horizon, "")
+    return Response(
+        content=serialize.dumps({
+            "changes": changes, "deleted": deleted, "next_token": next_token, "has_more": has_more,
+        }),
+        media_type="application/json",
+    )
+
+
+# ─────────────────────────────
+# 🧹 BULK UPDATE / DELETE (set-based, registered before /{receipt_id})
+# ─────────────────────────────
+def _ids_param(ids: List[str]):
+    """`id = ANY(:ids)`: one array parameter however many ids."""
+    return models.Receipt.id == any_(literal(ids, ARRAY(String)))
+
+
+def _bulk_apply(db: Session, selection: schemas.BulkSelection, changes: dict) -> dict:
+    """
+    Lock the selected receipts, move their rollup contributions and apply
+    `changes` to the columns and the same keys of `data` in one UPDATE.
+    Rows that already hold the new values are matched but not written.
+    """
+    if not changes:
+        raise HTTPException(status_code=400, detail="No valid fields provided for update")
+    if changes.get("deleted", False) is None:
+        raise HTTPException(status_code=400, detail="deleted must be true or false")
+    if (selection.ids is None) == (selection.filter is None):
+        raise HTTPException(status_code=400, detail="Pass either ids or filter")
+
+    r = models.Receipt
+    max_rows = env_int("BULK_MAX_ROWS", 50000)
+    changed = or_(*(getattr(r, key).is_distinct_from(value) for key, value in changes.items()))
+    query = db.query(r.id, changed.label("changed"))
+    ids = None
+    if selection.ids is not None:
+        ids = list(dict.fromkeys(selection.ids))
+        if len(ids) > max_rows:
+            raise HTTPException(status_code=400, detail=f"At most {max_rows} ids per request")
+        query = query.filter(_ids_param(ids))
+        if "deleted" not in changes:
+            query = query.filter(r.deleted == false())  # same as PATCH /{id}
+    else:
+        filters = selection.filter.model_dump()
+        if not any(v for k, v in filters.items() if k not in ("include_deleted", "hide_failed")):
+            raise HTTPException(
+                status_code=400, detail="Refusing to update every receipt; add a filter")
+        query = filter_receipts(query, **filters)
+
+    # Row locks (in id order) keep the rollup moves consistent with concurrent writes
+    rows = query.order_by(r.id).with_for_update(of=r).limit(max_rows + 1).all()
+    if len(rows) > max_rows:
+        db.rollback()
+        raise HTTPException(
+            status_code=400, detail=f"Filter matches more than {max_rows} receipts")
+
+    targets = [row.id for row in rows if row.changed]
+    if targets:
+        values = dict(changes)
+        if "deleted" in changes:
+            values["deleted_at"] = func.now() if changes["deleted"] else None
+        data_patch = {k: v for k, v in changes.items() if k != "deleted"}
+        if data_patch:
+            merged = func.coalesce(cast(r.data, JSONB), cast(literal("{}"), JSONB)).op("||")(
+                literal(data_patch, JSONB))
+            values["data"] = cast(merged, JSON)
+        rollups.apply_bulk(db, targets, -1)
+        db.execute(update(r).where(_ids_param(targets)).values(**values)
+                   .execution_options(synchronize_session=False))
+        rollups.apply_bulk(db, targets, 1)
+    db.commit()
+    if targets:
+        cache.invalidate_all_receipts()
+    return {
+        "matched": len(rows),
+        "updated": len(targets),
+        "not_found": len(ids) - len(rows) if ids is not None else 0,
+    }
+
+
+@router.patch("/bulk", response_model=schemas.BulkResult)
+def bulk_update_receipts(payload: schemas.BulkUpdate, db: Session = Depends(get_db)):
+    """
+    Set category / vendor / currency / deleted on many receipts at once,
+    selected by `ids` or by a `filter` (same fields as GET /receipts/).
+    Without `changes.deleted`, id selections only touch live receipts;
+    restoring via a filter needs `include_deleted: true`.
+    """
+    return _bulk_apply(db, payload, payload.changes.model_dump(exclude_unset=True))
+
+
+@router.post("/bulk/delete", response_model=schemas.BulkResult)
+def bulk_delete_receipts(payload: schemas.BulkSelection, db: Session = Depends(get_db)):
+    """
+    Soft-delete many receipts (by `ids` or `filter`) with one UPDATE.
+    """
+    return _bulk_apply(db, payload, {"deleted": True})
 
 
 # ─────────────────────────────
 # 3️⃣ GET SINGLE
 # ─────────────────────────────
 @router.get("/{receipt_id}", response_model=schemas.ReceiptRead)
-def get_receipt(receipt_id: str, db: Session = Depends(get_db)):
+def get_receipt(receipt_id: str, request: Request, db: Session = Depends(get_db)):
     """
-    Return single receipt with item details flattened.
+    Return single receipt with item details flattened. The ETag is the row's
+    updated_at (one index lookup); the body comes from the response cache
+    while it is unchanged.
     """
-    receipt = db.query(models.Receipt).filter_by(
-        id=receipt_id, deleted=False
+    version = _receipt_version(db, receipt_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Receipt not found")
+
+    def build() -> bytes:
+        receipt = _load_receipt_for_read(db, receipt_id)
+        return schemas.ReceiptRead.model_validate(receipt).model_dump_json().encode()
+
+    return _cached_response(
+        request, f"receipt:{receipt_id}", cache.receipt_etag(receipt_id, version.updated_at), build)
+
+
+def _receipt_version(db: Session, receipt_id: str):
+    """Row with the live or archived receipt's updated_at, None when there is none."""
+    r, a = models.Receipt, models.ReceiptArchive
+    row = db.query(r.updated_at).filter(partitions.by_id(db, receipt_id), r.deleted.is_(False)).first()
+    if row is None:
+        row = db.query(a.updated_at).filter(a.id == receipt_id, a.deleted.is_(False)).first()
+    return row
+
+
+def _archived_receipt(db: Session, receipt_id: str) -> Optional[models.Receipt]:
+    """Read-only Receipt built from receipts_archive (app.partitions), never added to the session."""
+    row = db.query(models.ReceiptArchive).filter_by(id=receipt_id, deleted=False).first()
+    if not row:
+        return None
+    fields = {c: getattr(row, c) for c in (
+        "id", "vendor", "amount", "currency", "expense_date", "category", "data", "deleted",
+        "content_hash", "batch_id", "status", "created_at", "updated_at", "deleted_at",
+    )}
+    return models.Receipt(**fields)
+
+
+def _load_receipt_for_read(db: Session, receipt_id: str) -> models.Receipt:
+    receipt = db.query(models.Receipt).filter(
+        partitions.by_id(db, receipt_id), models.Receipt.deleted.is_(False)
     ).first()
 
+    if not receipt:
+        receipt = _archived_receipt(db, receipt_id)
     if not receipt:
         raise HTTPException(status_code=404, detail="Receipt not found")
 
-    # ✅ Extract items safely from JSONB
-    items = []
-    if receipt.data:
+    # ✅ Items from receipt_items (selectin-loaded); JSON fallback for
+    #    rows the backfill hasn't reached
+    items = [item_to_dict(i) for i in receipt.items]
+    if not items and receipt.data:
         items = receipt.data.get("items") or receipt.data.get(
             "parsed", {}).get("transaction", {}).get("items") or []
 
@@ -220,8 +1070,8 @@ def update_receipt(receipt_id: str, payload: schemas.ReceiptUpdate, db: Session
     Update receipt fields and items while keeping schema consistent with GET.
     """
     receipt = db.query(models.Receipt).filter(
-        models.Receipt.id == receipt_id, models.Receipt.deleted.is_(False)
-    ).first()
+        partitions.by_id(db, receipt_id), models.Receipt.deleted.is_(False)
+    ).with_for_update(of=models.Receipt).first()
 
     if not receipt:
         raise HTTPException(status_code=404, detail="Receipt not found")
@@ -231,6 +1081,8 @@ def update_receipt(receipt_id: str, payload: schemas.ReceiptUpdate, db: Session
         raise HTTPException(
             status_code=400, detail="No valid fields provided for update")
 
+    before = rollups.snapshot(receipt)
+
     # ✅ Clone the current JSON safely
     new_data = dict(receipt.data or {})
 
@@ -253,17 +1105,18 @@ def update_receipt(receipt_id: str, payload: schemas.ReceiptUpdate, db: Session
             raise HTTPException(status_code=400, detail="Items must be a list")
         new_data["items"] = items
 
-        # Optionally auto-sum total for consistency
-        try:
-            total_sum = sum(float(i.get("total_price", 0)) for i in items)
-            receipt.amount = total_sum
-            new_data["amount"] = total_sum
-        except Exception as e:
-            print("⚠️ Failed to sum items total:", e)
+        # ✅ Replace normalized rows and let SQL compute the total
+        replace_items(db, receipt.id, items)
+        receipt.item_names = item_names(items)
+        total_sum = items_total(db, receipt.id)
+        receipt.amount = total_sum
+        new_data["amount"] = total_sum
 
     # ✅ Assign updated JSON back
     receipt.data = new_data
+    rollups.apply_change(db, before, rollups.snapshot(receipt))
     db.commit()
+    cache.invalidate_receipt(receipt.id)
     db.refresh(receipt)
 
     # ✅ Enrich items for response consistency (like GET)
@@ -280,11 +1133,16 @@ def update_receipt(receipt_id: str, payload: schemas.ReceiptUpdate, db: Session
 # ─────────────────────────────
 @router.delete("/{receipt_id}")
 def soft_delete_receipt(receipt_id: str, db: Session = Depends(get_db)):
-    receipt = db.query(models.Receipt).filter_by(
-        id=receipt_id, deleted=False).first()
+    receipt = db.query(models.Receipt).filter(
+        partitions.by_id(db, receipt_id), models.Receipt.deleted.is_(False)
+    ).with_for_update(of=models.Receipt).first()
     if not receipt:
         raise HTTPException(status_code=404, detail="Receipt not found")
 
+    before = rollups.snapshot(receipt)
     receipt.deleted = True
+    receipt.deleted_at = func.now()
+    rollups.apply_change(db, before, rollups.snapshot(receipt))
     db.commit()
+    cache.invalidate_receipt(receipt_id)
     return {"message": "Receipt marked as deleted", "receipt_id": receipt_id}
@@ -0,0 +1,302 @@
+# app/resilience.py
+"""
+Retries, timeouts, hedging and a circuit breaker for OpenAI calls.
+
+`call(kind, attempt)` wraps one logical provider call:
+
+- each attempt is bounded by OPENAI_CALL_TIMEOUT_SECONDS (`timed`)
+- retryable errors (timeouts, connection errors, 408/409/429/5xx) are
+  retried up to OPENAI_RETRIES times with full-jitter exponential backoff;
+  429s don't count towards the breaker (the rate-limit scheduler pauses)
+- `hedged` runs inside the rate-limit scheduler, after admission: when the
+  provider request runs past the HEDGE_PERCENTILE latency of its kind, a
+  duplicate is started (only if the scheduler has budget free right now)
+  and the first success wins
+- OPENAI_CB_CONSECUTIVE_FAILURES failures in a row, or a failure rate of
+  OPENAI_CB_FAILURE_RATE over the last OPENAI_CB_WINDOW calls, opens the
+  breaker for OPENAI_CB_OPEN_SECONDS: calls fail fast with
+  ProviderUnavailable and the OCR workers stop leasing jobs. One probe is
+  let through afterwards (half-open); its outcome closes or re-opens it.
+
+State is per process (API and `python -m app.worker` each keep their own).
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, TypeVar
+
+import openai
+
+from app import metrics
+from app.config import env_bool, env_float, env_int
+
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class ProviderUnavailable(Exception):
+    """The breaker is open (or retries ran out on a degraded provider)."""
+
+    def __init__(self, message: str, retry_in: float = 0.0):
+        super().__init__(message)
+        self.retry_in = retry_in
+
+
+class ProviderTimeout(Exception):
+    """One attempt exceeded OPENAI_CALL_TIMEOUT_SECONDS."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (ProviderTimeout, asyncio.TimeoutError, openai.APIConnectionError)):
+        return True
+    return getattr(exc, "status_code", None) in RETRYABLE_STATUS
+
+
+# ─────────────────────────────
+# Latency tracking (hedge trigger)
+# ─────────────────────────────
+class LatencyWindow:
+    """Last `size` successful call durations of one kind."""
+
+    def __init__(self, size: int = 200):
+        self.samples: Deque[float] = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(pct / 100 * len(ordered)), len(ordered) - 1)]
+
+
+_latency: Dict[str, LatencyWindow] = {}
+
+
+def _window(kind: str) -> LatencyWindow:
+    if kind not in _latency:
+        _latency[kind] = LatencyWindow(env_int("HEDGE_WINDOW", 200))
+    return _latency[kind]
+
+
+# ─────────────────────────────
+# Circuit breaker
+# ─────────────────────────────
+class CircuitBreaker:
+    def __init__(self):
+        self.consecutive_limit = env_int("OPENAI_CB_CONSECUTIVE_FAILURES", 5)
+        self.failure_rate = env_float("OPENAI_CB_FAILURE_RATE", 0.5)
+        self.min_calls = env_int("OPENAI_CB_MIN_CALLS", 10)
+        self.open_seconds = env_float("OPENAI_CB_OPEN_SECONDS", 30.0)
+        self.outcomes: Deque[bool] = deque(maxlen=env_int("OPENAI_CB_WINDOW", 20))
+        self.state = CLOSED
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.opened_count = 0
+        self._probing = False
+
+    def _set(self, state: str):
+        if state == OPEN:
+            self.opened_at = time.monotonic()
+            self.opened_count += 1
+            print(f"⚠️ OpenAI circuit open for {self.open_seconds:.0f}s")
+        elif state == CLOSED and self.state != CLOSED:
+            print("✅ OpenAI circuit closed")
+        self.state = state
+        metrics.CIRCUIT_STATE.set(_STATE_VALUE[state])
+
+    def retry_in(self) -> float:
+        """Seconds until the breaker lets a probe through (0 unless open)."""
+        if self.state != OPEN:
+            return 0.0
+        return max(self.opened_at + self.open_seconds - time.monotonic(), 0.0)
+
+    def current(self) -> str:
+        if self.state == OPEN and self.retry_in() <= 0:
+            self._set(HALF_OPEN)
+        return self.state
+
+    def acquire(self):
+        """Raise ProviderUnavailable unless a call may go out now."""
+        state = self.current()
+        if state == OPEN or (state == HALF_OPEN and self._probing):
+            raise ProviderUnavailable("OpenAI circuit open", self.retry_in() or 1.0)
+        if state == HALF_OPEN:
+            self._probing = True
+
+    def record(self, ok: bool):
+        probe = self._probing
+        self._probing = False
+        self.outcomes.append(ok)
+        self.consecutive = 0 if ok else self.consecutive + 1
+        if probe:
+            if ok:
+                self.outcomes.clear()
+            self._set(CLOSED if ok else OPEN)
+            return
+        if ok or self.state != CLOSED:
+            return
+        failures = self.outcomes.count(False)
+        if self.consecutive >= self.consecutive_limit or (
+            len(self.outcomes) >= self.min_calls
+            and failures / len(self.outcomes) >= self.failure_rate
+        ):
+            self._set(OPEN)
+
+    def release(self):
+        """A probe that ended without a provider verdict (e.g. a 400)."""
+        self._probing = False
+
+
+_breaker: Optional[CircuitBreaker] = None
+
+
+def get_breaker() -> CircuitBreaker:
+    global _breaker
+    if _breaker is None:
+        _breaker = CircuitBreaker()
+    return _breaker
+
+
+# ─────────────────────────────
+# Calls
+# ─────────────────────────────
+_stats = {"calls": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "timeouts": 0,
+          "short_circuited": 0, "failures": 0}
+
+
+def _count(kind: str, outcome: str, stat: Optional[str] = None):
+    metrics.PROVIDER_CALLS.labels(kind, outcome).inc()
+    if stat:
+        _stats[stat] += 1
+
+
+async def timed(kind: str, awaitable: Awaitable[T]) -> T:
+    """Await one provider request with the per-call timeout; feed the latency window."""
+    started = time.perf_counter()
+    try:
+        result = await asyncio.wait_for(awaitable, env_float("OPENAI_CALL_TIMEOUT_SECONDS", 45.0))
+    except asyncio.TimeoutError:
+        _count(kind, "timeout", "timeouts")
+        raise ProviderTimeout(f"OpenAI {kind} call timed out") from None
+    _window(kind).add(time.perf_counter() - started)
+    return result
+
+
+def _hedge_delay(kind: str) -> Optional[float]:
+    if not env_bool("HEDGE_ENABLED", True) or get_breaker().current() != CLOSED:
+        return None
+    window = _window(kind)
+    if len(window.samples) < env_int("HEDGE_MIN_SAMPLES", 20):
+        return None
+    # Cap duplicates at HEDGE_MAX_RATIO of calls so a slow provider isn't hit twice as hard
+    if _stats["hedges"] >= env_float("HEDGE_MAX_RATIO", 0.1) * max(_stats["calls"], 1):
+        return None
+    delay = window.percentile(env_float("HEDGE_PERCENTILE", 95))
+    return max(delay, env_int("HEDGE_MIN_DELAY_MS", 500) / 1000)
+
+
+async def hedged(kind: str, attempt: Callable[[], Awaitable[T]],
+                 admit: Callable[[], bool]) -> T:
+    """
+    Run `attempt()`; start a duplicate if it's slower than the hedge delay
+    and `admit()` grants budget for it without waiting. Call this once the
+    original request has been admitted, so queueing never counts as latency.
+    """
+    delay = _hedge_delay(kind)
+    if delay is None:
+        return await attempt()
+
+    hedge = None
+    error: Optional[BaseException] = None
+    done, pending = await asyncio.wait({asyncio.ensure_future(attempt())}, timeout=delay)
+    try:
+        if not done and admit():
+            _count(kind, "hedged", "hedges")
+            hedge = asyncio.ensure_future(attempt())
+            pending.add(hedge)
+        while True:
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        _count(kind, "hedge_won", "hedge_wins")
+                    return task.result()
+                error = task.exception()
+            if not pending:
+                raise error
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+def _backoff(attempt: int) -> float:
+    """Full jitter: uniform(0, min(cap, base * 2^attempt))."""
+    base = env_float("OPENAI_RETRY_BASE_SECONDS", 0.5)
+    cap = env_float("OPENAI_RETRY_MAX_SECONDS", 8.0)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def call(kind: str, attempt: Callable[[], Awaitable[T]]) -> T:
+    """
+    One logical provider call with retries and the circuit breaker.
+    Non-retryable errors are raised immediately; a degraded provider ends in
+    ProviderUnavailable so the job is re-queued instead of failed.
+    """
+    breaker = get_breaker()
+    retries = env_int("OPENAI_RETRIES", 3)
+    _stats["calls"] += 1
+    for number in range(retries + 1):
+        try:
+            breaker.acquire()
+        except ProviderUnavailable:
+            _count(kind, "short_circuited", "short_circuited")
+            raise
+        try:
+            result = await attempt()
+        except Exception as e:
+            if not is_retryable(e):
+                breaker.release()
+                _count(kind, "error")
+                raise
+            if getattr(e, "status_code", None) == 429:
+                breaker.release()  # throttling is the scheduler's job, not an outage
+            else:
+                breaker.record(False)
+            if number == retries:
+                _count(kind, "failed", "failures")
+                raise ProviderUnavailable(f"OpenAI {kind} failed after {retries + 1} attempts: {e}",
+                                          breaker.retry_in() or _backoff(number)) from e
+            _count(kind, "retry", "retries")
+            await asyncio.sleep(_backoff(number))
+            continue
+        breaker.record(True)
+        _count(kind, "ok")
+        return result
+
+
+def stats() -> dict:
+    breaker = get_breaker()
+    latency = {
+        kind: {"samples": len(w.samples),
+               "p50_ms": round((w.percentile(50) or 0) * 1000, 1),
+               "p95_ms": round((w.percentile(95) or 0) * 1000, 1)}
+        for kind, w in _latency.items()
+    }
+    return {
+        "circuit": breaker.current(),
+        "retry_in_seconds": round(breaker.retry_in(), 1),
+        "times_opened": breaker.opened_count,
+        "consecutive_failures": breaker.consecutive,
+        **_stats,
+        "latency": latency,
+    }
@@ -0,0 +1,201 @@
+# app/rollups.py
+"""
+Incrementally maintained spending rollups (`spending_rollups`).
+
+One row per (month, category, vendor, currency) holding a receipt count and
+amount total. Every write path snapshots the receipt's contribution before
+and after the change and applies the difference with an upsert in the same
+transaction, so /receipts/stats never has to scan `receipts`.
+Archiving receipts (app.partitions) leaves their contribution in place.
+
+Rebuild from scratch:
+
+    python -m app.rollups rebuild
+"""
+import sys
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import (
+    Date, String, any_, delete, false, func, insert, literal, select, text, union_all,
+)
+from sqlalchemy.dialects.postgresql import ARRAY, insert as pg_insert
+from sqlalchemy.orm import Session
+
+from app import models
+
+
+# (period, category, vendor, currency) → amount; None = not counted
+Contribution = Optional[Tuple[Tuple[date, str, str, str], Decimal]]
+
+
+def _period(expense_date, created_at) -> date:
+    """
+    Month of a receipt, the same way `_period_sql` computes it: expense_date
+    as printed, else created_at in UTC whatever the session TimeZone.
+    """
+    value = expense_date
+    if isinstance(value, str):  # update_receipt assigns ISO strings
+        value = datetime.fromisoformat(value)
+    if not value:
+        value = (created_at or datetime.now(timezone.utc)).astimezone(timezone.utc)
+    return date(value.year, value.month, 1)
+
+
+def _period_sql(expense_date, created_at):
+    # created_at is timestamptz: date_trunc on it would follow the session
+    # TimeZone, so truncate its UTC wall time instead
+    return func.date_trunc(
+        "month", func.coalesce(expense_date, func.timezone("UTC", created_at))).cast(Date)
+
+
+def contribution(
+    deleted, amount, expense_date, created_at, category, vendor, currency,
+) -> Contribution:
+    """
+    What a receipt adds to the rollups: live receipts (deleted = false,
+    same as the list filter) with an amount.
+    """
+    if deleted is not False or amount is None:
+        return None
+    key = (
+        _period(expense_date, created_at),
+        category or "",
+        vendor or "",
+        currency or "",
+    )
+    return key, Decimal(str(amount))
+
+
+def snapshot(receipt: models.Receipt) -> Contribution:
+    return contribution(
+        receipt.deleted, receipt.amount, receipt.expense_date, receipt.created_at,
+        receipt.category, receipt.vendor, receipt.currency,
+    )
+
+
+def snapshot_row(row: dict) -> Contribution:
+    """Contribution of a not-yet-inserted receipt row (bulk insert paths)."""
+    return contribution(
+        row.get("deleted"), row.get("amount"), row.get("expense_date"), None,
+        row.get("category"), row.get("vendor"), row.get("currency"),
+    )
+
+
+def _upsert(db: Session, key, count_delta: int, amount_delta: Decimal):
+    period, category, vendor, currency = key
+    table = models.SpendingRollup.__table__
+    stmt = pg_insert(table).values(
+        period=period, category=category, vendor=vendor, currency=currency,
+        receipt_count=count_delta, total_amount=amount_delta,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.period, table.c.category, table.c.vendor, table.c.currency],
+        set_={
+            "receipt_count": table.c.receipt_count + stmt.excluded.receipt_count,
+            "total_amount": table.c.total_amount + stmt.excluded.total_amount,
+        },
+    )
+    db.execute(stmt)
+
+
+def apply_change(db: Session, before: Contribution, after: Contribution):
+    """Move a receipt's contribution from `before` to `after` (caller commits)."""
+    if before == after:
+        return
+    if before and after and before[0] == after[0]:
+        _upsert(db, after[0], 0, after[1] - before[1])
+        return
+    if before:
+        _upsert(db, before[0], -1, -before[1])
+    if after:
+        _upsert(db, after[0], 1, after[1])
+
+
+def add_many(db: Session, contributions: Iterable[Contribution]):
+    """Add several new receipts at once, one upsert per distinct key."""
+    merged = {}
+    for item in contributions:
+        if item:
+            count, amount = merged.get(item[0], (0, Decimal(0)))
+            merged[item[0]] = (count + 1, amount + item[1])
+    for key, (count, amount) in merged.items():
+        _upsert(db, key, count, amount)
+
+
+def apply_bulk(db: Session, receipt_ids, sign: int):
+    """
+    Add (sign=1) or remove (sign=-1) the current contributions of many
+    receipts in one grouped upsert. Bulk updates call it before and after
+    their UPDATE, with the rows locked (caller commits).
+    """
+    r = models.Receipt
+    period = _period_sql(r.expense_date, r.created_at)
+    category = func.coalesce(r.category, literal(""))
+    vendor = func.coalesce(r.vendor, literal(""))
+    currency = func.coalesce(r.currency, literal(""))
+
+    source = (
+        select(period, category, vendor, currency, sign * func.count(), sign * func.sum(r.amount))
+        .where(r.id == any_(literal(list(receipt_ids), ARRAY(String))),
+               r.deleted == false(), r.amount.isnot(None))
+        .group_by(period, category, vendor, currency)
+    )
+    table = models.SpendingRollup.__table__
+    stmt = pg_insert(table).from_select(
+        ["period", "category", "vendor", "currency", "receipt_count", "total_amount"], source)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.period, table.c.category, table.c.vendor, table.c.currency],
+        set_={
+            "receipt_count": table.c.receipt_count + stmt.excluded.receipt_count,
+            "total_amount": table.c.total_amount + stmt.excluded.total_amount,
+        },
+    )
+    db.execute(stmt)
+
+
+def rebuild(db: Session) -> int:
+    """Recompute every rollup row from `receipts` and `receipts_archive`. Returns rows written."""
+    r = models.Receipt
+    # Archived receipts (app.partitions) still count towards spending history
+    a = models.ReceiptArchive
+    rows = union_all(
+        select(r.expense_date, r.created_at, r.category, r.vendor, r.currency, r.amount)
+        .where(r.deleted == false(), r.amount.isnot(None)),
+        select(a.expense_date, a.created_at, a.category, a.vendor, a.currency, a.amount)
+        .where(a.deleted == false(), a.amount.isnot(None)),
+    ).subquery()
+    period = _period_sql(rows.c.expense_date, rows.c.created_at)
+    category = func.coalesce(rows.c.category, literal(""))
+    vendor = func.coalesce(rows.c.vendor, literal(""))
+    currency = func.coalesce(rows.c.currency, literal(""))
+
+    source = (
+        select(period, category, vendor, currency, func.count(), func.sum(rows.c.amount))
+        .group_by(period, category, vendor, currency)
+    )
+    table = models.SpendingRollup.__table__
+    # Block incremental upserts until the fresh totals are committed
+    db.execute(text("LOCK TABLE spending_rollups IN EXCLUSIVE MODE"))
+    db.execute(delete(table))
+    result = db.execute(insert(table).from_select(
+        ["period", "category", "vendor", "currency", "receipt_count", "total_amount"],
+        source,
+    ))
+    db.commit()
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        print("usage: python -m app.rollups rebuild")
+        sys.exit(2)
+
+    from app.db import get_sessionmaker
+
+    session = get_sessionmaker()()
+    try:
+        print(f"✅ Rebuilt {rebuild(session)} rollup rows")
+    finally:
+        session.close()
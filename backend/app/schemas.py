@@ -1,9 +1,7 @@
 # app/schemas.py
-from datetime import date
 from typing import List, Optional
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
 
 
 class ReceiptBase(BaseModel):
@@ -20,7 +18,7 @@ class ReceiptCreate(ReceiptBase):
 
 
 class ReceiptUpdate(ReceiptBase):
-    pass
+    items: Optional[List[dict]] = None
 
 
 class ReceiptRead(BaseModel):
@@ -31,7 +29,12 @@ class ReceiptRead(BaseModel):
     category: Optional[str]
     expense_date: Optional[datetime]
     data: dict
+    status: Optional[str] = None
+    error_message: Optional[str] = None
+    ocr_started_at: Optional[datetime] = None
+    ocr_finished_at: Optional[datetime] = None
     created_at: datetime
+    updated_at: Optional[datetime] = None
     deleted: bool
 
     class Config:
@@ -39,7 +42,94 @@ class ReceiptRead(BaseModel):
 
 
 class PaginatedReceipts(BaseModel):
-    total: int
+    total: Optional[int]  # None when total_mode=none
+    total_mode: str = "exact"
     limit: int
     offset: int
+    next_cursor: Optional[str] = None
     results: List[ReceiptRead]
+
+
+class StatusCounts(BaseModel):
+    total: int
+    counts: dict
+
+
+class SpendingStats(BaseModel):
+    group_by: str
+    totals: List[dict]  # one entry per currency
+    groups: List[dict]
+
+
+class ItemSpend(BaseModel):
+    total_spent: float
+    item_count: int
+    receipt_count: int
+    groups: List[dict] = []
+
+
+class BatchItem(BaseModel):
+    index: int
+    filename: Optional[str]
+    status: str  # queued | parsed | duplicate | rejected | processing | failed
+    receipt_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BatchUploadResult(BaseModel):
+    batch_id: str
+    total: int
+    queued: int
+    duplicates: int
+    rejected: int
+    items: List[BatchItem]
+
+
+class BatchStatus(BaseModel):
+    batch_id: str
+    total: int
+    counts: dict
+    items: List[BatchItem]
+
+
+class ReceiptFilter(BaseModel):
+    """Same filters as GET /receipts/."""
+    vendor: Optional[str] = None
+    category: Optional[str] = None
+    year: Optional[int] = None
+    month: Optional[int] = Field(None, ge=1, le=12)
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+    include_deleted: bool = False
+    hide_failed: bool = True
+    q: Optional[str] = None
+
+
+class BulkChanges(BaseModel):
+    category: Optional[str] = None
+    vendor: Optional[str] = None
+    currency: Optional[str] = None
+    deleted: Optional[bool] = None
+
+
+class BulkSelection(BaseModel):
+    """Either explicit `ids` or a `filter`."""
+    ids: Optional[List[str]] = None
+    filter: Optional[ReceiptFilter] = None
+
+
+class BulkUpdate(BulkSelection):
+    changes: BulkChanges
+
+
+class BulkResult(BaseModel):
+    matched: int
+    updated: int
+    not_found: int = 0  # requested ids that don't exist (or are deleted)
+
+
+class ReceiptChanges(BaseModel):
+    changes: List[dict]  # live receipts created or updated since the token
+    deleted: List[dict]  # tombstones: {"id", "deleted_at"}
+    next_token: str
+    has_more: bool
@@ -0,0 +1,85 @@
+# app/serialize.py
+"""
+Lean serialization for list and export responses.
+
+Rows are selected as plain columns (no ORM instances, no per-row Pydantic
+validation), turned into dicts and encoded with orjson when it is installed
+(stdlib json otherwise). Output matches `schemas.ReceiptRead` field for field.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Iterable, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+from app import models
+
+try:
+    import orjson
+except ImportError:  # optional speedup
+    orjson = None
+
+
+# Projectable fields, in ReceiptRead order
+RECEIPT_FIELDS = {
+    "id": models.Receipt.id,
+    "vendor": models.Receipt.vendor,
+    "amount": models.Receipt.amount,
+    "currency": models.Receipt.currency,
+    "category": models.Receipt.category,
+    "expense_date": models.Receipt.expense_date,
+    "data": models.Receipt.data,
+    "status": models.Receipt.status,
+    "error_message": models.Receipt.error_message,
+    "ocr_started_at": models.Receipt.ocr_started_at,
+    "ocr_finished_at": models.Receipt.ocr_finished_at,
+    "created_at": models.Receipt.created_at,
+    "updated_at": models.Receipt.updated_at,
+    "deleted": models.Receipt.deleted,
+}
+
+
+def parse_fields(fields: Optional[str]) -> Tuple[str, ...]:
+    """
+    `fields=vendor,amount` → ("id", "vendor", "amount"). `id` is always
+    included; no value means every field. Unknown names are a 400.
+    """
+    if not fields:
+        return tuple(RECEIPT_FIELDS)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    unknown = sorted(set(names) - set(RECEIPT_FIELDS))
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}; allowed: {', '.join(RECEIPT_FIELDS)}")
+    return tuple(name for name in RECEIPT_FIELDS if name == "id" or name in names)
+
+
+def receipt_columns(names: Sequence[str]) -> list:
+    return [RECEIPT_FIELDS[name] for name in names]
+
+
+def row_dict(row, names: Sequence[str]) -> dict:
+    item = {name: row[i] for i, name in enumerate(names)}
+    if "data" in item and item["data"] is None:
+        item["data"] = {}
+    return item
+
+
+def rows_to_dicts(rows: Iterable, names: Sequence[str]) -> list:
+    return [row_dict(row, names) for row in rows]
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):  # stdlib json fallback only
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default)
+    return json.dumps(obj, default=_default, separators=(",", ":")).encode()
@@ -0,0 +1,226 @@
+# app/storage.py
+"""
+Content-addressed local blob store for original receipt images.
+
+Uploads are streamed to disk in chunks, hashed on the way (the SHA-256 is
+also the blob key and the dedup digest), size-capped and MIME-sniffed from
+the first bytes. Later stages get a blob key, never the upload bytes.
+
+`UploadLimitMiddleware` enforces the size cap (and, for single uploads,
+the image sniff) on the raw request stream, before Starlette spools the
+multipart body to disk: an oversized Content-Length is refused up front
+and a body that grows past the cap is cut off with 413 mid-stream.
+"""
+import asyncio
+import hashlib
+import json
+import mmap
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+from fastapi import HTTPException, UploadFile
+
+from app.config import env_int, env_str
+
+
+CHUNK_SIZE = 1024 * 1024
+
+# Leading magic bytes → MIME type for the image formats we accept. Only
+# formats Pillow decodes and the OCR model takes as data URLs; HEIC/HEIF
+# (iPhone default) would pass here and then fail in preprocessing.
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+
+
+@dataclass
+class BlobRef:
+    key: str
+    size: int
+    mime: str
+
+
+def blob_root() -> Path:
+    return Path(env_str("BLOB_DIR", "data/blobs"))
+
+
+def max_upload_bytes() -> int:
+    return env_int("UPLOAD_MAX_BYTES", 15 * 1024 * 1024)
+
+
+def max_batch_upload_bytes() -> int:
+    return env_int("BATCH_UPLOAD_MAX_BYTES", 512 * 1024 * 1024)
+
+
+def blob_path(key: str) -> Path:
+    return blob_root() / key[:2] / key[2:4] / key
+
+
+def sniff_mime(head: bytes) -> Optional[str]:
+    for magic, mime in _SIGNATURES:
+        if head.startswith(magic):
+            return mime
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return None
+
+
+class _BlobWriter:
+    """Incrementally hash, size-check, sniff and write one blob to a temp file."""
+
+    def __init__(self):
+        self.limit = max_upload_bytes()
+        root = blob_root()
+        root.mkdir(parents=True, exist_ok=True)
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.mime = None
+        fd, self.tmp_name = tempfile.mkstemp(dir=root, prefix=".upload-")
+        self.out = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        if self.mime is None:
+            self.mime = sniff_mime(chunk[:16])
+            if self.mime is None:
+                raise HTTPException(
+                    status_code=415, detail="Unsupported file type; expected a JPEG, PNG, GIF or WebP image")
+        self.size += len(chunk)
+        if self.size > self.limit:
+            raise HTTPException(
+                status_code=413, detail=f"File exceeds {self.limit} bytes")
+        self.digest.update(chunk)
+        self.out.write(chunk)
+
+    def commit(self) -> BlobRef:
+        self.out.close()
+        if self.size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+
+        key = self.digest.hexdigest()
+        path = blob_path(key)
+        if path.exists():
+            os.unlink(self.tmp_name)  # same content already stored
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(self.tmp_name, path)
+        return BlobRef(key=key, size=self.size, mime=self.mime)
+
+    def abort(self):
+        self.out.close()
+        if os.path.exists(self.tmp_name):
+            os.unlink(self.tmp_name)
+
+
+async def save_upload(file: UploadFile) -> BlobRef:
+    """
+    Stream an upload into the blob store. Raises 413 past UPLOAD_MAX_BYTES
+    and 415 when the first bytes don't look like a supported image.
+    """
+    # Blocking file writes: copy from the spooled upload in a worker thread
+    return await asyncio.to_thread(save_fileobj, file.file)
+
+
+def save_fileobj(fileobj: BinaryIO) -> BlobRef:
+    """Synchronous counterpart of save_upload (e.g. for ZIP archive members)."""
+    writer = _BlobWriter()
+    try:
+        while True:
+            chunk = fileobj.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            writer.write(chunk)
+        return writer.commit()
+    except BaseException:
+        writer.abort()
+        raise
+
+
+# ─────────────────────────────
+# Early request-body limits
+# ─────────────────────────────
+MULTIPART_OVERHEAD = 64 * 1024  # boundaries, part headers, small form fields
+SNIFF_WINDOW = 64 * 1024
+
+
+def _first_file_head(body: bytes) -> Optional[bytes]:
+    """First bytes of the first multipart file part, None until they've arrived."""
+    marker = body.find(b'filename="')
+    if marker < 0:
+        return None
+    start = body.find(b"\r\n\r\n", marker)
+    if start < 0 or len(body) < start + 4 + 16:
+        return None
+    return body[start + 4:start + 4 + 16]
+
+
+class UploadLimitMiddleware:
+    """ASGI middleware: size cap and image sniff for upload routes, on the raw stream."""
+
+    def __init__(self, app, routes: dict):
+        self.app = app
+        self.routes = routes  # path -> (limit_fn, sniff)
+
+    async def __call__(self, scope, receive, send):
+        route = self.routes.get(scope.get("path")) if scope["type"] == "http" else None
+        if route is None or scope.get("method") != "POST":
+            return await self.app(scope, receive, send)
+
+        limit_fn, sniff = route
+        limit = limit_fn() + MULTIPART_OVERHEAD
+        headers = dict(scope.get("headers") or [])
+        declared = headers.get(b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > limit:
+            return await _reject(send, 413, f"Upload exceeds {limit_fn()} bytes")
+
+        state = {"size": 0, "head": b"", "sniffed": not sniff}
+
+        async def limited_receive():
+            message = await receive()
+            if message["type"] != "http.request":
+                return message
+            chunk = message.get("body", b"")
+            state["size"] += len(chunk)
+            if state["size"] > limit:
+                raise HTTPException(status_code=413, detail=f"Upload exceeds {limit_fn()} bytes")
+            if not state["sniffed"]:
+                state["head"] += chunk
+                head = _first_file_head(state["head"])
+                if head is not None or len(state["head"]) >= SNIFF_WINDOW:
+                    state["sniffed"] = True
+                    state["head"] = b""
+                    if head is not None and sniff_mime(head) is None:
+                        raise HTTPException(
+                            status_code=415, detail="Unsupported file type; expected a JPEG, PNG, GIF or WebP image")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def _reject(send, status: int, detail: str):
+    body = json.dumps({"detail": detail}).encode()
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+        (b"connection", b"close"),
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def read_blob(key: str) -> bytes:
+    """Read a stored blob through mmap (no intermediate buffered copies)."""
+    with open(blob_path(key), "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        return m[:]
+
+
+def read_head(key: str, size: int = 16) -> bytes:
+    with open(blob_path(key), "rb") as f:
+        return f.read(size)
+
+
+def blob_exists(key: Optional[str]) -> bool:
+    return bool(key) and blob_path(key).exists()
@@ -0,0 +1,515 @@
+# app/vendor_templates.py
+"""
+Learned per-vendor receipt templates that replace the LLM parse step.
+
+Chains print the same layout on every receipt, so after the LLM has parsed
+a vendor's OCR text we learn, from that text and the parsed result:
+
+- the header fingerprint (normalized first line(s)) that identifies the vendor
+- the date format, the TOTAL / subtotal / tax line labels and thousands separator
+- one regex for item lines (or item name + numbers line pairs)
+
+A template is used only after it has reproduced the LLM result on
+TEMPLATE_MIN_SAMPLES receipts. When it is used, the output must reconcile
+(items sum to subtotal / total) and reach TEMPLATE_MIN_CONFIDENCE, otherwise
+the LLM parse runs as before. Templates live in `vendor_templates` with an
+in-process copy refreshed every TEMPLATE_REFRESH_SECONDS.
+"""
+import asyncio
+import hashlib
+import re
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app import metrics, models
+from app.config import env_bool, env_float, env_int
+
+
+NUM = r"\d[\d.,]*\d|\d"
+_NUM_RE = re.compile(NUM)
+_CURRENCY_WORDS = {"rp", "idr", "usd", "sgd", "myr"}
+
+# strftime format → regex, tried in order when learning the date format
+DATE_FORMATS = (
+    "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y", "%Y-%m-%d", "%Y/%m/%d",
+    "%d/%m/%y", "%d-%m-%y", "%d.%m.%y", "%d %b %Y", "%d %b %y",
+)
+_DATE_PARTS = {"%d": r"\d{2}", "%m": r"\d{2}", "%Y": r"\d{4}", "%y": r"\d{2}", "%b": r"[A-Za-z]{3}"}
+_TIME_RE = re.compile(r"\b(\d{2}:\d{2}(?::\d{2})?)\b")
+
+ITEM_ROLES = ("quantity", "unit_price", "total_price")
+
+
+def enabled() -> bool:
+    return env_bool("TEMPLATE_PARSER_ENABLED", True)
+
+
+def min_samples() -> int:
+    return env_int("TEMPLATE_MIN_SAMPLES", 2)
+
+
+def min_confidence() -> float:
+    return env_float("TEMPLATE_MIN_CONFIDENCE", 0.75)
+
+
+# ─────────────────────────────
+# Text helpers
+# ─────────────────────────────
+def _lines(text: str) -> List[str]:
+    return [line.rstrip() for line in text.splitlines() if line.strip()]
+
+
+def _norm(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def fingerprint(ocr_text: str) -> Optional[str]:
+    """Stable id for a vendor layout: normalized header line(s), digits dropped."""
+    header = _lines(ocr_text)[:env_int("TEMPLATE_HEADER_LINES", 1)]
+    key = _norm(re.sub(r"[\d\W_]+", " ", " ".join(header)))
+    if len(key) < 3:
+        return None
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def _number(token: str, thousands: str) -> Optional[float]:
+    if thousands == ".":
+        token = token.replace(".", "").replace(",", ".")
+    else:
+        token = token.replace(",", "")
+    try:
+        return float(token)
+    except ValueError:
+        return None
+
+
+def _same(a, b) -> bool:
+    return a is not None and b is not None and abs(float(a) - float(b)) < 0.005
+
+
+def _label(line: str) -> str:
+    """Letters of the line before its last number: 'TOTAL : Rp 73.260' → 'total'."""
+    tokens = list(_NUM_RE.finditer(line))
+    head = line[:tokens[-1].start()] if tokens else line
+    words = re.sub(r"[^a-z ]", " ", head.lower()).split()
+    return " ".join(w for w in words if w not in _CURRENCY_WORDS)
+
+
+def _last_number(line: str, thousands: str) -> Optional[float]:
+    tokens = _NUM_RE.findall(line)
+    return _number(tokens[-1], thousands) if tokens else None
+
+
+# ─────────────────────────────
+# Learning
+# ─────────────────────────────
+def _learn_amount_line(lines: List[str], value, prefer: str, exclude=()) -> Optional[Tuple[str, str]]:
+    """(label, thousands) of the line that prints `value`, preferring labels containing `prefer`."""
+    if value is None:
+        return None
+    found = []
+    for line in lines:
+        for token in _NUM_RE.findall(line):
+            for thousands in (".", ","):
+                label = _label(line)
+                if _same(_number(token, thousands), value) and label and label not in exclude:
+                    found.append((label, thousands))
+    for label, thousands in found:
+        if prefer in label:
+            return label, thousands
+    return found[0] if found else None
+
+
+def _learn_date_format(text: str, date_str: Optional[str]) -> Optional[str]:
+    try:
+        value = datetime.fromisoformat(date_str) if date_str else None
+    except ValueError:
+        return None
+    if value is None:
+        return None
+    lowered = text.lower()
+    for fmt in DATE_FORMATS:
+        if value.strftime(fmt).lower() in lowered:
+            return fmt
+    return None
+
+
+def _date_regex(fmt: str) -> str:
+    pattern = re.escape(fmt)
+    for part, regex in _DATE_PARTS.items():
+        pattern = pattern.replace(re.escape(part), regex)
+    return pattern
+
+
+def _date_line(lines: List[str], fmt: Optional[str]) -> int:
+    if not fmt:
+        return -1
+    regex = re.compile(_date_regex(fmt))
+    return next((n for n, line in enumerate(lines) if regex.search(line)), -1)
+
+
+def _segment_pattern(segment: str, item: dict, thousands: str, used: set,
+                     last_is_total: bool = False) -> str:
+    """Regex for the non-name part of an item line: numbers become role groups."""
+    parts = []
+    pos = 0
+    matches = list(_NUM_RE.finditer(segment))
+    for index, match in enumerate(matches):
+        literal = segment[pos:match.start()].strip()
+        if literal:
+            parts.append(r"\s*".join(re.escape(w) for w in literal.split()))
+        value = _number(match.group(), thousands)
+        # The rightmost number is the line total (unit == total when qty is 1)
+        roles = ITEM_ROLES[::-1] if last_is_total and index == len(matches) - 1 else ITEM_ROLES
+        role = next((r for r in roles
+                     if r not in used and _same(value, item.get(r))), None)
+        if role:
+            used.add(role)
+            parts.append(f"(?P<{role}>{NUM})")
+        else:
+            parts.append(f"(?:{NUM})")
+        pos = match.end()
+    literal = segment[pos:].strip()
+    if literal:
+        parts.append(r"\s*".join(re.escape(w) for w in literal.split()))
+    return r"\s*".join(parts)
+
+
+def _item_rule(lines: List[str], item: dict, thousands: str) -> Optional[dict]:
+    name = _norm(str(item.get("name") or ""))
+    if not name:
+        return None
+    for i, line in enumerate(lines):
+        start = _norm(line).find(name)
+        if start < 0:
+            continue
+        # Map the match back onto the raw line (whitespace may differ)
+        words = line.split()
+        head_words = len(_norm(line)[:start].split())
+        name_words = len(name.split())
+        before = " ".join(words[:head_words])
+        after = " ".join(words[head_words + name_words:])
+
+        used = set()
+        pre = _segment_pattern(before, item, thousands, used)
+        post = _segment_pattern(after, item, thousands, used, last_is_total=True)
+        if "total_price" in used:
+            pattern = r"^\s*" + r"\s*".join(
+                p for p in (pre, r"(?P<name>.+?)", post) if p) + r"\s*$"
+            return {"span": 1, "pattern": pattern}
+
+        # Two-line layout: name, then a quantity / price line
+        if not (pre or post) and i + 1 < len(lines):
+            used = set()
+            numbers = _segment_pattern(lines[i + 1], item, thousands, used, last_is_total=True)
+            if "total_price" in used:
+                return {"span": 2, "pattern": r"^\s*" + numbers + r"\s*$"}
+        return None
+    return None
+
+
+def _extract_items(lines: List[str], rule: dict, thousands: str) -> List[dict]:
+    regex = re.compile(rule["pattern"], re.IGNORECASE)
+    items = []
+    for i, line in enumerate(lines):
+        match = regex.match(line)
+        if not match:
+            continue
+        groups = match.groupdict()
+        if rule["span"] == 1:
+            name = groups.get("name")
+        else:
+            previous = lines[i - 1] if i else ""
+            if not re.search(r"[A-Za-z]", previous) or regex.match(previous):
+                continue
+            name = previous.strip()
+        values = {role: _number(groups[role], thousands) for role in ITEM_ROLES if groups.get(role)}
+        items.append({"name": " ".join((name or "").split()), **values})
+    return items
+
+
+def build_template(ocr_text: str, parsed: dict) -> Optional[dict]:
+    """Learn a template from one LLM-parsed receipt; None if the layout can't be captured."""
+    lines = _lines(ocr_text)
+    items = [i for i in parsed.get("items") or [] if isinstance(i, dict)]
+    total = _learn_amount_line(lines, parsed.get("total"), "total")
+    if not lines or not items or not total:
+        return None
+    total_label, thousands = total
+    subtotal = _learn_amount_line(lines, parsed.get("subtotal"), "sub", exclude=(total_label,))
+    tax = _learn_amount_line(
+        lines, parsed.get("tax"), "tax", exclude=(total_label, subtotal and subtotal[0]))
+
+    rules = [r for r in (_item_rule(lines, item, thousands) for item in items) if r]
+    if not rules:
+        return None
+    key, _ = Counter((r["span"], r["pattern"]) for r in rules).most_common(1)[0]
+
+    # Does the item block start below the date line? (keeps address lines out)
+    date_format = _learn_date_format(ocr_text, parsed.get("date"))
+    date_at = _date_line(lines, date_format)
+    names = [_norm(str(i.get("name") or "")) for i in items]
+    first_item_at = next(
+        (n for n, line in enumerate(lines) if any(name and name in _norm(line) for name in names)), -1)
+
+    categories = {}
+    for item in items:
+        if item.get("name") and item.get("category"):
+            categories[_norm(item["name"])] = item["category"]
+    default_category = Counter(categories.values()).most_common(1)
+    template = {
+        "vendor": parsed.get("vendor"),
+        "currency": parsed.get("currency") or "IDR",
+        "thousands": thousands,
+        "date_format": date_format,
+        "items_after_date": 0 <= date_at < first_item_at,
+        "total_label": total_label,
+        "subtotal_label": subtotal[0] if subtotal else None,
+        "tax_label": tax[0] if tax else None,
+        "item_rule": {"span": key[0], "pattern": key[1]},
+        "item_categories": categories,
+        "default_category": default_category[0][0] if default_category else None,
+    }
+    # The template must reproduce the receipt it was learned from
+    result = apply_template(template, ocr_text)
+    return template if result and agrees(result[0], parsed) else None
+
+
+# ─────────────────────────────
+# Parsing with a template
+# ─────────────────────────────
+def _amount_for(lines: List[str], label: Optional[str], thousands: str) -> Tuple[Optional[float], int]:
+    if not label:
+        return None, -1
+    for i, line in enumerate(lines):
+        if _label(line) == label:
+            return _last_number(line, thousands), i
+    return None, -1
+
+
+def apply_template(template: dict, ocr_text: str) -> Optional[Tuple[dict, float]]:
+    """(parsed receipt, confidence) or None when the text doesn't fit the template."""
+    lines = _lines(ocr_text)
+    thousands = template["thousands"]
+    total, total_at = _amount_for(lines, template["total_label"], thousands)
+    if total is None:
+        return None
+    subtotal, subtotal_at = _amount_for(lines, template.get("subtotal_label"), thousands)
+    tax, tax_at = _amount_for(lines, template.get("tax_label"), thousands)
+
+    # Items sit between the date line (when it precedes them) and the first summary line
+    date_at = _date_line(lines, template.get("date_format"))
+    start = date_at + 1 if template.get("items_after_date") and date_at >= 0 else 0
+    ends = [i for i in (total_at, subtotal_at, tax_at) if i >= 0]
+    items = _extract_items(lines[start:min(ends)], template["item_rule"], thousands)
+    if not items:
+        return None
+    for item in items:
+        quantity = item.get("quantity")
+        unit = item.get("unit_price")
+        if quantity is None:
+            quantity = round(item["total_price"] / unit) if unit else 1
+        item["quantity"] = int(quantity)
+        if unit is None and quantity:
+            unit = item["total_price"] / quantity
+        item["unit_price"] = unit
+        item["category"] = template["item_categories"].get(
+            _norm(item["name"]), template.get("default_category"))
+
+    expense_date = None
+    if date_at >= 0:
+        match = re.search(_date_regex(template["date_format"]), lines[date_at])
+        if match:
+            try:
+                expense_date = datetime.strptime(
+                    match.group(), template["date_format"]).date().isoformat()
+            except ValueError:
+                expense_date = None
+    time_match = _TIME_RE.search(ocr_text)
+
+    item_sum = sum(i["total_price"] for i in items)
+    target = subtotal if subtotal is not None else total - (tax or 0)
+    reconciles = abs(item_sum - target) <= max(1.0, 0.005 * abs(target))
+    if not reconciles:
+        return None
+
+    # Reconciliation is required; the rest lowers confidence when missing
+    checks = [all(
+        abs(i["quantity"] * (i["unit_price"] or 0) - i["total_price"]) <= max(1.0, 0.005 * i["total_price"])
+        for i in items
+    )]
+    if template.get("date_format"):
+        checks.append(expense_date is not None)
+    if template.get("subtotal_label"):
+        checks.append(subtotal is not None)
+    if template.get("tax_label"):
+        checks.append(tax is not None)
+    confidence = sum(checks) / len(checks)
+
+    parsed = {
+        "vendor": template["vendor"],
+        "address": None,
+        "phone": None,
+        "date": expense_date,
+        "time": time_match.group(1) if time_match else None,
+        "table_number": None,
+        "items": items,
+        "subtotal": subtotal,
+        "tax": tax,
+        "total": total,
+        "payment_method": None,
+        "currency": template["currency"],
+        "notes": None,
+        "parser": "template",
+    }
+    return parsed, confidence
+
+
+def agrees(a: dict, b: dict) -> bool:
+    """Same total, same number of items and same item sum."""
+    items_a = [i for i in a.get("items") or [] if isinstance(i, dict)]
+    items_b = [i for i in b.get("items") or [] if isinstance(i, dict)]
+    if not _same(a.get("total"), b.get("total")) or len(items_a) != len(items_b):
+        return False
+    try:
+        sum_a = sum(float(i.get("total_price") or 0) for i in items_a)
+        sum_b = sum(float(i.get("total_price") or 0) for i in items_b)
+    except (TypeError, ValueError):
+        return False
+    return abs(sum_a - sum_b) < 0.01
+
+
+# ─────────────────────────────
+# Registry (DB + in-process copy)
+# ─────────────────────────────
+_registry: Dict[str, Tuple[dict, int]] = {}
+_loaded_at = 0.0
+_lock = threading.Lock()
+_stats = {"lookups": 0, "no_template": 0, "hits": 0, "fallbacks": 0, "learned": 0, "confirmed": 0}
+
+
+def _count(name: str):
+    with _lock:
+        _stats[name] += 1
+    if name in ("no_template", "hits", "fallbacks"):
+        metrics.TEMPLATE_PARSES.labels(name).inc()
+
+
+def _refresh(db: Session):
+    global _loaded_at
+    if time.monotonic() - _loaded_at < env_int("TEMPLATE_REFRESH_SECONDS", 60):
+        return
+    rows = db.query(models.VendorTemplate).all()
+    with _lock:
+        _registry.clear()
+        _registry.update({row.fingerprint: (row.template, row.samples) for row in rows})
+        _loaded_at = time.monotonic()
+
+
+def try_parse(db: Session, ocr_text: str) -> Optional[dict]:
+    """Parsed receipt from a confirmed template, or None (caller runs the LLM)."""
+    _refresh(db)
+    _count("lookups")
+    fp = fingerprint(ocr_text)
+    entry = _registry.get(fp) if fp else None
+    if not entry or entry[1] < min_samples():
+        _count("no_template")
+        return None
+    try:
+        result = apply_template(entry[0], ocr_text)
+    except (re.error, KeyError, TypeError, ZeroDivisionError):
+        result = None
+    if not result or result[1] < min_confidence():
+        _count("fallbacks")
+        return None
+    _count("hits")
+    return result[0]
+
+
+def learn(db: Session, ocr_text: str, parsed: dict):
+    """
+    Feed an LLM-parsed receipt back: confirms the vendor's template when it
+    reproduces the LLM result, otherwise (re)learns it from this receipt.
+    """
+    fp = fingerprint(ocr_text)
+    if not fp:
+        return
+    row = db.get(models.VendorTemplate, fp)
+    if row is not None:
+        try:
+            result = apply_template(row.template, ocr_text)
+        except (re.error, KeyError, TypeError, ZeroDivisionError):
+            result = None
+        if result and agrees(result[0], parsed):
+            row.samples += 1
+            db.commit()
+            _count("confirmed")
+            with _lock:
+                _registry[fp] = (row.template, row.samples)
+            return
+
+    template = build_template(ocr_text, parsed)
+    if template is None:
+        return
+    if row is None:
+        row = models.VendorTemplate(fingerprint=fp, vendor=template["vendor"])
+        db.add(row)
+    row.vendor = template["vendor"]
+    row.template = template
+    row.samples = 1
+    db.commit()
+    _count("learned")
+    with _lock:
+        _registry[fp] = (template, 1)
+
+
+def _with_session(fn, *args):
+    from app.db import get_sessionmaker
+
+    db = get_sessionmaker()()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def parse(ocr_text: str) -> Optional[dict]:
+    """try_parse off the event loop; template errors never fail the OCR job."""
+    if not enabled():
+        return None
+    try:
+        with metrics.stage("template_parse"):
+            return await asyncio.to_thread(_with_session, try_parse, ocr_text)
+    except Exception as e:
+        print(f"⚠️ Template parse skipped: {e}")
+        return None
+
+
+async def observe(ocr_text: str, parsed: dict):
+    """learn off the event loop (after an LLM parse)."""
+    if not enabled():
+        return
+    try:
+        await asyncio.to_thread(_with_session, learn, ocr_text, parsed)
+    except Exception as e:
+        print(f"⚠️ Template learning skipped: {e}")
+
+
+def stats() -> dict:
+    with _lock:
+        counters = dict(_stats)
+        active = sum(1 for _, samples in _registry.values() if samples >= min_samples())
+        known = len(_registry)
+    return {
+        "enabled": enabled(),
+        **counters,
+        "hit_rate": round(counters["hits"] / counters["lookups"], 3) if counters["lookups"] else 0.0,
+        "llm_calls_saved": counters["hits"],
+        "templates": known,
+        "active_templates": active,
+    }
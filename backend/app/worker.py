@@ -0,0 +1,261 @@
+# app/worker.py
+"""
+Bounded asyncio worker pool for the OCR job queue.
+
+Runs inside the API process (started from the app lifespan when
+OCR_INPROCESS_WORKERS is enabled) or standalone:
+
+    python -m app.worker
+
+While the OpenAI circuit breaker (app.resilience) is open no jobs are
+leased; jobs cut short by it are released without spending an attempt.
+"""
+import asyncio
+from typing import Optional, Set
+
+from app import jobs, metrics, partitions, resilience
+from app.config import env_int, env_float
+from app.db import get_sessionmaker
+from app.preprocess import shutdown_executor
+from app.storage import blob_path
+
+
+def _with_session(fn, *args):
+    """Run `fn(db, *args)` in a fresh session (called from worker threads)."""
+    db = get_sessionmaker()()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+def _load_job(db, job_id: str) -> Optional[dict]:
+    job = jobs.get_job(db, job_id)
+    if not job:
+        return None
+    return {
+        "id": job.id,
+        "receipt_id": job.receipt_id,
+        "filename": job.filename,
+        "mime": job.mime,
+        "blob_key": job.blob_key,
+        "payload": job.payload,
+    }
+
+
+class OcrWorkerPool:
+    """Leases jobs from `ocr_jobs` and runs at most `concurrency` at once."""
+
+    def __init__(self, concurrency: Optional[int] = None, poll_interval: Optional[float] = None):
+        self.concurrency = concurrency or env_int("OCR_WORKER_CONCURRENCY", 4)
+        self.poll_interval = poll_interval or env_float("OCR_WORKER_POLL_SECONDS", 2.0)
+        self.reap_interval = env_float("OCR_WORKER_REAP_SECONDS", 60.0)
+        self.partition_interval = env_float("PARTITION_CHECK_SECONDS", 6 * 3600.0)
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopping = False
+        self._runner: Optional[asyncio.Task] = None
+
+    # ─────────────────────────────
+    # Lifecycle
+    # ─────────────────────────────
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._stopping = False
+        self._runner = asyncio.create_task(self.run())
+
+    async def stop(self, timeout: float = 30.0):
+        """Stop leasing new jobs and wait for in-flight ones to finish."""
+        self._stopping = True
+        self.notify()
+        if self._runner:
+            await self._runner
+        if self._tasks:
+            # Anything still running keeps its lease and is picked up again
+            # by requeue_stale_jobs after it expires.
+            await asyncio.wait(self._tasks, timeout=timeout)
+
+    def notify(self):
+        """
+        Wake the dispatcher early (e.g. right after an upload enqueues a job).
+        Safe to call from threadpool threads (sync endpoints).
+        """
+        if self._wakeup is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._wakeup.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    # ─────────────────────────────
+    # Dispatch loop
+    # ─────────────────────────────
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        next_reap = 0.0
+        next_partition_check = 0.0
+
+        while not self._stopping:
+            try:
+                if loop.time() >= next_reap:
+                    recovered = await asyncio.to_thread(_with_session, jobs.requeue_stale_jobs)
+                    if recovered:
+                        print(f"♻️ Re-queued {recovered} stale OCR job(s)")
+                    next_reap = loop.time() + self.reap_interval
+                if loop.time() >= next_partition_check:
+                    # Next months' receipts partitions exist before anything is written to them
+                    next_partition_check = loop.time() + self.partition_interval
+                    created = await asyncio.to_thread(_with_session, partitions.ensure_partitions)
+                    if created:
+                        print(f"🗂️ Created receipts partition(s) {' '.join(created)}")
+
+                free = self.concurrency - len(self._tasks)
+                # Provider degraded: leave jobs queued, then send a single probe job
+                circuit = resilience.get_breaker().current()
+                if circuit == resilience.OPEN:
+                    free = 0
+                elif circuit == resilience.HALF_OPEN:
+                    free = min(free, 1)
+                leased = []
+                if free > 0:
+                    leased = await asyncio.to_thread(_with_session, self._lease_ids, free)
+                for job_id, token in leased:
+                    task = asyncio.create_task(self._run_job(job_id, token))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._on_task_done)
+
+                # Full or idle: sleep until a slot frees up, a job is enqueued or the poll timer fires
+                if not leased or len(self._tasks) >= self.concurrency:
+                    await self._sleep()
+            except Exception as e:
+                print("⚠️ OCR worker loop error:", e)
+                await self._sleep()
+
+    @staticmethod
+    def _lease_ids(db, limit: int):
+        return [(job.id, job.lease_token) for job in jobs.lease_jobs(db, limit)]
+
+    async def _sleep(self):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    def _on_task_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        self.notify()
+
+    @staticmethod
+    async def _heartbeat(job_id: str, token: str, runner: asyncio.Task) -> bool:
+        """Renew the lease while the job runs; cancel the job and return True if it was lost."""
+        interval = max(jobs.lease_seconds() / 3, 1.0)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                renewed = await asyncio.to_thread(_with_session, jobs.renew_lease, job_id, token)
+            except Exception as e:
+                print(f"⚠️ OCR job {job_id} lease renewal failed:", e)
+                continue
+            if not renewed:
+                print(f"⚠️ OCR job {job_id} lost its lease; abandoning this attempt")
+                metrics.OCR_JOBS.labels("lease_lost").inc()
+                runner.cancel()
+                return True
+
+    async def _run_job(self, job_id: str, token: str):
+        job = await asyncio.to_thread(_with_session, _load_job, job_id)
+        if not job:
+            return
+        heartbeat = asyncio.create_task(
+            self._heartbeat(job_id, token, asyncio.current_task()))
+        try:
+            await self._process(job, token)
+        except asyncio.CancelledError:
+            if not (heartbeat.done() and not heartbeat.cancelled() and heartbeat.result()):
+                raise
+            # Lease lost: the worker that took the job over owns the outcome
+        finally:
+            heartbeat.cancel()
+
+    async def _process(self, job: dict, token: str):
+        # Imported here: receipts imports this module to reach the pool
+        from app.receipts import process_receipt_ocr
+
+        job_id = job["id"]
+        try:
+            # Blob path is read by the preprocess pool; legacy jobs carry bytes
+            source = str(blob_path(job["blob_key"])) if job["blob_key"] else job["payload"]
+            if source is None:
+                raise ValueError("OCR job has no image")
+            done = await process_receipt_ocr(
+                source, job["filename"], job["mime"], job["receipt_id"], job_id, token)
+            metrics.OCR_JOBS.labels(jobs.DONE if done else "lease_lost").inc()
+        except resilience.ProviderUnavailable as e:
+            if resilience.get_breaker().current() == resilience.CLOSED:
+                await self._failed(job_id, token, e)
+            else:
+                released = await asyncio.to_thread(
+                    _with_session, jobs.release, job_id, token, max(e.retry_in, 1.0), str(e))
+                metrics.OCR_JOBS.labels("released" if released else "lease_lost").inc()
+                print(f"⚠️ OCR job {job_id} deferred, provider unavailable:", e)
+        except Exception as e:
+            await self._failed(job_id, token, e)
+
+    @staticmethod
+    async def _failed(job_id: str, token: str, error: Exception):
+        status = await asyncio.to_thread(_with_session, jobs.mark_failed, job_id, token, str(error))
+        metrics.OCR_JOBS.labels(status or "lease_lost").inc()
+        print(f"⚠️ OCR job {job_id} attempt failed ({status or 'lease lost'}):", error)
+
+
+# Pool started by the API lifespan, if any
+_pool: Optional[OcrWorkerPool] = None
+
+
+def get_worker_pool() -> Optional[OcrWorkerPool]:
+    return _pool
+
+
+async def start_worker_pool() -> OcrWorkerPool:
+    global _pool
+    _pool = OcrWorkerPool()
+    _pool.start()
+    return _pool
+
+
+async def stop_worker_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.stop()
+        _pool = None
+
+
+async def _main():
+    pool = await start_worker_pool()
+    print(f"🧠 OCR worker started (concurrency={pool.concurrency})")
+    port = env_int("METRICS_PORT", 0)
+    if port:
+        from prometheus_client import start_http_server
+
+        metrics.register_collectors()
+        start_http_server(port)
+        print(f"📈 Worker metrics on :{port}/metrics")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await stop_worker_pool()
+        shutdown_executor()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,122 @@
+# bench/compare_extraction.py
+"""
+Compare the two OCR extraction modes on a folder of receipt images.
+
+    python -m bench.compare_extraction ../samples --out compare.json
+
+For every image both modes are run; the report shows per-mode latency
+(p50 / mean / max) and how often each field agrees between them.
+"""
+import argparse
+import asyncio
+import json
+import mimetypes
+import statistics
+import time
+from pathlib import Path
+
+from app.openai_handler import EXTRACTION_MODES, extract_receipt, close_openai_client
+
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+COMPARED_FIELDS = ("vendor", "date", "total", "subtotal", "tax", "currency", "item_count")
+
+
+def _normalize(parsed: dict, field: str):
+    if field == "item_count":
+        return len(parsed.get("items") or [])
+    value = parsed.get(field)
+    if isinstance(value, str):
+        return " ".join(value.lower().split())
+    if isinstance(value, (int, float)):
+        return round(float(value), 2)
+    return value
+
+
+def field_agreement(a: dict, b: dict) -> dict:
+    return {field: _normalize(a, field) == _normalize(b, field) for field in COMPARED_FIELDS}
+
+
+async def _timed(path: Path, mode: str):
+    mime = mimetypes.guess_type(path.name)[0] or "image/jpeg"
+    started = time.perf_counter()
+    try:
+        parsed = await extract_receipt(path.read_bytes(), path.name, mime, mode=mode)
+        error = None
+    except Exception as e:
+        parsed, error = {}, str(e)
+    return parsed, (time.perf_counter() - started) * 1000, error
+
+
+def _latency_summary(samples):
+    if not samples:
+        return {}
+    return {
+        "p50_ms": round(statistics.median(samples), 1),
+        "mean_ms": round(statistics.fmean(samples), 1),
+        "max_ms": round(max(samples), 1),
+    }
+
+
+async def compare(fixtures: Path) -> dict:
+    images = sorted(p for p in fixtures.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    latencies = {mode: [] for mode in EXTRACTION_MODES}
+    errors = {mode: 0 for mode in EXTRACTION_MODES}
+    agree = {field: 0 for field in COMPARED_FIELDS}
+    compared = 0
+    per_image = []
+
+    for path in images:
+        results = {}
+        for mode in EXTRACTION_MODES:
+            parsed, ms, error = await _timed(path, mode)
+            latencies[mode].append(ms)
+            if error:
+                errors[mode] += 1
+            results[mode] = {"parsed": parsed, "latency_ms": round(ms, 1), "error": error}
+
+        row = {"image": path.name, **results}
+        if not any(r["error"] for r in results.values()):
+            agreement = field_agreement(*(results[m]["parsed"] for m in EXTRACTION_MODES))
+            for field, same in agreement.items():
+                agree[field] += same
+            compared += 1
+            row["agreement"] = agreement
+        per_image.append(row)
+
+    return {
+        "images": len(images),
+        "latency": {mode: _latency_summary(v) for mode, v in latencies.items()},
+        "errors": errors,
+        "field_agreement": {
+            field: round(n / compared, 3) if compared else None for field, n in agree.items()
+        },
+        "per_image": per_image,
+    }
+
+
+def _print_report(report: dict):
+    print(f"Images: {report['images']}")
+    for mode, summary in report["latency"].items():
+        print(f"  {mode:<9} latency {summary}  errors={report['errors'][mode]}")
+    print("Field agreement:")
+    for field, ratio in report["field_agreement"].items():
+        print(f"  {field:<11} {ratio}")
+
+
+async def _main(args):
+    try:
+        report = await compare(Path(args.fixtures))
+    finally:
+        await close_openai_client()
+    _print_report(report)
+    if args.out:
+        Path(args.out).write_text(json.dumps(report, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("fixtures", nargs="?", default="../samples",
+                        help="directory of receipt images")
+    parser.add_argument("--out", help="write the full JSON report here")
+    asyncio.run(_main(parser.parse_args()))
@@ -0,0 +1,107 @@
+# bench/explain_filters.py
+"""
+EXPLAIN-based index regression check for list_receipts filters.
+
+    python -m bench.explain_filters      (or: make check-indexes)
+
+Builds the same query GET /receipts/ runs for each filter combination,
+EXPLAINs it with sequential scans disabled and fails (exit 1) when the
+plan doesn't touch the index expected for that filter. `receipts` is
+partitioned, so plans name each partition's own index; those are mapped
+back to the parent index through pg_inherits. A created_at range must
+also be pruned to the partitions it covers. CI runs it against a freshly
+migrated and seeded Postgres (.github/workflows/backend.yml).
+"""
+import json
+import sys
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from app import models, partitions
+from app.db import get_sessionmaker
+from app.receipts import filter_receipts
+
+
+# (filters, index the plan must use)
+CASES = [
+    ({}, "ix_receipts_live_created_at"),
+    ({"category": "food"}, "ix_receipts_live_category"),
+    ({"year": 2025}, "ix_receipts_live_expense_date"),
+    ({"year": 2025, "month": 10}, "ix_receipts_live_expense_date"),
+    ({"min_amount": 100000, "max_amount": 200000}, "ix_receipts_live_amount"),
+    ({"vendor": "starbucks"}, "ix_receipts_vendor_trgm"),
+    ({"hide_failed": True}, "ix_receipts_live_status"),
+    ({"q": "parking fee"}, "ix_receipts_search_vector"),
+]
+
+
+def _walk(plan: dict, key: str):
+    value = plan.get(key)
+    if value:
+        yield value
+    for child in plan.get("Plans", []):
+        yield from _walk(child, key)
+
+
+def _parent_indexes(db, names: set) -> set:
+    """Partition index names mapped to the partitioned index they belong to."""
+    if not names:
+        return set()
+    parents = dict(db.execute(text("""
+        SELECT c.relname, p.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        WHERE c.relkind = 'i' AND c.relname = ANY(:names)
+    """), {"names": list(names)}).all())
+    return {parents.get(name, name) for name in names}
+
+
+def _explain_query(db, query) -> dict:
+    conn = db.connection()
+    compiled = query.statement.compile(dialect=conn.dialect)
+    result = conn.exec_driver_sql(
+        "EXPLAIN (FORMAT JSON) " + str(compiled), compiled.params).scalar()
+    plan = result if isinstance(result, list) else json.loads(result)
+    return plan[0]["Plan"]
+
+
+def explain(db, filters: dict) -> dict:
+    query = filter_receipts(db.query(models.Receipt), **{"hide_failed": False, **filters})
+    query = query.order_by(models.Receipt.created_at.desc(), models.Receipt.id.desc()).limit(10)
+    return _explain_query(db, query)
+
+
+def check_pruning(db) -> bool:
+    """A one-month created_at range may only scan that month's partition."""
+    r = models.Receipt
+    month = partitions.month_start(datetime.now(timezone.utc).date())
+    partitions.ensure_partitions(db, start=month, ahead=1)
+    lower, upper = month, partitions.add_months(month, 1)
+    query = db.query(r).filter(r.created_at >= lower, r.created_at < upper).limit(10)
+    scanned = set(_walk(_explain_query(db, query), "Relation Name"))
+    ok = scanned == {partitions.partition_name(month)}
+    print(f"{'ok ' if ok else 'FAIL'} created_at in [{lower}, {upper}) -> {sorted(scanned)}")
+    return ok
+
+
+def main() -> int:
+    db = get_sessionmaker()()
+    failures = 0
+    try:
+        failures += not check_pruning(db)
+        # Small dev tables would otherwise always seq-scan
+        db.connection().exec_driver_sql("SET LOCAL enable_seqscan = off")
+        for filters, expected in CASES:
+            used = _parent_indexes(db, set(_walk(explain(db, filters), "Index Name")))
+            ok = expected in used
+            failures += not ok
+            print(f"{'ok ' if ok else 'FAIL'} {filters or '(no filters)'} -> {sorted(used) or 'seq scan'}")
+    finally:
+        db.rollback()
+        db.close()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
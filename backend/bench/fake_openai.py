@@ -0,0 +1,171 @@
+# bench/fake_openai.py
+"""
+Local stand-in for the OpenAI chat.completions endpoint.
+
+    python -m bench.fake_openai --port 8900 --latency-ms 800 --jitter-ms 300 --error-rate 0.02
+
+Point the API at it with OPENAI_BASE_URL=http://127.0.0.1:8900/v1 and any
+OPENAI_API_KEY. Requests are answered like the real API for the three calls
+the app makes: OCR text, text→JSON parse, and single-call structured output
+(canned receipts, usage and x-ratelimit-* headers included). Latency, 5xx
+and 429 rates are configurable; a fixed --seed makes runs repeatable.
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+RECEIPTS = [
+    {
+        "vendor": "Kopi Kenangan", "address": "Jl. Sudirman 1, Jakarta", "phone": None,
+        "date": "2025-10-03", "time": "15:34:55", "table_number": None,
+        "items": [
+            {"name": "Kopi Kenangan Mantan", "quantity": 2, "unit_price": 24000.0,
+             "total_price": 48000.0, "category": "MINUMAN"},
+            {"name": "Roti Bakar", "quantity": 1, "unit_price": 18000.0,
+             "total_price": 18000.0, "category": "MAKANAN"},
+        ],
+        "subtotal": 66000.0, "tax": 7260.0, "total": 73260.0,
+        "payment_method": "QRIS", "currency": "IDR", "notes": None,
+    },
+    {
+        "vendor": "Indomaret", "address": "Jl. Gatot Subroto 12", "phone": "021-555-0101",
+        "date": "2025-08-07", "time": "16:32:55", "table_number": None,
+        "items": [
+            {"name": "Aqua 600ml", "quantity": 3, "unit_price": 4000.0,
+             "total_price": 12000.0, "category": "MINUMAN"},
+            {"name": "Indomie Goreng", "quantity": 5, "unit_price": 3500.0,
+             "total_price": 17500.0, "category": "MAKANAN"},
+            {"name": "Parkir", "quantity": 1, "unit_price": 2000.0,
+             "total_price": 2000.0, "category": "PARKIR"},
+        ],
+        "subtotal": 31500.0, "tax": None, "total": 31500.0,
+        "payment_method": "CASH", "currency": "IDR", "notes": None,
+    },
+    {
+        "vendor": "Sate Khas Senayan", "address": "Senayan City", "phone": None,
+        "date": "2025-05-19", "time": "15:09:48", "table_number": "14",
+        "items": [
+            {"name": "Sate Ayam", "quantity": 2, "unit_price": 55000.0,
+             "total_price": 110000.0, "category": "MAKANAN"},
+            {"name": "Es Teh Manis", "quantity": 2, "unit_price": 12000.0,
+             "total_price": 24000.0, "category": "MINUMAN"},
+        ],
+        "subtotal": 134000.0, "tax": 13400.0, "total": 147400.0,
+        "payment_method": "DEBIT", "currency": "IDR", "notes": "Dine in",
+    },
+]
+
+
+def receipt_text(receipt: dict) -> str:
+    lines = [receipt["vendor"], receipt["address"] or "", f"{receipt['date']} {receipt['time']}"]
+    for item in receipt["items"]:
+        lines.append(f"{item['quantity']} x {item['name']}  {item['total_price']:,.0f}")
+    if receipt["tax"]:
+        lines.append(f"Subtotal {receipt['subtotal']:,.0f}")
+        lines.append(f"Tax {receipt['tax']:,.0f}")
+    lines.append(f"TOTAL {receipt['total']:,.0f}")
+    return "\n".join(lines)
+
+
+def create_app(args) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    rng = random.Random(args.seed)
+    counters = {"requests": 0, "errors": 0, "rate_limited": 0}
+
+    def headers() -> dict:
+        return {
+            "x-ratelimit-limit-requests": str(args.rpm),
+            "x-ratelimit-remaining-requests": str(args.rpm - 1),
+            "x-ratelimit-reset-requests": "60ms",
+            "x-ratelimit-limit-tokens": str(args.tpm),
+            "x-ratelimit-remaining-tokens": str(args.tpm - 2000),
+            "x-ratelimit-reset-tokens": "120ms",
+        }
+
+    def completion(model: str, content: str, prompt_tokens: int) -> dict:
+        completion_tokens = max(len(content) // 4, 1)
+        return {
+            "id": f"chatcmpl-fake{counters['requests']}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        counters["requests"] += 1
+
+        delay = max(rng.gauss(args.latency_ms, args.jitter_ms), 0) / 1000
+        await asyncio.sleep(delay)
+
+        roll = rng.random()
+        if roll < args.rate_limit_rate:
+            counters["rate_limited"] += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached (fake)", "type": "requests"}},
+                status_code=429, headers={**headers(), "retry-after": "1"})
+        if roll < args.rate_limit_rate + args.error_rate:
+            counters["errors"] += 1
+            return JSONResponse(
+                {"error": {"message": "Internal error (fake)", "type": "server_error"}},
+                status_code=500)
+
+        receipt = rng.choice(RECEIPTS)
+        messages = body.get("messages", [])
+        system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+        prompt_tokens = len(json.dumps(messages)) // 4
+        if any(isinstance(m.get("content"), list) for m in messages):
+            prompt_tokens = 1100 + 100  # image + short text, like a low-res receipt photo
+
+        if "OCR assistant" in system:
+            content = receipt_text(receipt)
+        elif body.get("response_format", {}).get("type") == "json_schema":
+            # Single-call structured output carries its own transcription
+            content = json.dumps({**receipt, "ocr_text": receipt_text(receipt)})
+        else:  # text→JSON parse
+            content = json.dumps(receipt)
+        return JSONResponse(completion(body.get("model", "gpt-4o-mini"), content, prompt_tokens),
+                            headers=headers())
+
+    @app.get("/stats")
+    def stats():
+        return counters
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI chat.completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=800)
+    parser.add_argument("--jitter-ms", type=float, default=200)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction answered with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction answered with 429")
+    parser.add_argument("--rpm", type=int, default=5000)
+    parser.add_argument("--tpm", type=int, default=4_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
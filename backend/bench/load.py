@@ -0,0 +1,297 @@
+# bench/load.py
+"""
+Load scenarios against a running API, with saved baselines.
+
+Setup (local Postgres, never production):
+
+    alembic upgrade head && python -m bench.seed --receipts 100000
+    python -m bench.fake_openai --latency-ms 800 &
+    OPENAI_BASE_URL=http://127.0.0.1:8900/v1 OPENAI_API_KEY=fake \\
+        uvicorn app.main:app --port 8001 &
+
+Run:
+
+    python -m bench.load --scenarios all --save-baseline bench/baselines/local.json
+    python -m bench.load --scenarios all --compare bench/baselines/local.json
+
+Scenarios: burst_uploads (concurrent uploads, then waits for the OCR queue
+to drain), deep_paging (offset vs cursor at depth), filtered_queries and
+patch_storm. Each reports p50/p95/p99 latency, requests per second and
+errors; burst_uploads also reports OCR jobs completed per minute.
+--compare exits 1 when p95 or throughput regress past --tolerance.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+
+import requests
+
+
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp"}
+
+FILTER_MIX = [
+    {},
+    {"category": "MAKANAN"},
+    {"vendor": "kopi"},
+    {"year": 2025},
+    {"year": 2025, "month": 8},
+    {"min_amount": 50000, "max_amount": 150000},
+    {"q": "parkir"},
+    {"q": "sate ayam", "year": 2025},
+    {"hide_failed": "false", "total_mode": "estimated"},
+    {"fields": "vendor,amount,expense_date,status", "total_mode": "none"},
+]
+
+
+def percentile(samples, pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(math.ceil(pct / 100 * len(ordered)) - 1, 0)
+    return ordered[rank]
+
+
+class Runner:
+    """Times HTTP calls; one requests.Session per thread."""
+
+    def __init__(self, base_url: str, concurrency: int, bust_cache: bool):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.bust_cache = bust_cache
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def call(self, method: str, path: str, samples: list, errors: list, **kwargs):
+        if self.bust_cache and method == "GET":
+            # Unique query string so the response cache doesn't answer for Postgres
+            kwargs["params"] = {**kwargs.get("params", {}), "_bench": uuid.uuid4().hex[:8]}
+        started = time.perf_counter()
+        try:
+            response = self._session().request(method, self.base_url + path, timeout=120, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        samples.append((time.perf_counter() - started) * 1000)
+        if not ok:
+            errors.append(response.status_code if response is not None else "conn")
+        return response
+
+    def run(self, calls):
+        """Run zero-arg callables with the configured concurrency; returns wall seconds."""
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            list(pool.map(lambda fn: fn(), calls))
+        return time.perf_counter() - started
+
+    def get_json(self, path: str, **params):
+        response = self._session().get(self.base_url + path, params=params, timeout=60)
+        response.raise_for_status()
+        return response.json()
+
+
+def summarize(samples, errors, elapsed: float, **extra) -> dict:
+    return {
+        "requests": len(samples),
+        "errors": len(errors),
+        "rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(samples, 50), 1),
+        "p95_ms": round(percentile(samples, 95), 1),
+        "p99_ms": round(percentile(samples, 99), 1),
+        **extra,
+    }
+
+
+# ─────────────────────────────
+# Scenarios
+# ─────────────────────────────
+def burst_uploads(runner: Runner, args) -> dict:
+    images = sorted(p for p in Path(args.fixtures).iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    if not images:
+        raise SystemExit(f"no images in {args.fixtures}")
+    blobs = [(p.name, p.read_bytes()) for p in images]
+    samples, errors = [], []
+    before = runner.get_json("/health/queue")
+
+    def upload(i: int):
+        name, data = blobs[i % len(blobs)]
+        # Trailing bytes after the image end: same picture, new hash (no dedup hit)
+        payload = data + os.urandom(16)
+        runner.call("POST", "/receipts/", samples, errors,
+                    files={"file": (f"{i}_{name}", payload, "image/jpeg")})
+
+    elapsed = runner.run([lambda i=i: upload(i) for i in range(args.uploads)])
+    started = time.perf_counter() - elapsed
+
+    # Wait for the OCR queue to drain (or time out)
+    deadline = time.perf_counter() + args.drain_timeout
+    depth = runner.get_json("/health/queue")
+    while depth["queued"] + depth["running"] and time.perf_counter() < deadline:
+        time.sleep(1)
+        depth = runner.get_json("/health/queue")
+    drained = time.perf_counter() - started
+    completed = (depth["done"] - before["done"]) + (depth["failed"] - before["failed"])
+
+    return summarize(
+        samples, errors, elapsed,
+        ocr_jobs_completed=completed,
+        ocr_jobs_failed=depth["failed"] - before["failed"],
+        ocr_jobs_per_minute=round(completed / drained * 60, 1) if drained else 0.0,
+        drained=not (depth["queued"] + depth["running"]),
+    )
+
+
+def _deep_paging(runner: Runner, args, mode: str) -> dict:
+    samples, errors = [], []
+    started = time.perf_counter()
+    cursor = None
+    for page in range(args.pages):
+        params = {"limit": 100, "hide_failed": "false", "total_mode": "none"}
+        if mode == "cursor":
+            params["pagination"] = "cursor"
+            if cursor:
+                params["cursor"] = cursor
+        else:
+            params["offset"] = page * 100
+        response = runner.call("GET", "/receipts/", samples, errors, params=params)
+        if response is None or response.status_code >= 400:
+            continue
+        cursor = response.json().get("next_cursor")
+        if mode == "cursor" and not cursor:
+            break
+    return summarize(samples, errors, time.perf_counter() - started, pages=len(samples))
+
+
+def deep_paging_offset(runner: Runner, args) -> dict:
+    return _deep_paging(runner, args, "offset")
+
+
+def deep_paging_cursor(runner: Runner, args) -> dict:
+    return _deep_paging(runner, args, "cursor")
+
+
+def filtered_queries(runner: Runner, args) -> dict:
+    samples, errors = [], []
+    rng = random.Random(args.seed)
+    params = [rng.choice(FILTER_MIX) for _ in range(args.queries)]
+    elapsed = runner.run([
+        lambda p=p: runner.call("GET", "/receipts/", samples, errors, params={"limit": 20, **p})
+        for p in params
+    ])
+    return summarize(samples, errors, elapsed)
+
+
+def patch_storm(runner: Runner, args) -> dict:
+    page = runner.get_json("/receipts/", limit=100, fields="id", total_mode="none")
+    ids = [r["id"] for r in page["results"]]
+    if not ids:
+        raise SystemExit("no receipts to patch; run python -m bench.seed first")
+    samples, errors = [], []
+    rng = random.Random(args.seed)
+    patches = [(rng.choice(ids), {"category": rng.choice(["MAKANAN", "MINUMAN", "TAKE AWAY"])})
+               for _ in range(args.patches)]
+    elapsed = runner.run([
+        lambda rid=rid, body=body: runner.call("PATCH", f"/receipts/{rid}", samples, errors, json=body)
+        for rid, body in patches
+    ])
+    return summarize(samples, errors, elapsed, receipts=len(set(r for r, _ in patches)))
+
+
+SCENARIOS = {
+    "burst_uploads": burst_uploads,
+    "deep_paging_offset": deep_paging_offset,
+    "deep_paging_cursor": deep_paging_cursor,
+    "filtered_queries": filtered_queries,
+    "patch_storm": patch_storm,
+}
+
+
+# ─────────────────────────────
+# Baselines
+# ─────────────────────────────
+def compare(results: dict, baseline: dict, tolerance: float) -> int:
+    regressions = 0
+    for name, now in results.items():
+        then = baseline.get("results", {}).get(name)
+        if not then:
+            print(f"  {name}: no baseline")
+            continue
+        p95 = now["p95_ms"] / then["p95_ms"] - 1 if then["p95_ms"] else 0.0
+        rps = now["rps"] / then["rps"] - 1 if then["rps"] else 0.0
+        bad = p95 > tolerance or rps < -tolerance
+        regressions += bad
+        print(f"  {'REGRESSION' if bad else 'ok':10s} {name:20s} p95 {then['p95_ms']:8.1f} → {now['p95_ms']:8.1f} ms"
+              f" ({p95:+.0%})  rps {then['rps']:8.1f} → {now['rps']:8.1f} ({rps:+.0%})")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Load scenarios against a running API")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8001")
+    parser.add_argument("--scenarios", default="all", help=f"comma list of {', '.join(SCENARIOS)}")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--uploads", type=int, default=50)
+    parser.add_argument("--drain-timeout", type=float, default=600)
+    parser.add_argument("--fixtures", default="../samples")
+    parser.add_argument("--pages", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--patches", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep-cache", action="store_true",
+                        help="don't add a cache-busting param to GETs")
+    parser.add_argument("--save-baseline", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed p95 increase / rps drop before failing")
+    args = parser.parse_args()
+
+    names = list(SCENARIOS) if args.scenarios == "all" else args.scenarios.split(",")
+    unknown = [n for n in names if n not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(unknown)}")
+
+    runner = Runner(args.base_url, args.concurrency, bust_cache=not args.keep_cache)
+    results = {}
+    for name in names:
+        print(f"▶ {name}")
+        results[name] = SCENARIOS[name](runner, args)
+        print("  " + json.dumps(results[name]))
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "host": platform.node(),
+            "python": platform.python_version(),
+        },
+        "results": results,
+    }
+    if args.save_baseline:
+        path = Path(args.save_baseline)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2))
+        print(f"✅ Baseline saved to {path}")
+
+    if args.compare:
+        print(f"Compared with {args.compare}:")
+        return compare(results, json.loads(Path(args.compare).read_text()), args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+# bench/seed.py
+"""
+Fill the database with synthetic parsed receipts for the load scenarios.
+
+    python -m bench.seed --receipts 200000
+    python -m bench.seed --purge
+
+Rows are bulk-inserted in batches (receipts + receipt_items) under
+batch_id "bench-seed", then the spending rollups are rebuilt. --purge
+deletes them again. Use a local database, never production.
+"""
+import argparse
+import random
+from datetime import datetime, timedelta, timezone
+
+import shortuuid
+from sqlalchemy import delete, insert, select
+
+from app import models, partitions, rollups
+from app.db import get_sessionmaker
+from app.items import item_names, item_rows
+from bench.fake_openai import RECEIPTS, receipt_text
+
+
+SEED_BATCH_ID = "bench-seed"
+CATEGORIES = ("MAKANAN", "MINUMAN", "TAKE AWAY", "PARKIR", "TRANSPORT")
+
+
+def _receipt_row(rng: random.Random, now: datetime):
+    template = rng.choice(RECEIPTS)
+    created_at = now - timedelta(minutes=rng.randrange(0, 2 * 365 * 24 * 60))
+    expense_date = created_at.replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    vendor = f"{template['vendor']} {rng.randrange(500)}"
+    amount = round(template["total"] * rng.uniform(0.5, 3), 2)
+    receipt_id = shortuuid.uuid()
+    row = {
+        "id": receipt_id,
+        "vendor": vendor,
+        "amount": amount,
+        "currency": "IDR",
+        "expense_date": expense_date,
+        "category": rng.choice(CATEGORIES),
+        "status": "parsed",
+        "error_message": None,
+        "ocr_text": receipt_text(template),
+        "item_names": item_names(template["items"]),
+        "data": {
+            "vendor": vendor, "amount": amount, "currency": "IDR",
+            "expense_date": expense_date.date().isoformat(), "items": template["items"],
+            "status": "parsed", "source_image": f"bench_{receipt_id}.jpg",
+        },
+        "deleted": rng.random() < 0.02,
+        "batch_id": SEED_BATCH_ID,
+        "created_at": created_at,
+    }
+    return row, item_rows(receipt_id, template["items"])
+
+
+def seed(count: int, batch: int, seed_value: int) -> int:
+    rng = random.Random(seed_value)
+    now = datetime.now(timezone.utc)
+    db = get_sessionmaker()()
+    try:
+        # Two years of history: give every month its own partition, not receipts_pdefault
+        partitions.ensure_partitions(db, start=(now - timedelta(days=2 * 365 + 31)).date())
+        written = 0
+        while written < count:
+            size = min(batch, count - written)
+            receipts, items = [], []
+            for _ in range(size):
+                row, line_items = _receipt_row(rng, now)
+                receipts.append(row)
+                items.extend(line_items)
+            db.execute(insert(models.Receipt), receipts)
+            db.execute(insert(models.ReceiptItem), items)
+            db.commit()
+            written += size
+            print(f"… {written}/{count}")
+        print(f"✅ Rebuilt {rollups.rebuild(db)} rollup rows")
+        return written
+    finally:
+        db.close()
+
+
+def purge() -> int:
+    db = get_sessionmaker()()
+    try:
+        # No foreign keys on a partitioned receipts table: remove dependents explicitly
+        seeded = select(models.Receipt.id).where(models.Receipt.batch_id == SEED_BATCH_ID)
+        db.execute(delete(models.ReceiptItem).where(models.ReceiptItem.receipt_id.in_(seeded)))
+        db.execute(delete(models.OcrJob).where(models.OcrJob.receipt_id.in_(seeded)))
+        deleted = db.execute(
+            delete(models.Receipt).where(models.Receipt.batch_id == SEED_BATCH_ID)).rowcount
+        db.commit()
+        rollups.rebuild(db)
+        return deleted
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed synthetic receipts for benchmarks")
+    parser.add_argument("--receipts", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--purge", action="store_true", help="delete previously seeded rows")
+    args = parser.parse_args()
+
+    if args.purge:
+        print(f"✅ Deleted {purge()} seeded receipts")
+    else:
+        print(f"✅ Seeded {seed(args.receipts, args.batch, args.seed)} receipts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# bench/serialize_list.py
+"""
+Payload size and CPU cost of one GET /receipts/ page (limit=100).
+
+    python -m bench.serialize_list --limit 100 --rounds 200
+
+Compares the old path (ORM instances validated through PaginatedReceipts
+with from_attributes) against the lean path (column tuples → dicts →
+orjson), for the full field set and for a list-view projection. Rows are
+synthetic, so no database is needed; ORM instance construction stands in
+for hydration.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from app import models, schemas, serialize
+
+
+LIST_VIEW_FIELDS = "vendor,amount,currency,expense_date,status"
+
+
+def _rows(limit: int, item_count: int):
+    now = datetime.now(timezone.utc)
+    rows = []
+    for i in range(limit):
+        items = [
+            {"name": f"Item {n}", "quantity": 1 + n % 3, "unit_price": 12500.0,
+             "total_price": 12500.0 * (1 + n % 3), "category": "food"}
+            for n in range(item_count)
+        ]
+        data = {
+            "vendor": f"Vendor {i}", "amount": 150000.0, "currency": "IDR",
+            "expense_date": "2025-10-01", "category": "food", "items": items,
+            "status": "parsed", "source_image": f"receipt_{i}.jpg",
+            "preprocess": {"original_bytes": 2_400_000, "output_bytes": 180_000},
+        }
+        rows.append({
+            "id": f"r{i:021d}", "vendor": f"Vendor {i}", "amount": Decimal("150000.00"),
+            "currency": "IDR", "category": "food", "expense_date": datetime(2025, 10, 1),
+            "data": data, "status": "parsed", "error_message": None,
+            "ocr_started_at": now, "ocr_finished_at": now + timedelta(seconds=4),
+            "created_at": now - timedelta(minutes=i), "deleted": False,
+        })
+    return rows
+
+
+def _page(results, limit: int) -> dict:
+    return {"total": None, "total_mode": "none", "limit": limit, "offset": 0,
+            "next_cursor": None, "results": results}
+
+
+def pydantic_path(rows, limit: int) -> bytes:
+    receipts = [models.Receipt(**row) for row in rows]
+    return schemas.PaginatedReceipts.model_validate(
+        _page(receipts, limit), from_attributes=True).model_dump_json().encode()
+
+
+def lean_path(rows, limit: int, fields) -> bytes:
+    names = serialize.parse_fields(fields)
+    tuples = [tuple(row[name] for name in names) for row in rows]  # what db.query(*columns) returns
+    return serialize.dumps(_page(serialize.rows_to_dicts(tuples, names), limit))
+
+
+def _measure(fn, rounds: int):
+    body = fn()
+    started = time.process_time()
+    for _ in range(rounds):
+        fn()
+    return len(body), (time.process_time() - started) * 1000 / rounds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--items", type=int, default=8, help="line items per receipt")
+    parser.add_argument("--rounds", type=int, default=200)
+    args = parser.parse_args()
+
+    rows = _rows(args.limit, args.items)
+    cases = [
+        ("orm + pydantic (before)", lambda: pydantic_path(rows, args.limit)),
+        ("lean, all fields", lambda: lean_path(rows, args.limit, None)),
+        (f"lean, fields={LIST_VIEW_FIELDS}", lambda: lean_path(rows, args.limit, LIST_VIEW_FIELDS)),
+    ]
+
+    print(f"encoder: {'orjson' if serialize.orjson else 'json (install orjson)'}")
+    baseline = None
+    for name, fn in cases:
+        size, cpu_ms = _measure(fn, args.rounds)
+        baseline = baseline or (size, cpu_ms)
+        print(f"{name:55s} {size / 1024:8.1f} KiB ({size / baseline[0]:5.1%})"
+              f" {cpu_ms:8.3f} ms CPU/page ({cpu_ms / baseline[1]:5.1%})")
+
+
+if __name__ == "__main__":
+    main()
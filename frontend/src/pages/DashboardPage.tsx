@@ -1,36 +1,75 @@
 // src/pages/DashboardPage.tsx
-import React from "react";
+import React, { useEffect, useState } from "react";
 import { BarChart3, FileText, CreditCard } from "lucide-react";
+import { getReceipts, getSpendingStats } from "../services/api";
+
+interface CurrencyTotal {
+    currency: string;
+    receipt_count: number;
+    total_amount: number;
+    average_amount: number;
+}
+
+interface RecentReceipt {
+    vendor: string;
+    total: number;
+    currency: string;
+    date: string;
+}
 
 export default function DashboardPage() {
-    // Mock summary data — later this can be fetched from backend analytics
+    const [totals, setTotals] = useState<CurrencyTotal[]>([]);
+    const [recent, setRecent] = useState<RecentReceipt[]>([]);
+
+    useEffect(() => {
+        getSpendingStats({ group_by: "none" })
+            .then((res) => setTotals(res.data?.totals || []))
+            .catch((err) => console.error("Failed to load stats:", err));
+
+        getReceipts({
+            limit: 5,
+            total_mode: "none",
+            fields: "vendor,amount,currency,expense_date,created_at",
+        })
+            .then((res) =>
+                setRecent(
+                    (res.data?.results || []).map((r: any) => ({
+                        vendor: r.vendor || "—",
+                        total: Number(r.amount || 0),
+                        currency: r.currency || "IDR",
+                        date: (r.expense_date || r.created_at || "").slice(0, 10),
+                    }))
+                )
+            )
+            .catch((err) => console.error("Failed to load recent receipts:", err));
+    }, []);
+
+    // Primary currency = the one with the most receipts
+    const main = [...totals].sort((a, b) => b.receipt_count - a.receipt_count)[0];
+    const currency = main?.currency || "IDR";
+    const receiptCount = totals.reduce((sum, t) => sum + t.receipt_count, 0);
+
     const stats = [
         {
             label: "Total Receipts",
-            value: 42,
+            value: receiptCount,
             icon: <FileText className="w-6 h-6 text-blue-600" />,
             color: "bg-blue-50",
         },
         {
             label: "Total Spent",
-            value: "IDR 5,470,000",
+            value: `${currency} ${Math.round(main?.total_amount || 0).toLocaleString()}`,
             icon: <CreditCard className="w-6 h-6 text-green-600" />,
             color: "bg-green-50",
         },
         {
             label: "Average per Receipt",
-            value: "IDR 130,000",
+            value: `${currency} ${Math.round(main?.average_amount || 0).toLocaleString()}`,
             icon: <BarChart3 className="w-6 h-6 text-purple-600" />,
             color: "bg-purple-50",
         },
     ];
 
-    const recent = [
-        { vendor: "Bebek Kaleyo", total: 292006, date: "2025-10-17" },
-        { vendor: "Starbucks", total: 58000, date: "2025-10-14" },
-        { vendor: "Indomaret", total: 120000, date: "2025-10-10" },
-    ];
-
     return (
         <div className="max-w-5xl mx-auto">
             <h1 className="text-2xl font-bold mb-6">Dashboard</h1>
@@ -66,7 +105,7 @@ export default function DashboardPage() {
                         {recent.map((r, i) => (
                             <tr key={i} className="border-b hover:bg-gray-50">
                                 <td className="p-2">{r.vendor}</td>
-                                <td className="p-2 text-right">IDR {r.total.toLocaleString()}</td>
+                                <td className="p-2 text-right">{r.currency} {r.total.toLocaleString()}</td>
                                 <td className="p-2 text-center text-gray-600">{r.date}</td>
                             </tr>
                         ))}
@@ -12,7 +12,7 @@ export const ReceiptFilterBar: React.FC<Props> = ({ onFilterChange }) => {
     // Handle filter updates (in real-time)
     useEffect(() => {
         const filters: Record<string, any> = {
-            search: search || undefined,
+            q: search || undefined, // full-text: vendor, items, OCR text
             category: category || undefined,
         };
 
@@ -1,6 +1,6 @@
 // src/pages/ReceiptsPage.tsx
 import React, { useState } from "react";
-import { uploadReceipt } from "../services/api";
+import { getReceiptDetail, subscribeReceiptEvents, uploadReceipt } from "../services/api";
 import { useReceipts } from "../hooks/useReceipts";
 import { ReceiptList } from "../pages/ReceiptList";
 import { ReceiptFilterBar } from "../pages/ReceiptFilterBar";
@@ -33,7 +33,22 @@ export default function ReceiptsPage() {
         try {
             const res = await uploadReceipt(formData);
             setParsed(res.data);
-            setTimeout(() => setPage(0), 500);
+            setPage(0);
+
+            // ✅ OCR runs in the background: wait for the push instead of polling
+            if (res.data?.status === "processing") {
+                const close = subscribeReceiptEvents({ ids: [res.data.id] }, async (event) => {
+                    if (event.status !== "parsed" && event.status !== "failed") return;
+                    close();
+                    if (event.status === "parsed") {
+                        const detail = await getReceiptDetail(event.receipt_id);
+                        setParsed(detail.data);
+                    } else {
+                        setError(event.error || "OCR failed for this receipt.");
+                    }
+                    if (refetch) refetch();
+                });
+            }
         } catch (err: any) {
             console.error(err);
             setError("Failed to process receipt. Please try again.");
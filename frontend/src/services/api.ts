@@ -10,12 +10,48 @@ const api = axios.create({
 export const getReceipts = (params?: Record<string, any>) =>
     api.get("/receipts/", { params });
 
+// Rows changed since a sync token (omit `since` for a full sync).
+// Keep calling with `next_token` while `has_more`; tombstones come back in `deleted`.
+export const getReceiptChanges = (params?: { since?: string; limit?: number; fields?: string }) =>
+    api.get("/receipts/changes", { params });
+
 // Upload a new receipt
 export const uploadReceipt = (formData: FormData) =>
     api.post("/receipts/", formData, {
         headers: { "Content-Type": "multipart/form-data" },
     });
 
+// Upload many receipts (images and/or ZIP archives) in one request
+export const uploadReceiptBatch = (formData: FormData) =>
+    api.post("/receipts/batch", formData, {
+        headers: { "Content-Type": "multipart/form-data" },
+    });
+
+// Per-item OCR status of a batch upload
+export const getBatchStatus = (batchId: string) =>
+    api.get(`/receipts/batch/${batchId}`);
+
+// Spending totals (by month / category / vendor) from the rollup table
+export const getSpendingStats = (params?: Record<string, any>) =>
+    api.get("/receipts/stats", { params });
+
+// Stream OCR status transitions (SSE) for receipts and/or a batch.
+// Returns a function that closes the stream.
+export const subscribeReceiptEvents = (
+    params: { ids?: string[]; batchId?: string },
+    onEvent: (event: { receipt_id: string; batch_id?: string; status: string; error?: string }) => void
+) => {
+    const query = new URLSearchParams();
+    if (params.ids?.length) query.set("ids", params.ids.join(","));
+    if (params.batchId) query.set("batch_id", params.batchId);
+
+    const source = new EventSource(`${api.defaults.baseURL}/receipts/events?${query}`);
+    source.addEventListener("status", (e) => onEvent(JSON.parse((e as MessageEvent).data)));
+    // The server ends the stream once everything is parsed/failed; don't auto-reconnect
+    source.onerror = () => source.close();
+    return () => source.close();
+};
+
 // Fetch a single receipt detail
 export const getReceiptDetail = (id: string) => {
     return api.get(`/receipts/${id}`);
@@ -7,5 +7,6 @@ export interface Receipt {
     expense_date: string | null;
     data: Record<string, any>;
     created_at: string;
+    updated_at?: string | null;
     deleted: boolean;
 }